@@ -1,8 +1,32 @@
+import contextvars
+import json
+import logging
 import os
+import queue
+import re
+import threading
+import time
+import httpx
 import requests
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from openai import APIError, APITimeoutError, OpenAI
 from dotenv import load_dotenv
 import streamlit as st
+from weather import ForecastCache
+from climate import load_normals
+from geo import weather_query
+from currency import currency_box, currency_for, currency_line, localize_budget
+from repair import (budget_fallback, has_placeholders, packing_fallback, repair_budget, repair_packing_list,
+                    section_fallback)
+from llm_cache import CACHE_ENABLED, ResponseCache, bypass_cache, cached_section, skip_cache
+from singleflight import SingleFlight, coalesced
+from ratelimit import RateLimiter, estimate_tokens
+from hedge import HEDGE_ENABLED, HedgeCancelled, Hedger
+from deadline import (PLAN_DEADLINE, DeadlineExceeded, check as check_deadline, deadline, remaining,
+                      section_deadline)
+from telemetry import (record_llm_call, record_llm_error, record_repair, start_metrics_server,
+                       traced_section)
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 load_dotenv()
@@ -15,17 +39,353 @@ def _get_secret(key):
 OPENWEATHER_API_KEY = _get_secret("OPENWEATHER_API_KEY") or os.getenv("OPENWEATHER_API_KEY")
 DEEPSEEK_API_KEY = _get_secret("DEEPSEEK_API_KEY") or os.getenv("DEEPSEEK_API_KEY")
 
+logger = logging.getLogger(__name__)
+
+# Overridable so benchmarks can point the agent at local stub servers
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org")
+
+# Upper bound on section calls in flight for a single plan
+PLAN_MAX_WORKERS = int(os.getenv("TRIPMATE_MAX_WORKERS", "7"))
+
+# Background workers for sections started before the user asks for a plan
+PREFETCH_MAX_WORKERS = int(os.getenv("TRIPMATE_PREFETCH_WORKERS", "8"))
+
+# Output cap for one batched multi-section completion (DeepSeek's maximum)
+BATCH_MAX_TOKENS = 8000
+
+# Itineraries up to this many days are one completion (about 100 tokens a day fit its 1200);
+# longer ones are written as concurrent chunks of about ITINERARY_CHUNK_DAYS days
+ITINERARY_SINGLE_CALL_DAYS = int(os.getenv("TRIPMATE_ITINERARY_SINGLE_CALL_DAYS", "10"))
+ITINERARY_CHUNK_DAYS = int(os.getenv("TRIPMATE_ITINERARY_CHUNK_DAYS", "3"))
+ITINERARY_MAX_WORKERS = int(os.getenv("TRIPMATE_ITINERARY_WORKERS", "8"))
+
+# Connection pools shared by every session in the process
+HTTP_MAX_CONNECTIONS = int(os.getenv("TRIPMATE_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("TRIPMATE_HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("TRIPMATE_HTTP_KEEPALIVE_EXPIRY", "120"))
+PREWARM_CONNECTIONS = os.getenv("TRIPMATE_PREWARM", "0") == "1"
+
+# Seconds past the plan deadline before sections that ignore theirs are given up on
+DEADLINE_GRACE = 2.0
+
+# Share one in-flight section call between identical concurrent requests
+SINGLEFLIGHT_ENABLED = os.getenv("TRIPMATE_SINGLEFLIGHT", "1") != "0"
+
+# Trip inputs each plan section is written from; re-planning regenerates only the
+# sections whose inputs changed (budget and itinerary use the trip length, not its dates)
+SECTION_INPUTS = {
+    "budget": ("destination", "num_days", "travel_style", "num_travelers"),
+    "packing": ("destination", "start_date", "end_date", "travel_style"),
+    "itinerary": ("destination", "num_days", "interests"),
+    "transport": ("destination",),
+    "culture": ("destination",),
+    "restaurants": ("destination", "dietary_restrictions", "travel_style"),
+    "currency": ("destination",),
+}
+
+
+def _trip_days(start_date: str, end_date: str) -> int:
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return (end - start).days + 1
+
+
+def section_inputs(destination: str, start_date: str, end_date: str,
+                   travel_style: str = "moderate", num_travelers: int = 1,
+                   interests: str = "general sightseeing", dietary_restrictions: list = None,
+                   sections: list = None) -> dict:
+    """Map each plan section to the values of the inputs it depends on (same arguments as plan_tasks).
+
+    Two plans can reuse a section when its values compare equal.
+    """
+    def text(value):
+        return " ".join(value.split()).casefold()
+
+    values = {
+        "destination": text(destination),
+        "start_date": start_date,
+        "end_date": end_date,
+        "num_days": _trip_days(start_date, end_date),
+        "travel_style": text(travel_style),
+        "num_travelers": num_travelers,
+        "interests": text(interests),
+        "dietary_restrictions": sorted(text(d) for d in dietary_restrictions or ()),
+    }
+    return {
+        key: [values[name] for name in names]
+        for key, names in SECTION_INPUTS.items()
+        if sections is None or key in sections
+    }
+
+
+# A finished line of the streamed itinerary outline ("Day 4: ...", possibly in bold)
+_OUTLINE_DAY_RE = re.compile(r"^\W*day\s+\d+", re.IGNORECASE | re.MULTILINE)
+
+
+def _day_ranges(num_days: int, chunk_days: int) -> list:
+    """Split days 1..num_days into balanced (first, last) ranges of at most chunk_days."""
+    chunks = -(-num_days // chunk_days)
+    size, extra = divmod(num_days, chunks)
+    ranges = []
+    first = 1
+    for i in range(chunks):
+        last = first + size + (i < extra) - 1
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+def _packing_list_valid(text: str) -> bool:
+    if not text:
+        return False
+    if "**WEATHER**:" not in text:
+        return False
+    if "**CLOTHING**" not in text or "**ELECTRONICS**" not in text:
+        return False
+    if "Adapter type:" not in text:
+        return False
+    if "**LAUNDRY**" not in text or "**LUGGAGE**" not in text or "**SPECIAL NOTES**" not in text:
+        return False
+    try:
+        clothing_block = text.split("**CLOTHING**", 1)[1].split("**ELECTRONICS**", 1)[0]
+        clothing_bullets = [l for l in clothing_block.splitlines() if l.strip().startswith(("•", "-"))]
+        if len(clothing_bullets) < 6:
+            return False
+        electronics_block = text.split("**ELECTRONICS**", 1)[1]
+        electronics_lines = [l for l in electronics_block.splitlines() if l.strip().startswith(("•", "-"))]
+        if len(electronics_lines) < 3:
+            return False
+    except Exception:
+        return False
+    return True
+
+
+def _budget_valid(text: str) -> bool:
+    if not text:
+        return False
+    required = [
+        "💱 Currency:",
+        "**Accommodation**",
+        "**Food**",
+        "**Transport**",
+        "**Activities**",
+        "**Other**",
+        "**TOTAL:",
+        "**Per person/day:",
+        "**Money Tips**"
+    ]
+    if not all(k in text for k in required):
+        return False
+    # Basic bullet presence checks per section
+    try:
+        acc_block = text.split("**Accommodation**", 1)[1].split("**Food**", 1)[0]
+        food_block = text.split("**Food**", 1)[1].split("**Transport**", 1)[0]
+        transport_block = text.split("**Transport**", 1)[1].split("**Activities**", 1)[0]
+        activities_block = text.split("**Activities**", 1)[1].split("**Other**", 1)[0]
+        other_block = text.split("**Other**", 1)[1].split("**TOTAL:", 1)[0]
+        tips_block = text.split("**Money Tips**", 1)[1]
+        def has_bullets(block):
+            return any(l.strip().startswith(("•", "-")) for l in block.splitlines())
+        if not all([
+            has_bullets(acc_block),
+            has_bullets(food_block),
+            has_bullets(transport_block),
+            has_bullets(activities_block),
+            has_bullets(other_block),
+            has_bullets(tips_block),
+        ]):
+            return False
+    except Exception:
+        return False
+    return True
+
+
+def _section_valid(text: str) -> bool:
+    """Loose format check for free-form sections: markdown headers and bullet lines."""
+    if not text or "**" not in text:
+        return False
+    return any(l.strip().startswith(("•", "-")) for l in text.splitlines())
+
+
+class PrefetchCancelled(Exception):
+    """Raised inside a prefetched section call once its result is no longer wanted."""
+
+
+_shared_agent = None
+_shared_agent_lock = threading.Lock()
+
+
+def get_shared_agent():
+    """Return the process-wide agent, creating it (and pre-warming connections) on first use.
+
+    The Prometheus /metrics endpoint is started alongside it when TRIPMATE_METRICS_PORT is set.
+    """
+    global _shared_agent
+    if _shared_agent is None:
+        with _shared_agent_lock:
+            if _shared_agent is None:
+                agent = TripMateAgent()
+                if PREWARM_CONNECTIONS:
+                    threading.Thread(target=agent.warm_up, daemon=True, name="tripmate-prewarm").start()
+                start_metrics_server()
+                _shared_agent = agent
+    return _shared_agent
+
 
 class TripMateAgent:
-    def __init__(self):
+    """TripMate section generator.
+
+    One instance is safe to share between threads and sessions: the DeepSeek and
+    OpenWeather clients keep pooled keep-alive connections, and the response
+    cache serializes its own access.
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_keepalive: int = HTTP_MAX_KEEPALIVE):
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
         self.client = OpenAI(
             api_key=DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
+            base_url=DEEPSEEK_BASE_URL,
+            http_client=self.http_client,
+            # Retries and backoff are handled by self.limiter
+            max_retries=0
         )
+        self.limiter = RateLimiter()
+        self.hedger = Hedger(self.limiter) if HEDGE_ENABLED else None
+        self.weather_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections)
+        self.weather_session.mount("http://", adapter)
+        self.weather_session.mount("https://", adapter)
         self.weather_api_key = OPENWEATHER_API_KEY 
+        self.forecasts = ForecastCache(self.weather_session, self.weather_api_key, OPENWEATHER_BASE_URL)
+        self.cache = ResponseCache() if CACHE_ENABLED else None
+        self.flights = SingleFlight("llm") if SINGLEFLIGHT_ENABLED else None
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS,
+                                                thread_name_prefix="tripmate-prefetch")
+        self.itinerary_pool = ThreadPoolExecutor(max_workers=ITINERARY_MAX_WORKERS,
+                                                 thread_name_prefix="tripmate-itinerary")
+
+    def warm_up(self):
+        """Open keep-alive connections to DeepSeek and OpenWeather ahead of the first plan."""
+        for open_connection in (
+            lambda: self.http_client.head(DEEPSEEK_BASE_URL, timeout=5),
+            lambda: self.weather_session.head(OPENWEATHER_BASE_URL, timeout=5),
+        ):
+            try:
+                open_connection()
+            except Exception as e:
+                logger.warning("Connection pre-warm failed: %s", e)
+
+    def _complete(self, prompt: str, temperature: float, max_tokens: int, on_delta=None,
+                  response_format: dict = None, repair: bool = False) -> str:
+        """Run a single-prompt chat completion, streaming text deltas to on_delta when given.
+
+        The call goes through the agent's rate limiter, which retries it on
+        429s, 5xx answers and connection errors until text has been streamed,
+        and through the hedger when hedging is on. Latency, token usage and
+        finish reason are recorded per request under the current section;
+        repair marks format-repair calls.
+        """
+        streamed = False
+        estimated_tokens = estimate_tokens(prompt, max_tokens)
+
+        def forward(delta):
+            nonlocal streamed
+            streamed = True
+            on_delta(delta)
+
+        def send(deltas, stop):
+            return self._request(prompt, temperature, max_tokens, deltas, response_format, repair, stop)
+
+        def attempt():
+            if self.hedger is not None:
+                return self.hedger.run(send, forward if on_delta else None, estimated_tokens)
+            return send(forward if on_delta else None, None)
+
+        return self.limiter.run(attempt, estimated_tokens, latency_key=max_tokens,
+                                can_retry=lambda: not streamed)
+
+    def _request(self, prompt: str, temperature: float, max_tokens: int, on_delta=None,
+                 response_format: dict = None, repair: bool = False, stop: threading.Event = None) -> str:
+        """Send one chat completion request; it streams when on_delta or stop is given.
+
+        Setting stop aborts the stream at its next chunk with HedgeCancelled.
+        The request times out at the current deadline, if there is one.
+        """
+        started = time.perf_counter()
+        options = {"response_format": response_format} if response_format else {}
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded()
+            options["timeout"] = left
+        try:
+            if on_delta is None and stop is None:
+                response = self.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **options
+                )
+                record_llm_call(time.perf_counter() - started, response.usage,
+                                response.choices[0].finish_reason, repair=repair)
+                return response.choices[0].message.content
+
+            stream = self.client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                **options
+            )
+            parts = []
+            usage = None
+            finish_reason = None
+            first_token = None
+            try:
+                for chunk in stream:
+                    if stop is not None and stop.is_set():
+                        raise HedgeCancelled()
+                    check_deadline()
+                    # With include_usage the final chunk carries usage and no choices
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(delta)
+                        if on_delta is not None:
+                            on_delta(delta)
+            finally:
+                # Release the connection even when the stream is aborted early
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+            record_llm_call(time.perf_counter() - started, usage, finish_reason,
+                            repair=repair, first_token=first_token)
+            return "".join(parts)
+        except HedgeCancelled:
+            raise
+        except Exception as e:
+            record_llm_error(time.perf_counter() - started, e, repair=repair)
+            raise
         
     def get_weather_data(self, city: str, travel_date: str) -> dict:
-        """Fetch weather data if within 5-day forecast window."""
+        """Summarize the forecast for the travel date if it falls in the 5-day forecast window."""
         try:
             travel_dt = datetime.strptime(travel_date, "%Y-%m-%d")
             days_until = (travel_dt - datetime.now()).days
@@ -33,101 +393,33 @@ class TripMateAgent:
             if days_until < 0 or days_until > 5 or not self.weather_api_key:
                 return None
                 
-            url = f"http://api.openweathermap.org/data/2.5/forecast?q={city}&appid={self.weather_api_key}&units=metric"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "temp": data["list"][0]["main"]["temp"],
-                    "description": data["list"][0]["weather"][0]["description"],
-                    "humidity": data["list"][0]["main"]["humidity"]
-                }
+            forecast = self.forecasts.get(weather_query(city))
+            if forecast is not None:
+                return forecast.day_summary(travel_dt.date())
         except Exception as e:
-            print(f"Weather API error: {e}")
+            logger.warning("Weather lookup failed for %s: %s", city, e)
         return None
 
+    @traced_section("packing")
+    @coalesced
+    @cached_section("_packing_list_prompt")
     def generate_packing_list(self, destination: str, start_date: str, end_date: str, 
-                                travel_style: str = "moderate") -> str:
+                                travel_style: str = "moderate", on_delta=None) -> str:
         """Generate smart packing list based on destination and dates."""
         
-        weather_info = self.get_weather_data(destination, start_date)
-        if weather_info:
-            weather_context = f"Current forecast: {weather_info['temp']}°C, {weather_info['description']}"
-        else:
-            weather_context = self._seasonal_weather_hint(destination, start_date)
-        weather_line = f"**WEATHER**: {weather_context}"
-        
-        prompt = f"""Create a CONCISE packing list for {destination}, {start_date} to {end_date}.
-
-Provide in this compact format (IMPORTANT: Each bullet point MUST be on its own line):
-
-{weather_line}
-
-**CLOTHING** ({travel_style} style)
-• Item 1
-• Item 2
-• Item 3
-• Item 4
-• Item 5
-• Item 6
-
-**ELECTRONICS**
-• Adapter type: [Type X (country, plug type details)]
-• Phone charger
-• Power bank
-
-**LAUNDRY**: [Available/Not readily available] - [brief note on where/how to do laundry if available, or pack more if not]
-
-**LUGGAGE**: [Carry-on/Checked] - [brief reason]
-
-**SPECIAL NOTES**: [1-2 cultural/climate considerations]
-
-CRITICAL: 
-- Put each item on a separate line
-- Start with CLOTHING section first
-- Be SHORT and practical
-- Include weather-appropriate clothing based on the season
-- IMPORTANT: If laundry facilities are available (laundromats, hotel service, or Airbnb washer), recommend fewer clothing items since traveler can wash during trip
-- If laundry not readily available, recommend packing more clothing items
-- Adjust clothing quantity based on trip length and laundry access"""
+        weather_line = self._packing_weather_line(destination, start_date)
+        prompt = self._packing_list_prompt(destination, start_date, end_date, travel_style, weather_line)
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.6,
-            max_tokens=800
-        )
-        content = response.choices[0].message.content
+        content = self._complete(prompt, temperature=0.6, max_tokens=800, on_delta=on_delta)
         if "**WEATHER**:" not in content:
             content = f"{weather_line}\n\n{content}"
 
-        def _packing_list_valid(text: str) -> bool:
-            if not text:
-                return False
-            if "**WEATHER**:" not in text:
-                return False
-            if "**CLOTHING**" not in text or "**ELECTRONICS**" not in text:
-                return False
-            if "Adapter type:" not in text:
-                return False
-            if "**LAUNDRY**" not in text or "**LUGGAGE**" not in text or "**SPECIAL NOTES**" not in text:
-                return False
-            try:
-                clothing_block = text.split("**CLOTHING**", 1)[1].split("**ELECTRONICS**", 1)[0]
-                clothing_bullets = [l for l in clothing_block.splitlines() if l.strip().startswith(("•", "-"))]
-                if len(clothing_bullets) < 6:
-                    return False
-                electronics_block = text.split("**ELECTRONICS**", 1)[1]
-                electronics_lines = [l for l in electronics_block.splitlines() if l.strip().startswith(("•", "-"))]
-                if len(electronics_lines) < 3:
-                    return False
-            except Exception:
-                return False
-            return True
-
         if _packing_list_valid(content):
             return content
+        repaired = repair_packing_list(content, weather_line, travel_style, destination)
+        if repaired and _packing_list_valid(repaired):
+            record_repair("local")
+            return repaired
 
         repair_prompt = f"""Rewrite the packing list BELOW to EXACTLY follow the required format and include ALL sections.
 Do NOT add extra sections. Use only markdown (**, •). Each bullet on its own line.
@@ -152,73 +444,72 @@ REQUIRED FORMAT:
 **LUGGAGE**: [Carry-on/Checked] - [brief reason]
 
 **SPECIAL NOTES**: [1-2 cultural/climate considerations]
+
+PACKING LIST:
+{content}
 """
 
-        repair_response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": repair_prompt}],
-            temperature=0.3,
-            max_tokens=800
-        )
-        repaired = repair_response.choices[0].message.content
+        repaired = self._complete(repair_prompt, temperature=0.3, max_tokens=800, repair=True)
         if "**WEATHER**:" not in repaired:
             repaired = f"{weather_line}\n\n{repaired}"
         if _packing_list_valid(repaired):
+            record_repair("model")
             return repaired
 
-        return f"""{weather_line}
+        record_repair("fallback")
+        skip_cache()
+        return packing_fallback(weather_line, travel_style, destination)
 
-**CLOTHING** ({travel_style} style)
-• Weather-appropriate outer layer
-• 2-3 tops
-• 1-2 bottoms
-• Warm layer (sweater/fleece)
-• Comfortable walking shoes
-• Sleepwear/underwear
-**ELECTRONICS**
-• Adapter type: [Type X for {destination}]
+    def _packing_weather_line(self, destination: str, start_date: str) -> str:
+        weather_info = self.get_weather_data(destination, start_date)
+        if weather_info:
+            weather_context = (
+                f"Forecast for {start_date}: {weather_info['temp_min']:g}–{weather_info['temp_max']:g}°C, "
+                f"{weather_info['description']}, {weather_info['humidity']}% humidity"
+            )
+        else:
+            weather_context = self._seasonal_weather_hint(destination, start_date)
+        return f"**WEATHER**: {weather_context}"
 
+    def _packing_list_prompt(self, destination: str, start_date: str, end_date: str,
+                             travel_style: str, weather_line: str) -> str:
+        return f"""Create a CONCISE packing list for {destination}, {start_date} to {end_date}.
 
-**LAUNDRY**: Unknown - Pack a few extra basics just in case
+Provide in this compact format (IMPORTANT: Each bullet point MUST be on its own line):
 
-**LUGGAGE**: Carry-on - Flexible and easy to manage
+{weather_line}
 
-**SPECIAL NOTES**: Check local forecasts and dress in layers."""
+**CLOTHING** ({travel_style} style)
+• Item 1
+• Item 2
+• Item 3
+• Item 4
+• Item 5
+• Item 6
 
-    def _seasonal_weather_hint(self, destination: str, start_date: str) -> str:
-        """Fallback: estimate typical weather for that time of year using historical norms."""
-        try:
-            month = int(start_date.split("-")[1])
-        except Exception:
-            month = None
+**ELECTRONICS**
+• Adapter type: [Type X (country, plug type details)]
+• Phone charger
+• Power bank
 
-        month_name = datetime.strptime(str(month), "%m").strftime("%B") if month else "that month"
-        prompt = f"""Estimate the TYPICAL weather for {destination} in {month_name} based on historical averages.
-Return a single short sentence with temperature range in °C and a brief description.
-Example: "Typical range 5–12°C with chilly, damp days."
-No extra text."""
+**LAUNDRY**: [Available/Not readily available] - [brief note on where/how to do laundry if available, or pack more if not]
 
-        try:
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-                max_tokens=60
-            )
-            text = response.choices[0].message.content.strip()
-            return text if text else "Typical conditions vary; expect seasonal weather"
-        except Exception:
-            return "Typical conditions vary; expect seasonal weather"
+**LUGGAGE**: [Carry-on/Checked] - [brief reason]
 
-    def generate_itinerary(self, destination: str, start_date: str, end_date: str,
-                          interests: str = "general sightseeing") -> str:
-        """Generate day-by-day itinerary."""
-        
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        num_days = (end - start).days + 1
-        
-        prompt = f"""Create a {num_days}-day itinerary for {destination} ({interests}).
+**SPECIAL NOTES**: [1-2 cultural/climate considerations]
+
+CRITICAL: 
+- Put each item on a separate line
+- Start with CLOTHING section first
+- Be SHORT and practical
+- Include weather-appropriate clothing based on the season
+- IMPORTANT: If laundry facilities are available (laundromats, hotel service, or Airbnb washer), recommend fewer clothing items since traveler can wash during trip
+- If laundry not readily available, recommend packing more clothing items
+- Adjust clothing quantity based on trip length and laundry access"""
+
+    def _itinerary_prompt(self, destination: str, start_date: str, end_date: str, interests: str) -> str:
+        num_days = _trip_days(start_date, end_date)
+        return f"""Create a {num_days}-day itinerary for {destination} ({interests}).
 
 For each day provide (each bullet on separate line):
 
@@ -230,116 +521,45 @@ For each day provide (each bullet on separate line):
 Keep descriptions to 1 line each. Focus on must-sees. 
 Maximum 4 activities per day. Each bullet point on its own line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=1200
-        )
-        
-        return response.choices[0].message.content
-
-    def estimate_budget(self, destination: str, start_date: str, end_date: str,
-                       travel_style: str = "moderate", num_travelers: int = 1) -> dict:
-        """Generate detailed budget estimation with breakdown."""
-        
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        num_days = (end - start).days + 1
-        
-        prompt = f"""Provide budget estimate for {destination}, {num_days} days, {num_travelers} person(s), {travel_style} style.
-
-IMPORTANT: Start your response with the local currency and exchange rate on the FIRST line like this:
-💱 Currency: [Currency Name] ([CODE]) | 1 USD = X [CODE]
-
-Then provide this breakdown IN USD (each section on separate lines):
+    def _itinerary_outline_prompt(self, destination: str, num_days: int, interests: str) -> str:
+        return f"""Outline a {num_days}-day trip to {destination} ({interests}).
 
-**Accommodation** ({num_days} nights)
-• $XX-XX/night → Total: $XXX-XXX
+Return exactly {num_days} lines, one per day, in this format and nothing else:
+Day X: [theme] - [2-3 main attractions or areas]
 
-**Food** (per person/day)
-• Breakfast: $X-X
-• Lunch: $X-X
-• Dinner: $XX-XX
-• Daily: $XX-XX → Total ({num_days} days): $XXX-XXX
-
-**Transport**
-• Airport transfer: $XX-XX
-• Daily local: $X-X/day → Total: $XX-XX
-• Total: $XXX-XXX
+Spread the must-sees over the whole trip and never repeat an attraction."""
 
-**Activities**
-• Entry fees & tours: $XXX-XXX
+    def _itinerary_chunk_prompt(self, destination: str, first_day: int, last_day: int,
+                                num_days: int, interests: str, outline: str) -> str:
+        return f"""Write days {first_day}-{last_day} of a {num_days}-day itinerary for {destination} ({interests}).
 
-**Other**
-• SIM/WiFi: $XX
-• Tips: $XX
-• Buffer: $XX
-• Total: $XXX-XXX
+Trip outline (other days are written separately; only use the attractions planned for your days):
+{outline}
 
-**TOTAL: $X,XXX - $X,XXX** ({num_travelers} person(s))
-**Per person/day: $XXX-XXX**
+For each of days {first_day}-{last_day} provide (each bullet on separate line):
 
-**Money Tips**:
-• [Tip 1]
-• [Tip 2]  
-• [Tip 3]
+**Day X**: [One-line theme]
+• Morning (9-12): [1 main activity] 
+• Afternoon (12-5): [1 main activity + lunch spot] 
+• Evening (5-9): [dinner + 1 activity] 
 
-Keep it SHORT. Use current 2026 prices. All amounts in USD. Each item on separate line."""
+Write only days {first_day}-{last_day}. Keep descriptions to 1 line each. 
+Maximum 4 activities per day. Each bullet point on its own line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=900
-        )
-        content = response.choices[0].message.content
-
-        def _budget_valid(text: str) -> bool:
-            if not text:
-                return False
-            required = [
-                "💱 Currency:",
-                "**Accommodation**",
-                "**Food**",
-                "**Transport**",
-                "**Activities**",
-                "**Other**",
-                "**TOTAL:",
-                "**Per person/day:",
-                "**Money Tips**"
-            ]
-            if not all(k in text for k in required):
-                return False
-            # Basic bullet presence checks per section
-            try:
-                acc_block = text.split("**Accommodation**", 1)[1].split("**Food**", 1)[0]
-                food_block = text.split("**Food**", 1)[1].split("**Transport**", 1)[0]
-                transport_block = text.split("**Transport**", 1)[1].split("**Activities**", 1)[0]
-                activities_block = text.split("**Activities**", 1)[1].split("**Other**", 1)[0]
-                other_block = text.split("**Other**", 1)[1].split("**TOTAL:", 1)[0]
-                tips_block = text.split("**Money Tips**", 1)[1]
-                def has_bullets(block):
-                    return any(l.strip().startswith(("•", "-")) for l in block.splitlines())
-                if not all([
-                    has_bullets(acc_block),
-                    has_bullets(food_block),
-                    has_bullets(transport_block),
-                    has_bullets(activities_block),
-                    has_bullets(other_block),
-                    has_bullets(tips_block),
-                ]):
-                    return False
-            except Exception:
-                return False
-            return True
+    def _budget_prompt(self, destination: str, start_date: str, end_date: str,
+                       travel_style: str, num_travelers: int) -> str:
+        num_days = _trip_days(start_date, end_date)
+        if currency_for(destination) is not None:
+            # The currency line is added locally from the FX snapshot
+            opening = "Provide this breakdown IN USD (each section on separate lines):"
+        else:
+            opening = """IMPORTANT: Start your response with the local currency and exchange rate on the FIRST line like this:
+💱 Currency: [Currency Name] ([CODE]) | 1 USD = X [CODE]
 
-        if not _budget_valid(content):
-            repair_prompt = f"""Rewrite the budget estimate below to EXACTLY follow the required format.
-Do NOT add extra sections. Use only markdown (**, •). Each bullet on its own line.
+Then provide this breakdown IN USD (each section on separate lines):"""
+        return f"""Provide budget estimate for {destination}, {num_days} days, {num_travelers} person(s), {travel_style} style.
 
-REQUIRED FORMAT:
-💱 Currency: [Currency Name] ([CODE]) | 1 USD = X [CODE]
+{opening}
 
 **Accommodation** ({num_days} nights)
 • $XX-XX/night → Total: $XXX-XXX
@@ -369,61 +589,13 @@ REQUIRED FORMAT:
 
 **Money Tips**:
 • [Tip 1]
-• [Tip 2]
+• [Tip 2]  
 • [Tip 3]
-"""
-            repair_response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": repair_prompt}],
-                temperature=0.3,
-                max_tokens=900
-            )
-            content = repair_response.choices[0].message.content
-
-        if not _budget_valid(content):
-            content = f"""💱 Currency: [Local Currency] ([CODE]) | 1 USD = X [CODE]
-
-**Accommodation** ({num_days} nights)
-• $XX-XX/night → Total: $XXX-XXX
-
-**Food** (per person/day)
-• Breakfast: $X-X
-• Lunch: $X-X
-• Dinner: $XX-XX
-• Daily: $XX-XX → Total ({num_days} days): $XXX-XXX
-
-**Transport**
-• Airport transfer: $XX-XX
-• Daily local: $X-X/day → Total: $XX-XX
-• Total: $XXX-XXX
-
-**Activities**
-• Entry fees & tours: $XXX-XXX
 
-**Other**
-• SIM/WiFi: $XX
-• Tips: $XX
-• Buffer: $XX
-• Total: $XXX-XXX
-
-**TOTAL: $X,XXX - $X,XXX** ({num_travelers} person(s))
-**Per person/day: $XXX-XXX**
-
-**Money Tips**:
-• Book in advance for better rates.
-• Use local transit passes when available.
-• Carry a small cash buffer for tips/fees."""
-
-        return {
-            "budget_text": content,
-            "num_days": num_days,
-            "num_travelers": num_travelers
-        }
+Keep it SHORT. Use current 2026 prices. All amounts in USD. Each item on separate line."""
 
-    def get_public_transport_guide(self, destination: str) -> str:
-        """Generate comprehensive public transportation guide."""
-        
-        prompt = f"""Public transport guide for {destination} - BE CONCISE (each item on separate line):
+    def _transport_prompt(self, destination: str) -> str:
+        return f"""Public transport guide for {destination} - BE CONCISE (each item on separate line):
 
 **Metro/Subway**
 • Lines & coverage: [1 sentence]
@@ -451,19 +623,8 @@ REQUIRED FORMAT:
 
 Keep under 200 words total. Each bullet on its own line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.6,
-            max_tokens=600
-        )
-        
-        return response.choices[0].message.content
-
-    def get_cultural_tips(self, destination: str) -> str:
-        """Generate cultural etiquette and local tips."""
-        
-        prompt = f"""Cultural tips for {destination} - CONCISE format (each item on separate line):
+    def _cultural_tips_prompt(self, destination: str) -> str:
+        return f"""Cultural tips for {destination} - CONCISE format (each item on separate line):
 
 CRITICAL: Use markdown only (** for headers, • for bullets). NO HTML tags.
 
@@ -496,24 +657,10 @@ CRITICAL: Use markdown only (** for headers, • for bullets). NO HTML tags.
 
 Keep total under 150 words. Use markdown only, NO HTML. Each bullet on its own line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.6,
-            max_tokens=500
-        )
-        
-        return response.choices[0].message.content
-
-    def get_restaurant_recommendations(self, destination: str, 
-                                      dietary_restrictions: list = None,
-                                      meal_type: str = "all",
-                                      budget: str = "moderate") -> str:
-        """Generate restaurant recommendations with dietary filters."""
-        
+    def _restaurant_prompt(self, destination: str, dietary_restrictions: list,
+                           meal_type: str, budget: str) -> str:
         dietary_str = ", ".join(dietary_restrictions) if dietary_restrictions else "all diets"
-        
-        prompt = f"""Restaurant guide for {destination} ({dietary_str}, {budget} budget):
+        return f"""Restaurant guide for {destination} ({dietary_str}, {budget} budget):
 
 CRITICAL: Use ONLY markdown format. Headers with **, bullets with •. DO NOT use HTML tags like <h4>, <strong>, etc.
 
@@ -546,19 +693,8 @@ CRITICAL: Use ONLY markdown format. Headers with **, bullets with •. DO NOT us
 
 IMPORTANT: Use markdown only (** and •), NO HTML. Keep under 200 words. Each bullet on separate line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=700
-        )
-        
-        return response.choices[0].message.content
-
-    def get_currency_info(self, destination: str) -> str:
-        """Get currency and payment information."""
-        
-        prompt = f"""Currency info for {destination} - ULTRA CONCISE (each item on separate line):
+    def _currency_prompt(self, destination: str) -> str:
+        return f"""Currency info for {destination} - ULTRA CONCISE (each item on separate line):
 
 💱 **[Currency name]** ([CODE])
 • 1 USD = X [CODE] (2026 estimate)
@@ -568,11 +704,579 @@ IMPORTANT: Use markdown only (** and •), NO HTML. Keep under 200 words. Each b
 
 Keep to 3-4 lines max. Each point on separate line."""
 
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=200
-        )
+    def _seasonal_weather_hint(self, destination: str, start_date: str) -> str:
+        """Fallback: estimate typical weather for that time of year using historical norms."""
+        try:
+            month = int(start_date.split("-")[1])
+        except Exception:
+            month = None
+
+        # Bundled climate normals answer locally; the model is only asked about
+        # destinations with no known city nearby
+        normals = load_normals()
+        if month and normals is not None:
+            hint = normals.seasonal_hint(destination, month)
+            if hint:
+                return hint
+
+        month_name = datetime.strptime(str(month), "%m").strftime("%B") if month else "that month"
+        prompt = f"""Estimate the TYPICAL weather for {destination} in {month_name} based on historical averages.
+Return a single short sentence with temperature range in °C and a brief description.
+Example: "Typical range 5–12°C with chilly, damp days."
+No extra text."""
+
+        try:
+            text = self._complete(prompt, temperature=0.2, max_tokens=60).strip()
+            return text if text else "Typical conditions vary; expect seasonal weather"
+        except Exception:
+            return "Typical conditions vary; expect seasonal weather"
+
+    @traced_section("itinerary")
+    @coalesced
+    @cached_section("_itinerary_prompt", "_itinerary_outline_prompt", "_itinerary_chunk_prompt",
+                    "_chunked_itinerary")
+    def generate_itinerary(self, destination: str, start_date: str, end_date: str,
+                          interests: str = "general sightseeing", on_delta=None) -> str:
+        """Generate day-by-day itinerary."""
+        
+        num_days = _trip_days(start_date, end_date)
+        if num_days > ITINERARY_SINGLE_CALL_DAYS:
+            return self._chunked_itinerary(destination, num_days, interests, on_delta=on_delta)
+
+        prompt = self._itinerary_prompt(destination, start_date, end_date, interests)
+
+        return self._complete(prompt, temperature=0.7, max_tokens=1200, on_delta=on_delta)
+
+    def _chunked_itinerary(self, destination: str, num_days: int, interests: str, on_delta=None) -> str:
+        """Write a long itinerary as concurrent day-range chunks that share one trip outline.
+
+        The outline streams in, and each chunk starts as soon as the outline
+        covers its days. Chunks stream through on_delta in day order: the
+        earliest unfinished chunk streams live while later ones buffer until it
+        completes.
+        """
+        ranges = _day_ranges(num_days, ITINERARY_CHUNK_DAYS)
+        lock = threading.Lock()
+        buffers = [[] for _ in ranges]
+        finished = [False] * len(ranges)
+        live = [0]
+        outline = []
+        futures = []
+        # Chunks run on other threads; copies of this context keep them labelled as this section
+        context = contextvars.copy_context()
+
+        def write(index, delta):
+            with lock:
+                if index == live[0]:
+                    on_delta(delta)
+                else:
+                    buffers[index].append(delta)
+
+        def finish(index):
+            with lock:
+                finished[index] = True
+                while live[0] < len(ranges) and finished[live[0]]:
+                    live[0] += 1
+                    if live[0] < len(ranges):
+                        on_delta("\n\n" + "".join(buffers[live[0]]))
+
+        def run(index, first_day, last_day, outline_text):
+            prompt = self._itinerary_chunk_prompt(destination, first_day, last_day, num_days, interests,
+                                                  outline_text)
+            text = self._complete(prompt, temperature=0.7, max_tokens=150 * (last_day - first_day + 1) + 100,
+                                  on_delta=(lambda delta: write(index, delta)) if on_delta else None)
+            if on_delta:
+                finish(index)
+            return text.strip()
+
+        def start_ready(outline_text, days_outlined):
+            # Start every chunk whose days the outline already covers
+            while len(futures) < len(ranges) and ranges[len(futures)][1] <= days_outlined:
+                first, last = ranges[len(futures)]
+                futures.append(self.itinerary_pool.submit(context.copy().run, run, len(futures),
+                                                          first, last, outline_text))
+
+        def outline_delta(delta):
+            with lock:
+                outline.append(delta)
+                text = "".join(outline)
+                complete = text[:text.rfind("\n") + 1]
+                start_ready(complete.strip(), len(_OUTLINE_DAY_RE.findall(complete)))
+
+        try:
+            text = self._complete(self._itinerary_outline_prompt(destination, num_days, interests),
+                                  temperature=0.7, max_tokens=40 * num_days + 50, on_delta=outline_delta)
+            with lock:
+                start_ready(text.strip(), num_days)
+            return "\n\n".join(future.result() for future in futures)
+        except BaseException:
+            with lock:
+                for future in futures:
+                    future.cancel()
+            raise
+
+    @traced_section("budget")
+    @coalesced
+    @cached_section("_budget_prompt")
+    def estimate_budget(self, destination: str, start_date: str, end_date: str,
+                       travel_style: str = "moderate", num_travelers: int = 1,
+                       on_delta=None) -> dict:
+        """Generate detailed budget estimation with breakdown."""
+        
+        num_days = _trip_days(start_date, end_date)
+        prompt = self._budget_prompt(destination, start_date, end_date, travel_style, num_travelers)
+
+        currency = currency_for(destination)
+        if currency is not None and on_delta:
+            on_delta(currency_line(currency) + "\n\n")
+
+        content = self._complete(prompt, temperature=0.5, max_tokens=900, on_delta=on_delta)
+        if currency is not None:
+            content = localize_budget(content, currency)
+
+        if not _budget_valid(content):
+            repaired = repair_budget(content, num_days, num_travelers)
+            if repaired and _budget_valid(repaired):
+                record_repair("local")
+                content = repaired
+
+        if not _budget_valid(content):
+            repair_prompt = f"""Rewrite the budget estimate below to EXACTLY follow the required format.
+Do NOT add extra sections. Use only markdown (**, •). Each bullet on its own line.
+
+REQUIRED FORMAT:
+💱 Currency: [Currency Name] ([CODE]) | 1 USD = X [CODE]
+
+**Accommodation** ({num_days} nights)
+• $XX-XX/night → Total: $XXX-XXX
+
+**Food** (per person/day)
+• Breakfast: $X-X
+• Lunch: $X-X
+• Dinner: $XX-XX
+• Daily: $XX-XX → Total ({num_days} days): $XXX-XXX
+
+**Transport**
+• Airport transfer: $XX-XX
+• Daily local: $X-X/day → Total: $XX-XX
+• Total: $XXX-XXX
+
+**Activities**
+• Entry fees & tours: $XXX-XXX
+
+**Other**
+• SIM/WiFi: $XX
+• Tips: $XX
+• Buffer: $XX
+• Total: $XXX-XXX
+
+**TOTAL: $X,XXX - $X,XXX** ({num_travelers} person(s))
+**Per person/day: $XXX-XXX**
+
+**Money Tips**:
+• [Tip 1]
+• [Tip 2]
+• [Tip 3]
+
+BUDGET ESTIMATE:
+{content}
+"""
+            content = self._complete(repair_prompt, temperature=0.3, max_tokens=900, repair=True)
+            if currency is not None:
+                content = localize_budget(content, currency)
+            if _budget_valid(content):
+                record_repair("model")
+
+        if not _budget_valid(content):
+            record_repair("fallback")
+            if currency is not None:
+                content = budget_fallback(num_days, num_travelers, currency_line(currency))
+            else:
+                content = budget_fallback(num_days, num_travelers)
+
+        if has_placeholders(content):
+            # Blocks filled from the template (or a whole placeholder) aren't worth keeping for hours
+            skip_cache()
+
+        return {
+            "budget_text": content,
+            "num_days": num_days,
+            "num_travelers": num_travelers
+        }
+
+    @traced_section("transport")
+    @coalesced
+    @cached_section("_transport_prompt")
+    def get_public_transport_guide(self, destination: str, on_delta=None) -> str:
+        """Generate comprehensive public transportation guide."""
+        
+        prompt = self._transport_prompt(destination)
+
+        return self._complete(prompt, temperature=0.6, max_tokens=600, on_delta=on_delta)
+
+    @traced_section("culture")
+    @coalesced
+    @cached_section("_cultural_tips_prompt")
+    def get_cultural_tips(self, destination: str, on_delta=None) -> str:
+        """Generate cultural etiquette and local tips."""
+        
+        prompt = self._cultural_tips_prompt(destination)
+
+        return self._complete(prompt, temperature=0.6, max_tokens=500, on_delta=on_delta)
+
+    @traced_section("restaurants")
+    @coalesced
+    @cached_section("_restaurant_prompt")
+    def get_restaurant_recommendations(self, destination: str, 
+                                      dietary_restrictions: list = None,
+                                      meal_type: str = "all",
+                                      budget: str = "moderate", on_delta=None) -> str:
+        """Generate restaurant recommendations with dietary filters."""
+        
+        prompt = self._restaurant_prompt(destination, dietary_restrictions, meal_type, budget)
+
+        return self._complete(prompt, temperature=0.7, max_tokens=700, on_delta=on_delta)
+
+    @traced_section("currency")
+    @coalesced
+    @cached_section("_currency_prompt")
+    def get_currency_info(self, destination: str, on_delta=None) -> str:
+        """Get currency and payment information."""
         
-        return response.choices[0].message.content
+        currency = currency_for(destination)
+        if currency is not None:
+            # Answered from the bundled FX snapshot, so there is nothing worth caching
+            skip_cache()
+            box = currency_box(currency)
+            if on_delta:
+                on_delta(box)
+            return box
+
+        prompt = self._currency_prompt(destination)
+
+        return self._complete(prompt, temperature=0.5, max_tokens=200, on_delta=on_delta)
+
+    def plan_tasks(self, destination: str, start_date: str, end_date: str,
+                   travel_style: str = "moderate", num_travelers: int = 1,
+                   interests: str = "general sightseeing", dietary_restrictions: list = None,
+                   sections: list = None) -> dict:
+        """Map each requested plan section to the agent call that produces it."""
+        tasks = {
+            "budget": (self.estimate_budget, (destination, start_date, end_date, travel_style, num_travelers)),
+            "packing": (self.generate_packing_list, (destination, start_date, end_date, travel_style)),
+            "itinerary": (self.generate_itinerary, (destination, start_date, end_date, interests)),
+            "transport": (self.get_public_transport_guide, (destination,)),
+            "culture": (self.get_cultural_tips, (destination,)),
+            "restaurants": (self.get_restaurant_recommendations,
+                            (destination, dietary_restrictions or None, "all", travel_style)),
+            "currency": (self.get_currency_info, (destination,)),
+        }
+        if sections is not None:
+            tasks = {key: task for key, task in tasks.items() if key in sections}
+        return tasks
+
+    def _batch_spec(self, method: str, args: tuple):
+        """(prompt, max_tokens, finish) for a section in a batched request, or None if it can't be batched.
+
+        finish turns the section's raw markdown into the method's return value,
+        or returns None when the text fails validation.
+        """
+        if method == "generate_packing_list":
+            destination, start_date, end_date, travel_style = args
+            weather_line = self._packing_weather_line(destination, start_date)
+
+            def finish(text):
+                if "**WEATHER**:" not in text:
+                    text = f"{weather_line}\n\n{text}"
+                if not _packing_list_valid(text):
+                    text = repair_packing_list(text, weather_line, travel_style, destination)
+                    if text and _packing_list_valid(text):
+                        record_repair("local")
+                return text if _packing_list_valid(text) else None
+            return self._packing_list_prompt(destination, start_date, end_date, travel_style, weather_line), 800, finish
+        if method == "estimate_budget":
+            destination, start_date, end_date, travel_style, num_travelers = args
+
+            currency = currency_for(destination)
+
+            def finish(text):
+                if currency is not None:
+                    text = localize_budget(text, currency)
+                if not _budget_valid(text):
+                    text = repair_budget(text, _trip_days(start_date, end_date), num_travelers)
+                    if text and _budget_valid(text):
+                        record_repair("local")
+                if not _budget_valid(text):
+                    return None
+                return {
+                    "budget_text": text,
+                    "num_days": _trip_days(start_date, end_date),
+                    "num_travelers": num_travelers
+                }
+            return self._budget_prompt(*args), 900, finish
+
+        def finish(text):
+            return text if _section_valid(text) else None
+        if method == "generate_itinerary":
+            if _trip_days(args[1], args[2]) > ITINERARY_SINGLE_CALL_DAYS:
+                # Long trips are chunked, which a single batched answer can't do
+                return None
+            return self._itinerary_prompt(*args), 1200, finish
+        if method == "get_public_transport_guide":
+            return self._transport_prompt(*args), 600, finish
+        if method == "get_cultural_tips":
+            return self._cultural_tips_prompt(*args), 500, finish
+        if method == "get_restaurant_recommendations":
+            return self._restaurant_prompt(*args), 700, finish
+        if method == "get_currency_info":
+            if currency_for(*args) is not None:
+                return None
+            return self._currency_prompt(*args), 200, finish
+        return None
+
+    @traced_section("batch")
+    def generate_batched(self, tasks: dict) -> dict:
+        """Generate several plan sections with one JSON-structured completion.
+
+        Takes tasks as returned by plan_tasks and returns {key: result} for the
+        sections that came back valid (or were already cached). Sections missing
+        from the result need their own per-section call.
+        """
+        results = {}
+        specs = {}
+        for key, (fn, args) in tasks.items():
+            method = fn.__func__
+            cache_key, hit = method.cache_lookup(self, *args)
+            if hit is not None:
+                results[key] = hit
+                continue
+            spec = self._batch_spec(method.__name__, args)
+            if spec is not None:
+                specs[key] = (method, cache_key) + spec
+        if not specs:
+            return results
+
+        keys = ", ".join(f'"{key}"' for key in specs)
+        instructions = "\n\n".join(f"=== {key} ===\n{spec[2]}" for key, spec in specs.items())
+        prompt = f"""Write several sections of one travel plan and return them as a single JSON object.
+
+The JSON object must have exactly these keys: {keys}.
+Each value is one markdown string (use \\n for line breaks) that follows the instructions for that key below exactly.
+
+{instructions}"""
+
+        raw = self._complete(
+            prompt,
+            temperature=0.6,
+            max_tokens=min(BATCH_MAX_TOKENS, sum(spec[3] for spec in specs.values())),
+            response_format={"type": "json_object"}
+        )
+        try:
+            payload = json.loads(raw)
+        except (TypeError, ValueError):
+            return results
+
+        for key, (method, cache_key, _, _, finish) in specs.items():
+            text = payload.get(key)
+            result = finish(text.strip()) if isinstance(text, str) else None
+            if result is not None:
+                text = result["budget_text"] if isinstance(result, dict) else result
+                if not has_placeholders(text):
+                    method.cache_store(self, cache_key, result)
+                results[key] = result
+        return results
+
+    def fallback_section(self, key: str, fn, args: tuple):
+        """Answer a section without DeepSeek: its cached answer even if expired, else a built-in template."""
+        stale = getattr(fn.__func__, "cache_stale", None)
+        cached = stale(self, *args) if stale else None
+        if cached is not None:
+            return cached
+        destination = args[0]
+        currency = currency_for(destination)
+        if key == "packing":
+            _, _, _, travel_style = args
+            weather_line = "**WEATHER**: Check the forecast a few days before you leave"
+            return packing_fallback(weather_line, travel_style, destination)
+        if key == "budget":
+            _, start_date, end_date, _, num_travelers = args
+            num_days = _trip_days(start_date, end_date)
+            if currency is not None:
+                content = budget_fallback(num_days, num_travelers, currency_line(currency))
+            else:
+                content = budget_fallback(num_days, num_travelers)
+            return {
+                "budget_text": content,
+                "num_days": num_days,
+                "num_travelers": num_travelers
+            }
+        if key == "currency" and currency is not None:
+            return currency_box(currency)
+        return section_fallback(key, destination)
+
+    def run_sections(self, tasks: dict, max_workers: int = None, stream: bool = False,
+                     prefetched: dict = None, batched: bool = False, plan_deadline: float = None):
+        """Run section calls on a bounded thread pool, yielding (event, key, payload) as they happen.
+
+        Events are "done" with the section result and, when stream is set, "delta"
+        with each new chunk of text. Sections with a future in prefetched reuse it
+        instead of issuing a new call, unless it failed or was cancelled. With
+        batched set, the remaining sections are first requested together through
+        generate_batched and only the ones it could not deliver get their own call.
+
+        Each section gets its share of plan_deadline seconds (PLAN_DEADLINE by
+        default, 0 for none). A section that runs out of time or whose DeepSeek
+        call fails is answered by fallback_section, announced by a "degraded"
+        event with the reason ("timeout" or "error") just before its "done".
+        Other section errors are re-raised in the caller.
+        """
+        if not tasks:
+            return
+        events = queue.Queue()
+        plan_deadline = PLAN_DEADLINE if plan_deadline is None else plan_deadline
+        plan_started = time.monotonic()
+
+        def degrade(key, reason):
+            events.put(("degraded", key, (reason, self.fallback_section(key, *tasks[key]))))
+
+        def run(key, fn, args):
+            kwargs = {"on_delta": lambda delta: events.put(("delta", key, delta))} if stream else {}
+            try:
+                with deadline(section_deadline(key, plan_started, plan_deadline)):
+                    events.put(("done", key, fn(*args, **kwargs)))
+            except (TimeoutError, APIError) as e:
+                logger.warning("Section %s degraded: %s: %s", key, type(e).__name__, e)
+                degrade(key, "timeout" if isinstance(e, (TimeoutError, APITimeoutError)) else "error")
+            except Exception as e:
+                events.put(("error", key, e))
+
+        def resubmit(key, fn, args):
+            # Prefetches and batches can fail after the plan has finished or given up on them
+            if closed.is_set():
+                return
+            try:
+                pool.submit(run, key, fn, args)
+            except RuntimeError:
+                # The pool shut down between the check and the submit
+                pass
+
+        def adopt(key, future):
+            def done(f):
+                if f.cancelled() or f.exception() is not None:
+                    resubmit(key, *tasks[key])
+                else:
+                    events.put(("done", key, f.result()))
+            future.add_done_callback(done)
+
+        def run_batch(batch):
+            try:
+                with deadline(section_deadline("batch", plan_started, plan_deadline)):
+                    results = self.generate_batched(batch)
+            except Exception as e:
+                logger.warning("Batched generation failed, using per-section calls: %s", e)
+                results = {}
+            for key, (fn, args) in batch.items():
+                if key in results:
+                    events.put(("done", key, results[key]))
+                else:
+                    resubmit(key, fn, args)
+
+        prefetched = prefetched or {}
+        closed = threading.Event()
+        workers = max(1, min(len(tasks), max_workers or PLAN_MAX_WORKERS))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tripmate-section")
+        try:
+            batch = {}
+            for key, (fn, args) in tasks.items():
+                if key in prefetched:
+                    adopt(key, prefetched[key])
+                elif batched:
+                    batch[key] = (fn, args)
+                else:
+                    pool.submit(run, key, fn, args)
+            if batch:
+                pool.submit(run_batch, batch)
+            pending = set(tasks)
+            # Sections enforce their own deadlines; this only catches calls that ignore theirs
+            give_up = plan_started + plan_deadline + DEADLINE_GRACE if plan_deadline else None
+            while pending:
+                try:
+                    timeout = None if give_up is None else max(0.0, give_up - time.monotonic())
+                    event, key, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    for key in list(pending):
+                        logger.warning("Section %s degraded: no answer by the plan deadline", key)
+                        pending.discard(key)
+                        yield "degraded", key, "timeout"
+                        yield "done", key, self.fallback_section(key, *tasks[key])
+                    break
+                if key not in pending:
+                    continue
+                if event == "error":
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise payload
+                if event == "degraded":
+                    reason, payload = payload
+                    yield "degraded", key, reason
+                    event = "done"
+                if event == "done":
+                    pending.discard(key)
+                yield event, key, payload
+        finally:
+            # Calls still running finish in the background instead of holding up the plan
+            closed.set()
+            pool.shutdown(wait=False)
+
+    def prefetch(self, tasks: dict):
+        """Start section calls in the background; returns (cancel_event, {key: Future}).
+
+        Setting the cancel event drops queued calls and aborts in-flight ones at
+        their next streamed chunk.
+        """
+        cancel = threading.Event()
+
+        def check(_delta):
+            if cancel.is_set():
+                raise PrefetchCancelled()
+
+        def run(fn, args):
+            check(None)
+            return fn(*args, on_delta=check)
+
+        futures = {key: self.prefetch_pool.submit(run, fn, args) for key, (fn, args) in tasks.items()}
+        return cancel, futures
+
+    def refresh(self, tasks: dict, fresh: bool = False) -> dict:
+        """Regenerate sections in the background with no deadline; returns {key: Future}.
+
+        Results land in the response cache as usual, so the next plan for the
+        same trip gets them straight away. With fresh set, cached answers are
+        ignored and every section gets a new completion.
+        """
+        def run(fn, args):
+            if not fresh:
+                return fn(*args)
+            with bypass_cache():
+                return fn(*args)
+
+        return {key: self.prefetch_pool.submit(run, fn, args) for key, (fn, args) in tasks.items()}
+
+    def stream(self, method, *args, **kwargs):
+        """Yield text deltas from a section method as they arrive; the generator returns its final result."""
+        events = queue.Queue()
+
+        def run():
+            try:
+                events.put(("done", method(*args, on_delta=lambda delta: events.put(("delta", delta)), **kwargs)))
+            except Exception as e:
+                events.put(("error", e))
+
+        threading.Thread(target=run, daemon=True, name="tripmate-stream").start()
+        while True:
+            event, payload = events.get()
+            if event == "delta":
+                yield payload
+            elif event == "error":
+                raise payload
+            else:
+                return payload
@@ -0,0 +1,212 @@
+"""Async HTTP API for TripMate, for clients that don't need the Streamlit page.
+
+Endpoints (trip fields as in trips.py, sent as a JSON body):
+    POST /plan                  every requested section as JSON
+    POST /sections/{section}    one section as JSON
+    Each section carries its markdown and the same text parsed into blocks
+    (headings, bullets, day lines...) as the app renders them.
+    Add ?stream=1 to either to get server-sent events instead: "delta" with
+    each chunk of text, "section" with each finished section and a final "done".
+    Sections that ran out of time or hit a DeepSeek error come back as
+    fallbacks with "degraded" set to the reason.
+    GET  /health, GET /metrics  liveness and Prometheus metrics
+
+Every request runs on this process's shared agent, so concurrent requests
+share its connection pools, weather cache and request coalescing. Run as its
+own uvicorn process, the API shares only the SQLite response cache
+(TRIPMATE_CACHE_PATH) with the Streamlit app, not the app's in-memory pools,
+coalescing or render cache.
+
+Usage:
+    python api.py            # or: uvicorn api:app --workers 1
+"""
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import anyio
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent import get_shared_agent
+from currency import currency_for
+from render import SECTION_LAYOUT, parse_markdown
+from telemetry import METRICS
+from trips import ALL_SECTIONS, normalize_trip
+
+API_HOST = os.getenv("TRIPMATE_API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("TRIPMATE_API_PORT", "8000"))
+# Worker threads for blocking agent calls; each in-flight plan holds one
+API_THREADS = int(os.getenv("TRIPMATE_API_THREADS", "64"))
+
+SECTION_TITLES = {key: title for key, title, _, _ in SECTION_LAYOUT}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+async def _read_trip(request: Request, section: str = None) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("Request body must be a JSON object")
+    if not isinstance(body, dict):
+        raise BadRequest("Request body must be a JSON object")
+    if section is not None:
+        body["sections"] = [section]
+    try:
+        trip = normalize_trip(body)
+        start = datetime.strptime(trip["start_date"], "%Y-%m-%d")
+        end = datetime.strptime(trip["end_date"], "%Y-%m-%d")
+    except (TypeError, ValueError) as e:
+        raise BadRequest(str(e))
+    if end < start:
+        raise BadRequest("end_date is before start_date")
+    unknown = set(trip["sections"]) - set(ALL_SECTIONS)
+    if unknown:
+        raise BadRequest(f"Unknown sections: {', '.join(sorted(unknown))}")
+    return trip
+
+
+def _tasks(trip: dict) -> dict:
+    return get_shared_agent().plan_tasks(
+        trip["destination"], trip["start_date"], trip["end_date"],
+        travel_style=trip["travel_style"],
+        num_travelers=trip["num_travelers"],
+        interests=", ".join(trip["interests"]) or "general sightseeing",
+        dietary_restrictions=trip["dietary_restrictions"] or None,
+        sections=trip["sections"] or ALL_SECTIONS,
+    )
+
+
+def _blocks(markdown: str) -> list:
+    """The section as parsed blocks, as the app renders them: [{"kind", "spans": [{"text", "bold"}]}]."""
+    return [{"kind": kind, "spans": [{"text": text, "bold": bold} for text, bold in spans]}
+            for kind, spans in parse_markdown(markdown)]
+
+
+def _section_json(key: str, result, trip: dict, degraded: str = None) -> dict:
+    """A finished section as {"title", "markdown", "blocks", "degraded", ...} with any structured fields it has.
+
+    degraded is the reason the section fell back ("timeout" or "error"), or None.
+    """
+    section = {"title": SECTION_TITLES[key], "degraded": degraded}
+    if key == "budget":
+        currency = currency_for(trip["destination"])
+        section.update({
+            "markdown": result["budget_text"],
+            "blocks": _blocks(result["budget_text"]),
+            "num_days": result["num_days"],
+            "num_travelers": result["num_travelers"],
+            "currency": currency.code if currency else None,
+        })
+        return section
+    section["markdown"] = result
+    section["blocks"] = _blocks(result)
+    return section
+
+
+def _plan(trip: dict) -> dict:
+    started = time.perf_counter()
+    tasks = _tasks(trip)
+    sections = {}
+    degraded = {}
+    for event, key, result in get_shared_agent().run_sections(tasks):
+        if event == "degraded":
+            degraded[key] = result
+        elif event == "done":
+            sections[key] = _section_json(key, result, trip, degraded.get(key))
+    return {
+        "trip": trip,
+        "sections": {key: sections[key] for key in tasks},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream(trip: dict):
+    started = time.perf_counter()
+    tasks = await run_in_threadpool(_tasks, trip)
+    degraded = {}
+    try:
+        # Each step of the generator blocks on the section pool, so it runs on a worker thread
+        async for event, key, payload in iterate_in_threadpool(
+                get_shared_agent().run_sections(tasks, stream=True)):
+            if event == "delta":
+                yield _sse("delta", {"section": key, "text": payload})
+            elif event == "degraded":
+                degraded[key] = payload
+            else:
+                yield _sse("section", {"section": key, **_section_json(key, payload, trip, degraded.get(key))})
+    except Exception as e:
+        yield _sse("error", {"error": f"{type(e).__name__}: {e}"})
+        return
+    yield _sse("done", {"seconds": round(time.perf_counter() - started, 3)})
+
+
+async def _respond(request: Request, trip: dict):
+    if request.query_params.get("stream") in ("1", "true"):
+        return StreamingResponse(_stream(trip), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return JSONResponse(await run_in_threadpool(_plan, trip))
+
+
+async def plan(request: Request):
+    return await _respond(request, await _read_trip(request))
+
+
+async def section(request: Request):
+    name = request.path_params["section"]
+    if name not in ALL_SECTIONS:
+        return JSONResponse({"error": f"Unknown section: {name}"}, status_code=404)
+    return await _respond(request, await _read_trip(request, name))
+
+
+async def health(request: Request):
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request: Request):
+    return PlainTextResponse(METRICS.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def bad_request(request: Request, exc: BadRequest):
+    return JSONResponse({"error": str(exc)}, status_code=400)
+
+
+async def server_error(request: Request, exc: Exception):
+    return JSONResponse({"error": f"{type(exc).__name__}: {exc}"}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADS
+    # Build the agent (and pre-warm its pools) before the first request
+    await run_in_threadpool(get_shared_agent)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/plan", plan, methods=["POST"]),
+        Route("/sections/{section}", section, methods=["POST"]),
+        Route("/health", health),
+        Route("/metrics", metrics),
+    ],
+    exception_handlers={BadRequest: bad_request, Exception: server_error},
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -1,16 +1,16 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from agent import TripMateAgent
+from agent import get_shared_agent, section_inputs
+from city_index import fold, search_cities
+from currency import currency_for
+from render import RENDER_CACHE, SECTION_LAYOUT, clean_html_output, pdf_sections, plan_pdf, section_html
+from telemetry import METRICS
 import base64
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-import re
+import functools
+import logging
 import os
+import time
 
 # Page configuration
 st.set_page_config(
@@ -20,30 +20,79 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+logger = logging.getLogger(__name__)
+
+# Built by scripts/build_static_assets.py; Streamlit serves this folder at app/static/
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_FORMATS = (("avif", "image/avif"), ("webp", "image/webp"), ("png", "image/png"))
+
+
+@functools.lru_cache(maxsize=None)
 def get_base64_of_bin_file(bin_file):
+    """Base64 of a file, read and encoded once per process."""
     with open(bin_file, 'rb') as f:
         data = f.read()
     return base64.b64encode(data).decode()
 
 
+@functools.lru_cache(maxsize=None)
+def static_variants(stem):
+    """(url, mime type) of each built variant of an image in static/, best format first.
+
+    Empty when static serving is off or the assets haven't been built. The
+    ?v= part changes with every rebuild, so browsers never keep a stale copy.
+    """
+    if not st.get_option("server.enableStaticServing"):
+        return ()
+    variants = []
+    for ext, mime in STATIC_FORMATS:
+        path = os.path.join(STATIC_DIR, f"{stem}.{ext}")
+        if os.path.exists(path):
+            variants.append((f"app/static/{stem}.{ext}?v={int(os.path.getmtime(path))}", mime))
+    return tuple(variants)
+
+
+@functools.lru_cache(maxsize=None)
+def background_css(image_file):
+    variants = static_variants(os.path.splitext(image_file)[0])
+    if variants:
+        # Browsers without image-set() type() support keep the first declaration
+        fallback = f'url("{variants[-1][0]}")'
+        image_set = ", ".join(f'url("{url}") type("{mime}")' for url, mime in variants)
+        images = [fallback, f"image-set({image_set})"]
+    else:
+        images = [f'url("data:image/png;base64,{get_base64_of_bin_file(image_file)}")']
+    declarations = "\n            ".join(
+        f"background-image: linear-gradient(rgba(255,255,255,0.85), rgba(255,255,255,0.85)), {image};"
+        for image in images
+    )
+    return f"""
+        <style>
+        .stApp {{
+            {declarations}
+            background-size: 400px;
+            background-repeat: repeat;
+            background-attachment: fixed;
+        }}
+        </style>
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def logo_html(image_file):
+    variants = static_variants(os.path.splitext(image_file)[0])
+    if not variants:
+        src = f"data:image/png;base64,{get_base64_of_bin_file(image_file)}"
+        return f"<div class='logo-wrap'><img src='{src}' alt='TripMate logo'></div>"
+    sources = "".join(f"<source srcset='{url}' type='{mime}'>" for url, mime in variants[:-1])
+    return (f"<div class='logo-wrap'><picture>{sources}"
+            f"<img src='{variants[-1][0]}' alt='TripMate logo'></picture></div>")
+
 
 # Function to set background image
 def set_background(image_file):
     try:
-        with open(image_file, "rb") as f:
-            img_data = f.read()
-        b64_encoded = base64.b64encode(img_data).decode()
-        style = f"""
-            <style>
-            .stApp {{
-                background-image: linear-gradient(rgba(255,255,255,0.85), rgba(255,255,255,0.85)), url("data:image/png;base64,{b64_encoded}");
-                background-size: 400px;
-                background-repeat: repeat;
-                background-attachment: fixed;
-            }}
-            </style>
-        """
-        st.markdown(style, unsafe_allow_html=True)
+        st.markdown(background_css(image_file), unsafe_allow_html=True)
     except:
         pass
 
@@ -320,316 +369,210 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_cities():
-    """Load cities data from CSV with City, Country format."""
-    try:
-        df = pd.read_csv('cities_geonames_1000.csv')
-        
-        if 'csv_loaded' not in st.session_state:
-            st.session_state.csv_loaded = True
-            # print(f"CSV columns: {df.columns.tolist()}")
-        
-        # Find city name column
-        city_col = None
-        for col in ['name', 'city', 'city_name', 'geoname', 'asciiname']:
-            if col in df.columns:
-                city_col = col
-                break
-        
-        if city_col is None:
-            city_col = df.columns[0]
-        
-        # Find country column
-        country_col = None
-        for col in ['country', 'country_name', 'country_code', 'countrycode', 'iso2', 'cc']:
-            if col in df.columns:
-                country_col = col
-                break
-        
-        # Create display names
-        if country_col:
-            df['display_name'] = df[city_col].astype(str) + ', ' + df[country_col].astype(str)
-            city_mapping = dict(zip(df['display_name'], df[city_col]))
-        else:
-            df['display_name'] = df[city_col].astype(str)
-            city_mapping = dict(zip(df['display_name'], df[city_col]))
-        
-        display_names = df['display_name'].dropna().unique().tolist()
-        display_names_sorted = sorted(display_names)
-        
-        return display_names_sorted, city_mapping
-        
-    except FileNotFoundError:
-        # No default cities - return empty
-        return [], {}
-    except Exception as e:
-        print(f"Error loading cities: {str(e)}")
-        return [], {}
-
-def clean_html_output(text):
-    """Clean up HTML output properly - convert markdown to HTML."""
-    if not text:
-        return ""
-    
-    text = text.strip()
-    # Prevent Streamlit/KaTeX from interpreting currency amounts as math
-    text = text.replace('$', '__DOLLAR__')
-    
-    # CRITICAL FIRST: Unescape HTML entities (&lt; becomes <, &gt; becomes >)
-    text = text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
-    text = text.replace('&#60;', '<').replace('&#62;', '>').replace('&#38;', '&')
-
-    # Strip fenced code blocks, inline backticks, and HTML code wrappers
-    text = re.sub(r'```[a-zA-Z0-9_-]*\n?', '', text)
-    text = text.replace('```', '')
-    text = text.replace('`', '')
-    text = re.sub(r'</?pre[^>]*>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?code[^>]*>', '', text, flags=re.IGNORECASE)
-    
-    # If text contains literal "<h4>" strings, we need to remove them completely
-    # This is a nuclear option for stubborn cases
-    if '<h4>' in text.lower():
-        # Remove all h4 tags and their content, replacing with markdown
-        text = re.sub(r'<h4[^>]*>(.*?)</h4>', r'**\1**', text, flags=re.IGNORECASE | re.DOTALL)
-        # Also catch any orphaned tags
-        text = text.replace('<h4>', '').replace('</h4>', '')
-        text = text.replace('<H4>', '').replace('</H4>', '')
-    
-    # First pass: Strip ALL HTML tags and convert to plain text with markdown
-    # This prevents double-encoding issues
-    text = re.sub(r'<h4[^>]*>(.*?)</h4>', r'**\1**', text, flags=re.IGNORECASE)
-    text = re.sub(r'<h3[^>]*>(.*?)</h3>', r'**\1**', text, flags=re.IGNORECASE)
-    text = re.sub(r'<h2[^>]*>(.*?)</h2>', r'**\1**', text, flags=re.IGNORECASE)
-    text = re.sub(r'<strong[^>]*>(.*?)</strong>', r'**\1**', text, flags=re.IGNORECASE)
-    text = re.sub(r'<b[^>]*>(.*?)</b>', r'**\1**', text, flags=re.IGNORECASE)
-    text = re.sub(r'<em[^>]*>(.*?)</em>', r'*\1*', text, flags=re.IGNORECASE)
-    text = re.sub(r'<i[^>]*>(.*?)</i>', r'*\1*', text, flags=re.IGNORECASE)
-    
-    # Remove any remaining stray HTML tags
-    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
-    text = re.sub(r'<p[^>]*>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</p>', '\n', text, flags=re.IGNORECASE)
-    text = re.sub(r'<ul[^>]*>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</ul>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'<li[^>]*>', '• ', text, flags=re.IGNORECASE)
-    text = re.sub(r'</li>', '\n', text, flags=re.IGNORECASE)
-    
-    # CATCH-ALL: Remove any other HTML tags that might remain
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Now process clean markdown into proper HTML
-    lines = text.split('\n')
-    result_lines = []
-    in_list = False
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
+# Sections that depend only on the destination, started as soon as one is picked
+PREFETCH_SECTIONS = ['transport', 'culture', 'currency']
+PREFETCH_ENABLED = os.getenv("TRIPMATE_PREFETCH", "1") != "0"
+
+# Request all sections in one JSON completion instead of one call per section
+BATCH_SECTIONS = os.getenv("TRIPMATE_BATCH_SECTIONS", "0") == "1"
+
+# Minimum seconds between re-renders of a section box while its text streams in
+STREAM_RENDER_INTERVAL = 0.1
+
+# Show per-section latency, token and cost telemetry in the sidebar
+ADMIN_PANEL = os.getenv("TRIPMATE_ADMIN", "0") == "1"
+
+SECTION_STATUS = {
+    'budget': "💰 Budget estimate",
+    'packing': "🎒 Packing list",
+    'itinerary': "📅 Itinerary",
+    'transport': "🚇 Transport guide",
+    'culture': "🌍 Cultural tips",
+    'restaurants': "🍴 Restaurant guide",
+    'currency': "💱 Currency information",
+}
+
+DEGRADED_NOTES = {
+    'timeout': "⏱️ Quick fallback - the full answer took too long. Refresh it below.",
+    'error': "⚠️ Quick fallback - the AI service was unavailable. Refresh it below.",
+}
+
+# Seconds between checks on sections being refreshed in the background
+REFRESH_POLL_INTERVAL = 2
+
+def create_section_slots():
+    """Reserve one placeholder per section so boxes keep their order while filled out of order."""
+    st.markdown('<div class="box-container">', unsafe_allow_html=True)
+    slots = {key: st.empty() for key, _, _, _ in SECTION_LAYOUT if key != 'currency'}
+    st.markdown('</div>', unsafe_allow_html=True)
+    # Currency box sits below the grid
+    slots['currency'] = st.empty()
+    return slots
+
+def render_section(slot, key, content, degraded=None, partial=False):
+    """Render one section's markdown into its styled box; degraded is the reason it fell back, if it did.
+
+    partial marks text that is still streaming in, which isn't worth caching.
+    """
+    title, box_class = next((t, c) for k, t, c, _ in SECTION_LAYOUT if k == key)
+    body = clean_html_output(content) if partial else section_html(content)
+    if degraded:
+        body = f"<p><em>{DEGRADED_NOTES[degraded]}</em></p>" + body
+    
+    if key == 'restaurants':
+        dietary = st.session_state.trip_info.get('dietary')
+        dietary_note = f"<p><em>🥗 Filtered for: {', '.join(dietary)}</em></p>" if dietary else ""
+        full_html = (
+            f'<div class="info-box {box_class}">'
+            f'<div class="section-title">{title}</div>'
+            f'{dietary_note}'
+            f'{body.lstrip()}'
+            f'</div>'
+        )
+        slot.markdown(full_html, unsafe_allow_html=True)
+        return
+    
+    # Currency box - only show if has content
+    if key == 'currency' and not body.strip():
+        return
+    
+    slot.markdown(f'''
+    <div class="info-box {box_class}">
+        <div class="section-title">{title}</div>
+        {body}
+    </div>
+    ''', unsafe_allow_html=True)
+
+def update_prefetch(agent, destination):
+    """Keep the session's prefetch buffer in step with the chosen destination."""
+    current = st.session_state.get('prefetch')
+    if current and current['destination'] == destination:
+        return
+    if current:
+        # Destination changed: abandon the old prefetch
+        current['cancel'].set()
+        for future in current['futures'].values():
+            future.cancel()
+    st.session_state.prefetch = None
+    if not destination:
+        return
+    tasks = agent.plan_tasks(destination, None, None, sections=PREFETCH_SECTIONS)
+    cancel, futures = agent.prefetch(tasks)
+    st.session_state.prefetch = {'destination': destination, 'cancel': cancel, 'futures': futures}
+
+@st.fragment(run_every=REFRESH_POLL_INTERVAL)
+def poll_refresh():
+    """Swap in background-refreshed sections as they finish."""
+    refreshing = st.session_state.refreshing
+    finished = [key for key, future in refreshing.items() if future.done()]
+    for key in finished:
+        future = refreshing.pop(key)
+        if future.exception() is not None:
+            logger.warning("Background refresh of section %s failed: %s", key, future.exception())
+            st.session_state.refresh_failed.append(key)
             continue
-            
-        # Check for bold markers with headers (these become h4)
-        if line.startswith('**') and line.endswith('**') and len(line) > 4:
-            header_text = line.strip('*').strip()
-            if in_list:
-                result_lines.append('</ul>')
-                in_list = False
-            result_lines.append(f'<h4>{header_text}</h4>')
-        
-        # Check for bullet points
-        elif line.startswith('•') or line.startswith('-'):
-            if not in_list:
-                result_lines.append('<ul>')
-                in_list = True
-            item_text = line[1:].strip()
-            # Remove any remaining ** markers
-            item_text = item_text.replace('**', '')
-            result_lines.append(f'<li>{item_text}</li>')
-        
-        # Regular paragraph
-        else:
-            if in_list:
-                result_lines.append('</ul>')
-                in_list = False
-            # Convert ** to strong tags
-            line = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', line)
-            result_lines.append(f'<p>{line}</p>')
-    
-    if in_list:
-        result_lines.append('</ul>')
-    
-    html_output = '\n'.join(result_lines)
-    
-    # Final cleanup: unescape any HTML entities that might have been created
-    import html as html_module
-    html_output = html_module.unescape(html_output)
-    html_output = html_output.replace('__DOLLAR__', '&#36;')
-    
-    # Final check for any literal h4 tags that escaped earlier processing
-    # Keep this strictly scoped to a single element to avoid clipping content
-    if '<h4>' in html_output and not html_output.startswith('<h4>'):
-        html_output = re.sub(r'<p>[^<]*?<h4>(.*?)</h4>[^<]*?</p>', r'<p><strong>\1</strong></p>', html_output, flags=re.IGNORECASE)
-        html_output = re.sub(r'<li>[^<]*?<h4>(.*?)</h4>[^<]*?</li>', r'<li><strong>\1</strong></li>', html_output, flags=re.IGNORECASE)
-
-    return html_output
-
-def create_pdf(content_dict, destination, dates):
-    """Create a compact PDF without page breaks between sections."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter,
-                           rightMargin=72, leftMargin=72,
-                           topMargin=72, bottomMargin=18)
-    
-    styles = getSampleStyleSheet()
-    def _strip_emoji(text: str) -> str:
-        if not text:
-            return ""
-        # Keep ASCII only to avoid broken glyphs in PDF
-        return "".join(ch for ch in text if ord(ch) < 128)
-
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor='#6B9AC4',
-        spaceAfter=6,
-        alignment=TA_CENTER
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor='#2D3561',
-        spaceAfter=20,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor='#2D3561',
-        spaceAfter=10,
-        spaceBefore=16
-    )
-    
-    # Style for bold category headers (like CLOTHING, ELECTRONICS)
-    category_style = ParagraphStyle(
-        'CategoryHeader',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor='#2D3561',
-        fontName='Helvetica-Bold',
-        spaceAfter=6,
-        spaceBefore=10
-    )
-    
-    # Style for subheadings (like "Food Markets:", "Key Tips:", "Day 1:")
-    subheading_style = ParagraphStyle(
-        'Subheading',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor='#2D3561',
-        fontName='Helvetica-Bold',
-        spaceAfter=6,
-        spaceBefore=10
-    )
+        result = future.result()
+        st.session_state.generated_content[key] = result['budget_text'] if key == 'budget' else result
+        st.session_state.degraded.pop(key, None)
+    if finished:
+        st.session_state.pdf_content = pdf_sections(st.session_state.generated_content)
+        st.rerun()
+    st.info(f"🔄 Refreshing {len(refreshing)} section(s) in the background...")
 
-    body_style = ParagraphStyle(
-        'Body',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=14
-    )
-    
-    story = []
-    
-    # Title and dates
-    story.append(Paragraph(_strip_emoji(f"TripMate AI - {destination}"), title_style))
-    story.append(Spacer(1, 0.08*inch))
-    story.append(Paragraph(_strip_emoji(f"{dates}"), subtitle_style))
-    
-    # Add each section WITHOUT page breaks
-    for section_title, content in content_dict.items():
-        if content:
-            # Add spacing between sections instead of page break
-            story.append(Spacer(1, 0.3*inch))
-            story.append(Paragraph(_strip_emoji(section_title), heading_style))
-            story.append(Spacer(1, 0.14*inch))
-            
-            # Split content into lines
-            lines = content.split('\n')
-            for line in lines:
-                line = _strip_emoji(line.strip())
-                if not line:
-                    continue
-                
-                # Check if line is a category header (starts and ends with **)
-                if line.startswith('**') and line.endswith('**'):
-                    # This is a category header - make it bold with spacing
-                    category_text = line.strip('*').strip()
-                    story.append(Spacer(1, 0.08*inch))  # Space before category
-                    story.append(Paragraph(category_text, category_style))
-                    story.append(Spacer(1, 0.04*inch))
-                
-                # Day headings (add extra spacing between days)
-                elif line.startswith('Day ') and len(line) < 80:
-                    subheading_text = line.replace('**', '')
-                    story.append(Spacer(1, 0.16*inch))
-                    story.append(Paragraph(subheading_text, subheading_style))
-                    story.append(Spacer(1, 0.06*inch))
-                
-                # Check if line is a subheading (ends with : and is short)
-                elif line.endswith(':') and len(line) < 80:
-                    subheading_text = line.replace('**', '')
-                    story.append(Spacer(1, 0.06*inch))  # Space before subheading
-                    story.append(Paragraph(subheading_text, subheading_style))
-                    story.append(Spacer(1, 0.04*inch))
-                
-                # Check if line is a bullet point
-                elif line.startswith('•') or line.startswith('-'):
-                    # Regular bullet point
-                    bullet_text = line[1:].strip()
-                    # Remove any remaining ** markers
-                    bullet_text = bullet_text.replace('**', '')
-                    # Convert any remaining markdown to HTML bold
-                    bullet_text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', bullet_text)
-                    try:
-                        story.append(Paragraph(f"  • {bullet_text}", body_style))
-                        story.append(Spacer(1, 0.04*inch))
-                    except:
-                        continue
-                
-                # Regular paragraph with bold text
-                else:
-                    # Convert ** to <b> tags for PDF
-                    para_text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', line)
-                    try:
-                        story.append(Paragraph(para_text, body_style))
-                        story.append(Spacer(1, 0.05*inch))
-                    except:
-                        continue
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+def render_refresh_controls(agent):
+    """Offer to regenerate degraded sections without blocking the page."""
+    if st.session_state.refreshing:
+        poll_refresh()
+        return
+    if st.session_state.refresh_failed:
+        names = ", ".join(SECTION_STATUS[key] for key in st.session_state.refresh_failed)
+        st.error(f"Couldn't regenerate {names}. Please try again in a moment.")
+    degraded = [key for key in st.session_state.degraded if key in st.session_state.plan_tasks]
+    if not degraded:
+        return
+    names = ", ".join(SECTION_STATUS[key] for key in degraded)
+    st.warning(f"Some sections are quick fallbacks: {names}")
+    if st.button("🔄 Refresh these sections in the background"):
+        st.session_state.refresh_failed = []
+        st.session_state.refreshing = agent.refresh(
+            {key: st.session_state.plan_tasks[key] for key in degraded})
+        st.rerun()
+
+def render_regenerate_controls(agent):
+    """One button per section to replace it with a fresh answer, generated in the background."""
+    keys = [key for key, _, _, _ in SECTION_LAYOUT
+            if key in st.session_state.plan_tasks and key in st.session_state.generated_content]
+    if currency_for(st.session_state.trip_info['destination_city']) is not None:
+        # Built from the bundled FX snapshot, so a new answer would be the same
+        keys = [key for key in keys if key != 'currency']
+    if not keys:
+        return
+    st.caption("🔄 Not happy with a section? Regenerate just that one:")
+    for column, key in zip(st.columns(len(keys)), keys):
+        with column:
+            if st.button(SECTION_STATUS[key], key=f"regenerate_{key}", help="Regenerate this section",
+                         disabled=key in st.session_state.refreshing, use_container_width=True):
+                st.session_state.refresh_failed = []
+                st.session_state.refreshing.update(
+                    agent.refresh({key: st.session_state.plan_tasks[key]}, fresh=True))
+                st.rerun()
+
+def render_admin_panel(agent):
+    """Sidebar telemetry: per-section latency percentiles, tokens, cost and repairs."""
+    with st.expander("📊 Telemetry"):
+        latency = METRICS.percentiles("tripmate_llm_request_seconds", by="section", outcome="ok")
+        prompt_tokens = METRICS.counter_totals("tripmate_llm_tokens_total", by="section", type="prompt")
+        completion_tokens = METRICS.counter_totals("tripmate_llm_tokens_total", by="section", type="completion")
+        cost = METRICS.counter_totals("tripmate_llm_cost_usd_total", by="section")
+        repairs = METRICS.counter_totals("tripmate_repairs_total", by="section")
+        if latency:
+            st.dataframe(pd.DataFrame([
+                {
+                    "section": section,
+                    "calls": stats["count"],
+                    "p50 (s)": round(stats["p50"], 2),
+                    "p95 (s)": round(stats["p95"], 2),
+                    "prompt tokens": int(prompt_tokens.get(section, 0)),
+                    "completion tokens": int(completion_tokens.get(section, 0)),
+                    "cost ($)": round(cost.get(section, 0), 4),
+                    "repairs": int(repairs.get(section, 0)),
+                }
+                for section, stats in sorted(latency.items())
+            ]), hide_index=True)
+        else:
+            st.caption("No model calls yet.")
+        if agent.cache is not None:
+            cache = agent.cache.stats()
+            st.caption(f"Response cache: {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+        render_cache = RENDER_CACHE.stats()
+        st.caption(f"Render cache: {render_cache['hits']} hits, {render_cache['misses']} misses, "
+                   f"{render_cache['entries']} entries ({render_cache['bytes'] / 1024:.0f} KiB)")
+        retries = sum(METRICS.counter_totals("tripmate_llm_retries_total", by="reason").values())
+        st.caption(f"DeepSeek concurrency limit {agent.limiter.concurrency.limit:.1f} "
+                   f"({agent.limiter.concurrency.inflight} in flight), {int(retries)} retries")
+        if agent.hedger is not None:
+            hedges = METRICS.counter_totals("tripmate_llm_hedges_total", by="outcome")
+            st.caption(f"Hedged requests: {int(hedges.get('fired', 0))} fired, {int(hedges.get('won', 0))} won, "
+                       f"{int(hedges.get('skipped', 0))} skipped")
+        coalesced = METRICS.counter_totals("tripmate_singleflight_calls_total", by="flight", role="follower")
+        if coalesced:
+            st.caption("Coalesced calls saved: " + ", ".join(
+                f"{flight} {int(count)}" for flight, count in sorted(coalesced.items())))
+        st.download_button("Prometheus metrics", METRICS.to_prometheus(),
+                           file_name="tripmate_metrics.txt", mime="text/plain")
 
 def main():
     # Display logo if exists
     if os.path.exists("logo.png"):
-        logo_b64 = get_base64_of_bin_file("logo.png")
-        st.markdown(
-            f"<div class='logo-wrap'><img src='data:image/png;base64,{logo_b64}' alt='TripMate logo'></div>",
-            unsafe_allow_html=True,
-        )
+        st.markdown(logo_html("logo.png"), unsafe_allow_html=True)
     
     # Header
    
     st.markdown('<div class="sub-header">Your AI-Powered Travel Planning Assistant</div>', 
                 unsafe_allow_html=True)
     
-    # Initialize agent
-    agent = TripMateAgent()
+    # One agent (and its connection pools) is shared by every session in the process
+    agent = get_shared_agent()
     
     # Initialize session state
     if 'generated_content' not in st.session_state:
@@ -638,36 +581,48 @@ def main():
         st.session_state.pdf_content = {}
     if 'trip_info' not in st.session_state:
         st.session_state.trip_info = {}
+    if 'degraded' not in st.session_state:
+        st.session_state.degraded = {}
+    if 'plan_tasks' not in st.session_state:
+        st.session_state.plan_tasks = {}
+    if 'refreshing' not in st.session_state:
+        st.session_state.refreshing = {}
+    if 'refresh_failed' not in st.session_state:
+        st.session_state.refresh_failed = []
+    if 'section_inputs' not in st.session_state:
+        st.session_state.section_inputs = {}
     
     # Sidebar
     with st.sidebar:
         st.header("Trip Details")
         
-        # Load cities
-        city_options, city_mapping = load_cities()
-        
-        # Destination input
-        if city_options and city_mapping:
+        # Destination input: typed text narrowed down to cities from the index
+        destination_query = st.text_input("Destination (City, Country)",
+                                          placeholder="e.g., Paris, France",
+                                          help="Start typing a city; 'City, Country' narrows it down")
+        destination_display = destination_query.strip()
+        matches = search_cities(destination_display) if destination_display else ()
+        picked_city = False
+        if matches:
+            options = [city["label"] for city in matches]
+            # Places the index doesn't know (regions, islands) can still be planned as typed
+            as_typed = f"{destination_display} (as typed)"
+            options.append(as_typed)
+            # Only a fully typed "City, Country" preselects a city; a bare name could be anywhere
+            typed = fold(destination_display.replace(",", " "))
+            exact = [label for label in options[:-1] if fold(label.replace(",", " ")) == typed]
             destination_display = st.selectbox(
-                "Destination",
-                options=city_options,
-                index=None,
-                placeholder="Choose an option",
-                help="Select your destination city"
+                "Matching cities",
+                options=options,
+                index=options.index(exact[0]) if exact else len(options) - 1,
+                help="Most populous matches first"
             )
-            if destination_display:
-                destination = city_mapping.get(destination_display, destination_display.split(',')[0].strip())
+            if destination_display == as_typed:
+                destination_display = destination_query.strip()
             else:
-                destination = None
-        else:
-            # No CSV or empty - require manual input
-            destination_display = st.text_input("Destination (City, Country)", 
-                                               placeholder="e.g., Paris, France",
-                                               help="Enter destination in 'City, Country' format")
-            if destination_display:
-                destination = destination_display.split(',')[0].strip()
-            else:
-                destination = None
+                picked_city = True
+        # The whole "City, Country" is planned, so same-named cities elsewhere aren't mixed up
+        destination = destination_display or None
         
         # Date inputs
         col1, col2 = st.columns(2)
@@ -733,6 +688,14 @@ def main():
         
         # Generate button
         generate_button = st.button("🚀 Generate Travel Plan", type="primary")
+        
+        if ADMIN_PANEL:
+            render_admin_panel(agent)
+    
+    # Start destination-only sections while the user fills in the rest, but only for a city
+    # from the index: partial or misspelled text would pay for calls thrown away on the next keystroke
+    if PREFETCH_ENABLED:
+        update_prefetch(agent, destination if picked_city else None)
     
     # Main content area
     if generate_button:
@@ -752,9 +715,9 @@ def main():
         
         interest_str = ", ".join(interests) if interests else "general sightseeing"
         
-        # Clear previous content
-        st.session_state.generated_content = {}
         st.session_state.pdf_content = {}
+        st.session_state.refreshing = {}
+        st.session_state.refresh_failed = []
         st.session_state.trip_info = {
             'destination': destination_display if 'destination_display' in locals() else destination,
             'destination_city': destination,
@@ -762,191 +725,116 @@ def main():
             'dietary': dietary_restrictions
         }
         
-        # Progress tracking
-        total_tasks = sum([generate_budget, generate_packing, generate_itinerary, 
-                          generate_transport, generate_culture, generate_restaurants])
-        current_task = 0
-        progress_bar = st.progress(0)
+        # Progress tracking (counts finished sections, not started ones)
+        selected = [key for key, wanted in [
+            ('budget', generate_budget), ('packing', generate_packing),
+            ('itinerary', generate_itinerary), ('transport', generate_transport),
+            ('culture', generate_culture), ('restaurants', generate_restaurants),
+        ] if wanted] + ['currency']
+        trip = dict(
+            travel_style=travel_style.lower(),
+            num_travelers=num_travelers,
+            interests=interest_str,
+            dietary_restrictions=dietary_restrictions,
+            sections=selected,
+        )
+        tasks = agent.plan_tasks(destination, start_str, end_str, **trip)
+        inputs = section_inputs(destination, start_str, end_str, **trip)
+        
+        # Keep sections whose inputs haven't changed since the last plan; fallbacks are retried
+        previous = st.session_state.section_inputs
+        reused = {key: content for key, content in st.session_state.generated_content.items()
+                  if key in tasks and previous.get(key) == inputs[key] and key not in st.session_state.degraded}
+        st.session_state.generated_content = dict(reused)
+        st.session_state.degraded = {}
+        st.session_state.plan_tasks = tasks
+        st.session_state.section_inputs = inputs
+        
+        total_tasks = len(tasks)
+        completed = len(reused)
+        progress_bar = st.progress(completed / total_tasks)
         status_text = st.empty()
-        
-        # Generate sections
-        if generate_budget:
-            current_task += 1
-            status_text.text(f"💰 Generating budget estimate... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Creating budget breakdown..."):
-                budget_data = agent.estimate_budget(
-                    destination, start_str, end_str, 
-                    travel_style.lower(), num_travelers
-                )
-            st.session_state.generated_content['budget'] = budget_data['budget_text']
-            st.session_state.pdf_content['Budget Estimate'] = budget_data['budget_text']
-        
-        if generate_packing:
-            current_task += 1
-            status_text.text(f"🎒 Generating packing list... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Creating your packing list..."):
-                packing_list = agent.generate_packing_list(
-                    destination, start_str, end_str, travel_style.lower()
-                )
-            st.session_state.generated_content['packing'] = packing_list
-            st.session_state.pdf_content['Packing List'] = packing_list
-        
-        if generate_itinerary:
-            current_task += 1
-            status_text.text(f"📅 Generating itinerary... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Planning your itinerary..."):
-                itinerary = agent.generate_itinerary(
-                    destination, start_str, end_str, interest_str
-                )
-            st.session_state.generated_content['itinerary'] = itinerary
-            st.session_state.pdf_content['Itinerary'] = itinerary
-        
-        if generate_transport:
-            current_task += 1
-            status_text.text(f"🚇 Generating transport guide... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Mapping out transportation..."):
-                transport_guide = agent.get_public_transport_guide(destination)
-            st.session_state.generated_content['transport'] = transport_guide
-            st.session_state.pdf_content['Public Transportation'] = transport_guide
-        
-        if generate_culture:
-            current_task += 1
-            status_text.text(f"🌍 Generating cultural tips... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Learning local customs..."):
-                cultural_tips = agent.get_cultural_tips(destination)
-            st.session_state.generated_content['culture'] = cultural_tips
-            st.session_state.pdf_content['Cultural Tips'] = cultural_tips
-        
-        if generate_restaurants:
-            current_task += 1
-            status_text.text(f"🍴 Finding best restaurants... ({current_task}/{total_tasks})")
-            progress_bar.progress(current_task / total_tasks)
-            
-            with st.spinner("Discovering dining spots..."):
-                restaurant_guide = agent.get_restaurant_recommendations(
-                    destination, 
-                    dietary_restrictions if dietary_restrictions else None,
-                    "all",
-                    travel_style.lower()
-                )
-            st.session_state.generated_content['restaurants'] = restaurant_guide
-            st.session_state.pdf_content['Restaurant Guide'] = restaurant_guide
-        
-        # Currency info
-        with st.spinner("Getting currency information..."):
-            currency_info = agent.get_currency_info(destination)
-        st.session_state.generated_content['currency'] = currency_info
-        st.session_state.pdf_content['Currency Information'] = currency_info
+        if reused:
+            status_text.text(f"🚀 Generating {total_tasks - completed} changed sections "
+                             f"({completed} unchanged kept)...")
+        else:
+            status_text.text(f"🚀 Generating {total_tasks} sections in parallel...")
+        section_slots = create_section_slots()
+        for key, content in reused.items():
+            render_section(section_slots[key], key, content)
+        
+        # Sections run concurrently and stream into their boxes; each box gets its
+        # final text as soon as its call returns
+        partial = {}
+        last_render = {}
+        prefetch = st.session_state.get('prefetch')
+        prefetched = prefetch['futures'] if prefetch and prefetch['destination'] == destination else None
+        stale = {key: task for key, task in tasks.items() if key not in reused}
+        for event, key, result in agent.run_sections(stale, stream=True, prefetched=prefetched,
+                                                         batched=BATCH_SECTIONS):
+            if event == 'delta':
+                partial[key] = partial.get(key, '') + result
+                now = time.monotonic()
+                if now - last_render.get(key, 0) >= STREAM_RENDER_INTERVAL:
+                    last_render[key] = now
+                    render_section(section_slots[key], key, partial[key], partial=True)
+                continue
+            if event == 'degraded':
+                st.session_state.degraded[key] = result
+                continue
+            if key == 'budget':
+                result = result['budget_text']
+            st.session_state.generated_content[key] = result
+            completed += 1
+            status_text.text(f"{SECTION_STATUS[key]} ready ({completed}/{total_tasks})")
+            progress_bar.progress(completed / total_tasks)
+            render_section(section_slots[key], key, result, st.session_state.degraded.get(key))
+        
+        # PDF keeps the on-page section order regardless of completion order
+        st.session_state.pdf_content = pdf_sections(st.session_state.generated_content)
         
         progress_bar.progress(1.0)
-        status_text.text("✅ All sections generated successfully!")
+        if st.session_state.degraded:
+            status_text.text(f"⚠️ Plan ready - {len(st.session_state.degraded)} section(s) used quick fallbacks")
+        elif not stale:
+            status_text.text("✅ Nothing changed since the last plan - all sections kept")
+        else:
+            status_text.text("✅ All sections generated successfully!")
+    else:
+        section_slots = None
     
     # Display content
     if st.session_state.generated_content:
         
-        st.markdown('<div class="box-container">', unsafe_allow_html=True)
-        
-        if 'budget' in st.session_state.generated_content:
-            budget_html = clean_html_output(st.session_state.generated_content['budget'])
-            st.markdown(f'''
-            <div class="info-box budget-box">
-                <div class="section-title">💰 Budget Estimate</div>
-                {budget_html}
-            </div>
-            ''', unsafe_allow_html=True)
-        
-        if 'packing' in st.session_state.generated_content:
-            packing_html = clean_html_output(st.session_state.generated_content['packing'])
-            st.markdown(f'''
-            <div class="info-box packing-box">
-                <div class="section-title">🎒 Packing List</div>
-                {packing_html}
-            </div>
-            ''', unsafe_allow_html=True)
-        
-        if 'itinerary' in st.session_state.generated_content:
-            itinerary_html = clean_html_output(st.session_state.generated_content['itinerary'])
-            st.markdown(f'''
-            <div class="info-box itinerary-box">
-                <div class="section-title">📅 Your Itinerary</div>
-                {itinerary_html}
-            </div>
-            ''', unsafe_allow_html=True)
-        
-        if 'transport' in st.session_state.generated_content:
-            transport_html = clean_html_output(st.session_state.generated_content['transport'])
-            st.markdown(f'''
-            <div class="info-box transport-box">
-                <div class="section-title">🚇 Public Transportation</div>
-                {transport_html}
-            </div>
-            ''', unsafe_allow_html=True)
+        # Boxes were already filled live when the plan was generated on this run
+        if section_slots is None:
+            section_slots = create_section_slots()
+            for key, _, _, _ in SECTION_LAYOUT:
+                if key in st.session_state.generated_content:
+                    render_section(section_slots[key], key, st.session_state.generated_content[key],
+                                   st.session_state.degraded.get(key))
         
-        if 'culture' in st.session_state.generated_content:
-            culture_html = clean_html_output(st.session_state.generated_content['culture'])
-            st.markdown(f'''
-            <div class="info-box culture-box">
-                <div class="section-title">🌍 Cultural Tips</div>
-                {culture_html}
-            </div>
-            ''', unsafe_allow_html=True)
-        
-        if 'restaurants' in st.session_state.generated_content:
-            dietary_note = f"<p><em>🥗 Filtered for: {', '.join(st.session_state.trip_info['dietary'])}</em></p>" if st.session_state.trip_info.get('dietary') else ""
-            restaurant_html = clean_html_output(st.session_state.generated_content['restaurants'])
-            restaurant_html = restaurant_html.lstrip()
-            
-            # Use st.components.html for better HTML rendering
-            full_html = (
-                f'<div class="info-box restaurant-box">'
-                f'<div class="section-title">🍴 Where to Eat</div>'
-                f'{dietary_note}'
-                f'{restaurant_html}'
-                f'</div>'
-            )
-            st.markdown(full_html, unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Currency box - only show if has content
-        if 'currency' in st.session_state.generated_content:
-            currency_html = clean_html_output(st.session_state.generated_content['currency'])
-            if currency_html.strip():  # Only show if not empty
-                st.markdown(f'''
-                <div class="info-box currency-box">
-                    <div class="section-title">💱 Currency & Payments</div>
-                    {currency_html}
-                </div>
-                ''', unsafe_allow_html=True)
+        render_refresh_controls(agent)
+        render_regenerate_controls(agent)
         
         # PDF Download - using st.container to wrap everything properly
         with st.container():
             st.markdown('<div class="download-section">', unsafe_allow_html=True)
             st.markdown('<h3 style="color: #2D3561; margin-bottom: 1rem;">📥 Download Your Travel Plan</h3>', unsafe_allow_html=True)
             
-            pdf_buffer = create_pdf(
-                st.session_state.pdf_content, 
-                st.session_state.trip_info['destination'],
-                st.session_state.trip_info['dates']
-            )
+            # Built only when the button is clicked, on the PDF worker pool; the callable runs
+            # outside the script thread, so it gets the plan as it is now rather than session state
+            pdf_content = dict(st.session_state.pdf_content)
+            trip_info = dict(st.session_state.trip_info)
             
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
                 st.download_button(
                     label="Download Complete Travel Plan (PDF)",
-                    data=pdf_buffer,
-                    file_name=f"TripMate_{st.session_state.trip_info['destination_city'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
+                    data=lambda: plan_pdf(pdf_content, trip_info['destination'], trip_info['dates']),
+                    file_name=f"TripMate_{trip_info['destination_city'].replace(',', '').replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
                     mime="application/pdf",
+                    on_click="ignore",
                     use_container_width=True
                 )
             
@@ -0,0 +1,155 @@
+"""Headless batch planning: generate TripMate plans for a file of trips.
+
+Trips come from CSV or JSONL with the fields destination, start_date,
+end_date and optionally id, travel_style, num_travelers, interests,
+dietary_restrictions and sections (list fields are ";"-separated in CSV).
+Each finished trip is appended to the output JSONL as soon as it is done, so
+a rerun with the same output file resumes where the last one stopped and only
+retries trips that are missing, failed or have fallback sections.
+
+Usage:
+    python batch_plan.py trips.csv --output plans.jsonl --concurrency 8 --pdf-dir pdfs/
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agent import get_shared_agent
+from render import create_pdf, pdf_sections
+from trips import ALL_SECTIONS, normalize_trip
+
+def read_trips(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    return [normalize_trip(row) for row in rows]
+
+
+def completed_ids(path: str) -> set:
+    """Ids already planned successfully in an earlier run's output."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a truncated last line
+                continue
+            # Plans with fallback sections are retried too
+            if record.get("status") == "ok" and not record.get("degraded"):
+                done.add(record["id"])
+    return done
+
+
+def plan_trip(agent, trip: dict, batched: bool = False, deadline: float = 0) -> tuple:
+    """Generate every requested section of one trip.
+
+    Returns ({section key: markdown}, {section key: reason}) with the sections
+    that fell back to a placeholder or an expired cached answer in the second.
+    """
+    tasks = agent.plan_tasks(
+        trip["destination"], trip["start_date"], trip["end_date"],
+        travel_style=trip["travel_style"],
+        num_travelers=trip["num_travelers"],
+        interests=", ".join(trip["interests"]) or "general sightseeing",
+        dietary_restrictions=trip["dietary_restrictions"] or None,
+        sections=trip["sections"] or ALL_SECTIONS,
+    )
+    sections = {}
+    degraded = {}
+    for event, key, result in agent.run_sections(tasks, batched=batched, plan_deadline=deadline):
+        if event == "degraded":
+            degraded[key] = result
+        elif event == "done":
+            sections[key] = result["budget_text"] if key == "budget" else result
+    return {key: sections[key] for key in tasks}, degraded
+
+
+def write_pdf(pdf_dir: str, trip: dict, sections: dict) -> str:
+    path = os.path.join(pdf_dir, f"{trip['id']}.pdf")
+    buffer = create_pdf(pdf_sections(sections), trip["destination"],
+                        f"{trip['start_date']} to {trip['end_date']}")
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate TripMate plans for a CSV/JSONL file of trips")
+    parser.add_argument("trips", help="CSV or JSONL file of trips")
+    parser.add_argument("--output", default="plans.jsonl", help="JSONL results file (appended to, used to resume)")
+    parser.add_argument("--concurrency", type=int, default=4, help="trips planned at the same time")
+    parser.add_argument("--pdf-dir", help="also write one PDF per trip into this directory")
+    parser.add_argument("--batched", action="store_true", help="request a trip's sections in one completion")
+    parser.add_argument("--deadline", type=float, default=0,
+                        help="seconds per plan before slow sections fall back (default: no deadline)")
+    args = parser.parse_args()
+
+    trips = read_trips(args.trips)
+    done = completed_ids(args.output)
+    pending = list({trip["id"]: trip for trip in trips if trip["id"] not in done}.values())
+    print(f"{len(trips)} trips, {len(trips) - len(pending)} already done, {len(pending)} to plan "
+          f"with concurrency {args.concurrency}", file=sys.stderr)
+    if not pending:
+        return
+    if args.pdf_dir:
+        os.makedirs(args.pdf_dir, exist_ok=True)
+
+    agent = get_shared_agent()
+    lock = threading.Lock()
+    started = time.perf_counter()
+    finished = failed = 0
+
+    def run(trip):
+        t0 = time.perf_counter()
+        record = {"id": trip["id"], "trip": trip}
+        try:
+            sections, degraded = plan_trip(agent, trip, args.batched, args.deadline)
+            record.update(status="ok", sections=sections)
+            if degraded:
+                record["degraded"] = degraded
+            if args.pdf_dir:
+                record["pdf"] = write_pdf(args.pdf_dir, trip, sections)
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record["seconds"] = round(time.perf_counter() - t0, 2)
+        record["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return record
+
+    with open(args.output, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run, trip) for trip in pending]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                with lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+                finished += 1
+                failed += record["status"] != "ok"
+                elapsed = time.perf_counter() - started
+                print(f"[{finished}/{len(pending)}] {record['trip']['destination']}: {record['status']} "
+                      f"in {record['seconds']:.1f}s | {finished / elapsed * 60:.1f} trips/min, "
+                      f"{failed} failed", file=sys.stderr)
+        except KeyboardInterrupt:
+            # Finished trips are already on disk; the next run picks up the rest
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    elapsed = time.perf_counter() - started
+    print(f"Planned {finished} trips in {elapsed:.1f}s ({finished / elapsed * 60:.1f} trips/min), "
+          f"{failed} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Section rendering microbenchmark: the single-pass parser against the old regex chain.
+
+Renders realistic section replies (the stub server's packing lists, budgets,
+itineraries and tips, clean and malformed, plain and wrapped in the HTML or
+code fences the model sometimes adds) to HTML with render.clean_html_output
+and with the regex chain it replaced, and reports microseconds per section.
+
+Usage:
+    python bench/render_bench.py --repeat 2000
+"""
+import argparse
+import html as html_module
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from render import clean_html_output, parse_markdown  # noqa: E402
+from stub_server import _budget, _days, _generic, _packing  # noqa: E402
+
+
+def legacy_clean_html_output(text):
+    """clean_html_output before the single-pass parser, kept verbatim as the baseline."""
+    if not text:
+        return ""
+    
+    text = text.strip()
+    # Prevent Streamlit/KaTeX from interpreting currency amounts as math
+    text = text.replace('$', '__DOLLAR__')
+    
+    # CRITICAL FIRST: Unescape HTML entities (&lt; becomes <, &gt; becomes >)
+    text = text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+    text = text.replace('&#60;', '<').replace('&#62;', '>').replace('&#38;', '&')
+
+    # Strip fenced code blocks, inline backticks, and HTML code wrappers
+    text = re.sub(r'```[a-zA-Z0-9_-]*\n?', '', text)
+    text = text.replace('```', '')
+    text = text.replace('`', '')
+    text = re.sub(r'</?pre[^>]*>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</?code[^>]*>', '', text, flags=re.IGNORECASE)
+    
+    # If text contains literal "<h4>" strings, we need to remove them completely
+    # This is a nuclear option for stubborn cases
+    if '<h4>' in text.lower():
+        # Remove all h4 tags and their content, replacing with markdown
+        text = re.sub(r'<h4[^>]*>(.*?)</h4>', r'**\1**', text, flags=re.IGNORECASE | re.DOTALL)
+        # Also catch any orphaned tags
+        text = text.replace('<h4>', '').replace('</h4>', '')
+        text = text.replace('<H4>', '').replace('</H4>', '')
+    
+    # First pass: Strip ALL HTML tags and convert to plain text with markdown
+    # This prevents double-encoding issues
+    text = re.sub(r'<h4[^>]*>(.*?)</h4>', r'**\1**', text, flags=re.IGNORECASE)
+    text = re.sub(r'<h3[^>]*>(.*?)</h3>', r'**\1**', text, flags=re.IGNORECASE)
+    text = re.sub(r'<h2[^>]*>(.*?)</h2>', r'**\1**', text, flags=re.IGNORECASE)
+    text = re.sub(r'<strong[^>]*>(.*?)</strong>', r'**\1**', text, flags=re.IGNORECASE)
+    text = re.sub(r'<b[^>]*>(.*?)</b>', r'**\1**', text, flags=re.IGNORECASE)
+    text = re.sub(r'<em[^>]*>(.*?)</em>', r'*\1*', text, flags=re.IGNORECASE)
+    text = re.sub(r'<i[^>]*>(.*?)</i>', r'*\1*', text, flags=re.IGNORECASE)
+    
+    # Remove any remaining stray HTML tags
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'<p[^>]*>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</p>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'<ul[^>]*>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</ul>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'<li[^>]*>', '• ', text, flags=re.IGNORECASE)
+    text = re.sub(r'</li>', '\n', text, flags=re.IGNORECASE)
+    
+    # CATCH-ALL: Remove any other HTML tags that might remain
+    text = re.sub(r'<[^>]+>', '', text)
+    
+    # Now process clean markdown into proper HTML
+    lines = text.split('\n')
+    result_lines = []
+    in_list = False
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+            
+        # Check for bold markers with headers (these become h4)
+        if line.startswith('**') and line.endswith('**') and len(line) > 4:
+            header_text = line.strip('*').strip()
+            if in_list:
+                result_lines.append('</ul>')
+                in_list = False
+            result_lines.append(f'<h4>{header_text}</h4>')
+        
+        # Check for bullet points
+        elif line.startswith('•') or line.startswith('-'):
+            if not in_list:
+                result_lines.append('<ul>')
+                in_list = True
+            item_text = line[1:].strip()
+            # Remove any remaining ** markers
+            item_text = item_text.replace('**', '')
+            result_lines.append(f'<li>{item_text}</li>')
+        
+        # Regular paragraph
+        else:
+            if in_list:
+                result_lines.append('</ul>')
+                in_list = False
+            # Convert ** to strong tags
+            line = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', line)
+            result_lines.append(f'<p>{line}</p>')
+    
+    if in_list:
+        result_lines.append('</ul>')
+    
+    html_output = '\n'.join(result_lines)
+    
+    # Final cleanup: unescape any HTML entities that might have been created
+    html_output = html_module.unescape(html_output)
+    html_output = html_output.replace('__DOLLAR__', '&#36;')
+    
+    # Final check for any literal h4 tags that escaped earlier processing
+    # Keep this strictly scoped to a single element to avoid clipping content
+    if '<h4>' in html_output and not html_output.startswith('<h4>'):
+        html_output = re.sub(r'<p>[^<]*?<h4>(.*?)</h4>[^<]*?</p>', r'<p><strong>\1</strong></p>', html_output, flags=re.IGNORECASE)
+        html_output = re.sub(r'<li>[^<]*?<h4>(.*?)</h4>[^<]*?</li>', r'<li><strong>\1</strong></li>', html_output, flags=re.IGNORECASE)
+
+    return html_output
+
+
+def _wrapped(text: str) -> str:
+    """The same reply the way the model sometimes returns it: fenced, with HTML headers and bold."""
+    text = re.sub(r"^\*\*(.+?)\*\*$", r"<h4>\1</h4>", text, flags=re.M)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    return f"```markdown\n{text}\n```"
+
+
+def samples() -> dict:
+    plain = {
+        "packing": _packing(False),
+        "packing/malformed": _packing(True),
+        "budget": _budget(5, True, False),
+        "budget/malformed": _budget(5, True, True),
+        "itinerary/7d": _days(1, 7),
+        "tips": _generic("Cultural tips") + "\n" + _generic("Etiquette") + "\n" + _generic("Safety"),
+    }
+    wrapped = {f"{name}/html": _wrapped(text) for name, text in plain.items() if "/" not in name}
+    return {**plain, **wrapped}
+
+
+def _per_call(fn, text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="renders per sample and implementation")
+    parser.add_argument("--output", help="save the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'sample':<22}{'chars':>7}{'regex µs':>10}{'parse µs':>10}{'html µs':>9}{'speedup':>9}")
+    for name, text in samples().items():
+        legacy = _per_call(legacy_clean_html_output, text, args.repeat)
+        parse = _per_call(parse_markdown, text, args.repeat)
+        new = _per_call(clean_html_output, text, args.repeat)
+        results[name] = {"chars": len(text), "legacy_us": round(legacy, 2), "parse_us": round(parse, 2),
+                         "html_us": round(new, 2), "speedup": round(legacy / new, 2)}
+        print(f"{name:<22}{len(text):>7}{legacy:>10.1f}{parse:>10.1f}{new:>9.1f}{legacy / new:>8.1f}x")
+    total_legacy = sum(r["legacy_us"] for r in results.values())
+    total_new = sum(r["html_us"] for r in results.values())
+    print(f"{'all':<22}{'':>7}{total_legacy:>10.1f}{'':>10}{total_new:>9.1f}{total_legacy / total_new:>8.1f}x")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
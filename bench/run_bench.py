@@ -0,0 +1,272 @@
+"""End-to-end TripMate benchmark against the local DeepSeek/OpenWeather stub.
+
+Drives TripMateAgent directly (per-section fan-out and batched mode) at
+several session counts, then the full Streamlit main() flow through AppTest,
+and reports plan latency percentiles, model calls per plan and throughput.
+Results are saved as JSON and can be compared against an earlier run.
+
+Usage:
+    python bench/run_bench.py --sessions 1,4,16 --plans 3 --output bench/results/run.json
+    python bench/run_bench.py --baseline bench/results/run.json --fail-on-regression 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import StubState, start_stub_server  # noqa: E402
+
+DESTINATIONS = ["Paris", "Tokyo", "Rome", "Barcelona", "Bangkok", "Lisbon", "Prague", "Istanbul"]
+TRIP_LENGTHS = [3, 5, 7, 10]
+# Metrics where a higher value is a regression
+LOWER_IS_BETTER = ("p50", "p95", "p99", "calls_per_plan")
+
+
+def trip(i: int) -> dict:
+    """The i-th benchmark trip; starts soon enough to hit the forecast endpoint."""
+    start = date.today() + timedelta(days=2)
+    return {
+        "destination": DESTINATIONS[i % len(DESTINATIONS)],
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=TRIP_LENGTHS[i % len(TRIP_LENGTHS)] - 1)).isoformat(),
+        "travel_style": "moderate",
+        "num_travelers": 1 + i % 3,
+        "interests": "Sightseeing, Food & Dining",
+        "dietary_restrictions": ["Vegetarian"] if i % 4 == 0 else None,
+    }
+
+
+class Stub:
+    """Handle on the stub server's request counters."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def reset(self):
+        requests.post(f"{self.url}/reset", json={}, timeout=5)
+
+    def counts(self) -> dict:
+        return requests.get(f"{self.url}/stats", timeout=5).json()
+
+
+def summarize(latencies: list, wall: float, calls: dict, plans: int, errors: int, repairs: dict) -> dict:
+    values = np.array(latencies) if latencies else np.array([np.nan])
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {
+        "plans": plans,
+        "errors": errors,
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3),
+        "throughput": round(plans / wall, 3) if wall else 0.0,
+        "calls_per_plan": round(calls.get("chat_completions", 0) / plans, 2) if plans else 0.0,
+        "weather_calls": calls.get("forecast", 0),
+        "malformed_replies": calls.get("malformed", 0) + calls.get("garbage", 0),
+        "rejected_calls": calls.get("rate_limited", 0) + calls.get("errors", 0),
+        "repairs": repairs,
+    }
+
+
+def _repairs_since(before: dict) -> dict:
+    from telemetry import METRICS
+    after = METRICS.counter_totals("tripmate_repairs_total", by="kind")
+    return {kind: int(after[kind] - before.get(kind, 0)) for kind in after if after[kind] - before.get(kind, 0)}
+
+
+def run_sessions(sessions: int, plans: int, plan_once) -> tuple:
+    """Run plans back-to-back in each of sessions threads; returns (latencies, wall seconds, errors)."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def session(s):
+        for p in range(plans):
+            started = time.perf_counter()
+            try:
+                plan_once(s * plans + p)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started, errors
+
+
+def bench_agent(stub: Stub, sessions: int, plans: int, batched: bool) -> dict:
+    """Full plans through one shared TripMateAgent, as the app issues them."""
+    from agent import get_shared_agent
+    from telemetry import METRICS
+    agent = get_shared_agent()
+
+    def plan_once(i):
+        t = trip(i)
+        tasks = agent.plan_tasks(t["destination"], t["start_date"], t["end_date"], t["travel_style"],
+                                 t["num_travelers"], t["interests"], t["dietary_restrictions"])
+        for _ in agent.run_sections(tasks, stream=True, batched=batched):
+            pass
+
+    stub.reset()
+    repairs = METRICS.counter_totals("tripmate_repairs_total", by="kind")
+    latencies, wall, errors = run_sessions(sessions, plans, plan_once)
+    return summarize(latencies, wall, stub.counts(), len(latencies), len(errors), _repairs_since(repairs))
+
+
+def _choose_destination(at, name: str):
+    # The city picker preselects the match whose name equals the typed text
+    at.sidebar.text_input[0].input(name)
+
+
+def bench_app(stub: Stub, sessions: int, plans: int, timeout: float) -> dict:
+    """Full main() reruns through Streamlit's AppTest: pick a destination, click Generate."""
+    from streamlit.testing.v1 import AppTest
+    from telemetry import METRICS
+
+    def plan_once(i):
+        t = trip(i)
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+        at.run()
+        _choose_destination(at, t["destination"])
+        at.run()
+        at.sidebar.button[0].click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    stub.reset()
+    repairs = METRICS.counter_totals("tripmate_repairs_total", by="kind")
+    latencies, wall, errors = run_sessions(sessions, plans, plan_once)
+    return summarize(latencies, wall, stub.counts(), len(latencies), len(errors), _repairs_since(repairs))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print per-scenario deltas against baseline; returns the regressions beyond threshold percent."""
+    regressions = []
+    print(f"\nAgainst baseline {baseline.get('timestamp', '?')} ({baseline.get('commit', '?')}):")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        deltas = []
+        for metric in ("p50", "p95", "p99", "throughput", "calls_per_plan"):
+            old, new = previous.get(metric), current.get(metric)
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            worse = change if metric in LOWER_IS_BETTER else -change
+            deltas.append(f"{metric} {old:g}→{new:g} ({change:+.1f}%)")
+            if threshold is not None and worse > threshold:
+                regressions.append(f"{name} {metric} {change:+.1f}%")
+        print(f"  {name}: " + ", ".join(deltas))
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", default="1,4,16", help="comma-separated concurrent session counts")
+    parser.add_argument("--plans", type=int, default=3, help="plans per session")
+    parser.add_argument("--modes", default="fanout,batched", help="agent modes: fanout, batched")
+    parser.add_argument("--app-sessions", type=int, default=1, help="concurrent AppTest sessions (0 to skip)")
+    parser.add_argument("--app-plans", type=int, default=2, help="plans per AppTest session")
+    parser.add_argument("--app-timeout", type=float, default=120)
+    parser.add_argument("--llm-latency", default="lognormal:1.2:0.4",
+                        help="stub completion latency: fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--weather-latency", default="uniform:0.05:0.2")
+    parser.add_argument("--malformed-rate", type=float, default=0.1)
+    parser.add_argument("--garbage-rate", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions failing with 503")
+    parser.add_argument("--stub-max-concurrency", type=int, default=0,
+                        help="stub answers 429 beyond this many concurrent completions (0 = no limit)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on (fresh temp file)")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench", "results", "latest.json"))
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--fail-on-regression", type=float, metavar="PCT",
+                        help="exit non-zero when a latency, throughput or calls metric regresses by more than PCT%%")
+    args = parser.parse_args()
+
+    state = StubState(args.llm_latency, args.weather_latency, args.malformed_rate, args.garbage_rate,
+                      args.error_rate, seed=args.seed, max_concurrency=args.stub_max_concurrency)
+    server = start_stub_server(state)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Stop the stub and release its port however the run ends (errors, regressions, Ctrl-C)
+    try:
+        stub = Stub(url)
+
+        # The agent reads these at import time
+        os.environ.update({
+            "DEEPSEEK_BASE_URL": url,
+            "OPENWEATHER_BASE_URL": url,
+            "DEEPSEEK_API_KEY": "bench",
+            "OPENWEATHER_API_KEY": "bench",
+            "TRIPMATE_CACHE": "1" if args.cache else "0",
+            "TRIPMATE_CACHE_PATH": os.path.join(ROOT, ".cache", f"bench-{os.getpid()}.sqlite3"),
+        })
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _commit(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "scenarios": {},
+        }
+        print(f"{'scenario':<28}{'p50':>7}{'p95':>7}{'p99':>7}{'plans/s':>9}{'calls/plan':>12}{'errors':>8}")
+
+        def report(name, summary):
+            results["scenarios"][name] = summary
+            print(f"{name:<28}{summary['p50']:>7.2f}{summary['p95']:>7.2f}{summary['p99']:>7.2f}"
+                  f"{summary['throughput']:>9.2f}{summary['calls_per_plan']:>12.2f}{summary['errors']:>8}")
+
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            for sessions in [int(n) for n in args.sessions.split(",")]:
+                report(f"agent/{mode}/sessions={sessions}",
+                       bench_agent(stub, sessions, args.plans, batched=mode == "batched"))
+        if args.app_sessions:
+            report(f"app/sessions={args.app_sessions}",
+                   bench_app(stub, args.app_sessions, args.app_plans, args.app_timeout))
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.fail_on_regression)
+            if regressions:
+                print("Regressions: " + "; ".join(regressions))
+                sys.exit(1)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Local stand-in for the DeepSeek and OpenWeather APIs.
+
+Speaks the OpenAI-compatible ``POST /chat/completions`` (JSON and SSE
+streaming, with usage) and OpenWeather's ``GET /data/2.5/forecast``. Replies
+are well-formed TripMate sections; a configurable share comes back
+malformed (locally repairable) or as garbage (needs a model repair).
+Latency for each endpoint is drawn from a configurable distribution.
+
+Usage: python bench/stub_server.py --port 8765 --llm-latency lognormal:1.5:0.4
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Roughly four characters per token, like most BPE tokenizers on English text
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 24
+
+
+class Latency:
+    """Seconds drawn from "fixed:S", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA"."""
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        median, sigma = self.params
+        return median * self.rng.lognormvariate(0, sigma)
+
+
+def _packing(malformed: bool) -> str:
+    if malformed:
+        return """## Clothing
+- Light rain jacket
+- 3 T-shirts
+- 2 pairs of trousers
+- Comfortable walking shoes
+**Electronics:**
+- Power adapter: Type C
+**Laundry:** Available at most hotels
+**Luggage** - Carry-on, easy on public transport
+**Special notes:** Dress modestly for religious sites"""
+    return """**CLOTHING** (moderate style)
+• Light rain jacket
+• 3 T-shirts
+• 2 pairs of trousers
+• Warm sweater
+• Comfortable walking shoes
+• Sleepwear/underwear
+
+**ELECTRONICS**
+• Adapter type: Type C (Europe, two round pins)
+• Phone charger
+• Power bank
+
+**LAUNDRY**: Available - most hotels offer same-day service
+
+**LUGGAGE**: Carry-on - easy on public transport
+
+**SPECIAL NOTES**: Dress modestly for religious sites."""
+
+
+def _budget(num_days: int, with_currency: bool, malformed: bool) -> str:
+    bullet = "-" if malformed else "•"
+    header = "### {}" if malformed else "**{}**"
+    lines = ["💱 Currency: Euro (EUR) | 1 USD = 0.92 EUR", ""] if with_currency else []
+    lines += [
+        header.format("Accommodation") + f" ({num_days} nights)",
+        f"{bullet} $120-180/night → Total: ${120 * num_days}-{180 * num_days}", "",
+        header.format("Food") + " (per person/day)",
+        f"{bullet} Breakfast: $8-12", f"{bullet} Lunch: $15-25", f"{bullet} Dinner: $30-50",
+        f"{bullet} Daily: $53-87 → Total ({num_days} days): ${53 * num_days}-{87 * num_days}", "",
+        header.format("Transport"),
+        f"{bullet} Airport transfer: $30-60", f"{bullet} Daily local: $8-15/day → Total: $60-110",
+        f"{bullet} Total: $90-170", "",
+        header.format("Activities"), f"{bullet} Entry fees & tours: $150-300", "",
+        header.format("Other"), f"{bullet} SIM/WiFi: $20", f"{bullet} Tips: $30", f"{bullet} Buffer: $80",
+        f"{bullet} Total: $130", "",
+        f"**TOTAL: ${300 * num_days:,} - ${450 * num_days:,}** (1 person(s))",
+        "**Per person/day: $300-450**", "",
+        "**Money Tips**:", f"{bullet} Book museums online to skip queues.",
+        f"{bullet} Buy a multi-day transit pass.", f"{bullet} Lunch menus are cheaper than dinner.",
+    ]
+    return "\n".join(lines)
+
+
+def _days(first: int, last: int) -> str:
+    return "\n\n".join(
+        f"**Day {day}**: Neighbourhood {day}\n"
+        f"• Morning (9-12): Landmark {day}\n"
+        f"• Afternoon (12-5): Museum {day} + lunch at Bistro {day}\n"
+        f"• Evening (5-9): Dinner at Restaurant {day} + river walk"
+        for day in range(first, last + 1)
+    )
+
+
+def _generic(title: str) -> str:
+    return f"**{title}**\n• First practical tip\n• Second practical tip\n• Third practical tip"
+
+
+def section_text(prompt: str, malformed: bool = False) -> str:
+    """A plausible reply for one TripMate section prompt."""
+    if prompt.startswith("Rewrite the packing list"):
+        return _packing(False)
+    if prompt.startswith("Rewrite the budget"):
+        return _budget(3, True, False)
+    if "packing list for" in prompt:
+        return _packing(malformed)
+    match = re.search(r"budget estimate for .*?, (\d+) days", prompt)
+    if match:
+        return _budget(int(match.group(1)), "💱 Currency: [Currency Name]" in prompt, malformed)
+    match = re.match(r"Outline a (\d+)-day trip", prompt)
+    if match:
+        return "\n".join(f"Day {d}: Neighbourhood {d} - Landmark {d}, Museum {d}"
+                         for d in range(1, int(match.group(1)) + 1))
+    match = re.match(r"Write days (\d+)-(\d+) of", prompt)
+    if match:
+        return _days(int(match.group(1)), int(match.group(2)))
+    match = re.match(r"Create a (\d+)-day itinerary", prompt)
+    if match:
+        return _days(1, int(match.group(1)))
+    if prompt.startswith("Estimate the TYPICAL weather"):
+        return "Typical range 8–16°C with mild, changeable days."
+    return _generic(prompt.split(" for ")[0].strip()[:40] or "Guide")
+
+
+def batched_text(prompt: str, malformed_rate: float, rng: random.Random) -> str:
+    """JSON object reply for a batched multi-section prompt."""
+    parts = re.split(r"^=== (\w+) ===$", prompt, flags=re.M)
+    return json.dumps({
+        parts[i]: section_text(parts[i + 1].strip(), rng.random() < malformed_rate)
+        for i in range(1, len(parts), 2)
+    })
+
+
+def forecast_payload(city: str) -> dict:
+    """Five days of 3-hourly steps starting at the current cycle."""
+    start = int(time.time()) // 10800 * 10800
+    steps = []
+    for i in range(40):
+        temp = 12 + 6 * ((i % 8) in (3, 4, 5))
+        steps.append({
+            "dt": start + i * 10800,
+            "main": {"temp": temp, "temp_min": temp - 2, "temp_max": temp + 2, "humidity": 60 + i % 20},
+            "weather": [{"description": "light rain" if i % 5 == 0 else "scattered clouds"}],
+        })
+    return {"cod": "200", "list": steps, "city": {"name": city, "timezone": 0}}
+
+
+class StubState:
+    """Configuration and request counters shared by all handler threads."""
+
+    def __init__(self, llm_latency: str = "lognormal:1.2:0.4", weather_latency: str = "uniform:0.05:0.2",
+                 malformed_rate: float = 0.0, garbage_rate: float = 0.0, error_rate: float = 0.0,
+                 ttft_share: float = 0.3, seed: int = 0, max_concurrency: int = 0, retry_after: float = 1.0):
+        self.rng = random.Random(seed)
+        self.llm_latency = Latency(llm_latency, self.rng)
+        self.weather_latency = Latency(weather_latency, self.rng)
+        self.malformed_rate = malformed_rate
+        self.garbage_rate = garbage_rate
+        self.error_rate = error_rate
+        self.ttft_share = ttft_share
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def admit(self) -> bool:
+        """Take a completion slot; False when max_concurrency completions are already running."""
+        with self.lock:
+            if self.max_concurrency and self.inflight >= self.max_concurrency:
+                return False
+            self.inflight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def draw(self):
+        """(latency, roll) for one request; random.Random is not thread-safe."""
+        with self.lock:
+            return self.llm_latency.sample(), self.rng.random()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with self.state.lock:
+                self._send_json(dict(self.state.counts))
+            return
+        if url.path.endswith("/data/2.5/forecast"):
+            self.state.count("forecast")
+            with self.state.lock:
+                delay = self.state.weather_latency.sample()
+            time.sleep(delay)
+            city = parse_qs(url.query).get("q", ["Unknown"])[0]
+            self._send_json(forecast_payload(city))
+            return
+        self._send_json({"error": "not found"}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if url.path == "/reset":
+            with self.state.lock:
+                self.state.counts.clear()
+            self._send_json({})
+            return
+        if not url.path.endswith("/chat/completions"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        self.state.count("chat_completions")
+        if not self.state.admit():
+            self.state.count("rate_limited")
+            self._send_json({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, 429,
+                            headers={"Retry-After": f"{self.state.retry_after:g}"})
+            return
+        try:
+            self._chat_completion(request)
+        finally:
+            self.state.leave()
+
+    def _chat_completion(self, request: dict):
+        latency, roll = self.state.draw()
+        if roll < self.state.error_rate:
+            self.state.count("errors")
+            time.sleep(latency * self.state.ttft_share)
+            self._send_json({"error": {"message": "stub overloaded", "type": "server_error"}}, 503)
+            return
+
+        prompt = request["messages"][-1]["content"]
+        roll -= self.state.error_rate
+        if request.get("response_format", {}).get("type") == "json_object":
+            with self.state.lock:
+                text = batched_text(prompt, self.state.malformed_rate, self.state.rng)
+        elif roll < self.state.garbage_rate and not prompt.startswith("Rewrite"):
+            self.state.count("garbage")
+            text = "I'm sorry, here are some ideas for your trip."
+        else:
+            malformed = roll - self.state.garbage_rate < self.state.malformed_rate
+            if malformed:
+                self.state.count("malformed")
+            text = section_text(prompt, malformed)
+
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        completion_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": 0,
+            "prompt_cache_miss_tokens": prompt_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = request.get("model", "deepseek-chat")
+
+        if not request.get("stream"):
+            time.sleep(latency)
+            self._send_json({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload):
+            data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        time.sleep(latency * self.state.ttft_share)
+        gap = latency * (1 - self.state.ttft_share) / max(1, len(pieces))
+        try:
+            event(chunk({"role": "assistant", "content": ""}))
+            for piece in pieces:
+                event(chunk({"content": piece}))
+                time.sleep(gap)
+            event(chunk({}, "stop"))
+            if request.get("stream_options", {}).get("include_usage"):
+                event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": model, "choices": [], "usage": usage})
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client stopped reading (e.g. a cancelled prefetch)
+            self.close_connection = True
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(state: StubState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a daemon thread; port 0 picks a free port (see server.server_address)."""
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = StubHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="tripmate-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local DeepSeek/OpenWeather stub for TripMate benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", default="lognormal:1.2:0.4",
+                        help="fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--weather-latency", default="uniform:0.05:0.2")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="share of section replies with locally repairable formatting problems")
+    parser.add_argument("--garbage-rate", type=float, default=0.0,
+                        help="share of section replies that need a model repair")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions failing with 503")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="answer 429 with Retry-After beyond this many concurrent completions (0 = no limit)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    state = StubState(args.llm_latency, args.weather_latency, args.malformed_rate,
+                      args.garbage_rate, args.error_rate, seed=args.seed, max_concurrency=args.max_concurrency)
+    server = start_stub_server(state, args.host, args.port)
+    print(f"Stub listening on http://{args.host}:{server.server_address[1]} "
+          f"(DEEPSEEK_BASE_URL and OPENWEATHER_BASE_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Compact city catalogue for the destination picker.
+
+Every geonamescache city above a minimum population is stored as numpy arrays
+in data/city_index/ (built by scripts/build_city_index.py, or on first use):
+"City, Country" labels and populations, the cities' folded names in sorted
+order for prefix search, and a trigram index over the larger cities for
+typo-tolerant search. The arrays are memory-mapped, so loading the index is
+cheap and a search touches only the entries it returns.
+"""
+import bisect
+import difflib
+import json
+import logging
+import os
+import unicodedata
+from functools import lru_cache
+
+import geonamescache
+import numpy as np
+
+from geo import countries
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "city_index")
+# Smallest city in the catalogue; geonamescache ships 500, 1000, 5000 and 15000.
+# Unless it is set, an existing index is used whatever size it was built with
+MIN_POPULATION_SETTING = os.getenv("TRIPMATE_CITY_MIN_POPULATION")
+MIN_POPULATION = int(MIN_POPULATION_SETTING or "1000")
+# Typo-tolerant matches are only looked for among cities at least this large
+FUZZY_MIN_POPULATION = 15000
+# Least similarity (difflib ratio against the start of the name) for a fuzzy match
+FUZZY_CUTOFF = 0.8
+# Candidates with the most shared trigrams that are checked with difflib
+FUZZY_CANDIDATES = 200
+# Keys past the end of any prefix range
+PREFIX_END = chr(0x10FFFF)
+
+
+def fold(text: str) -> str:
+    """Search form of a name: case-folded, accents stripped, whitespace collapsed."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join("".join(ch for ch in text if not unicodedata.combining(ch)).split())
+
+
+def _trigrams(key: str) -> set:
+    # Padded at the start only: queries are typed left to right, so their end is often incomplete
+    key = "$$" + key
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def _trigram_code(trigram: str) -> int:
+    return (ord(trigram[0]) << 42) | (ord(trigram[1]) << 21) | ord(trigram[2])
+
+
+class _Strings:
+    """Read-only sequence over a UTF-8 blob and its offsets (bisect works on it directly)."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+def _pack(strings: list) -> tuple:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def build_index(directory: str = INDEX_DIR, min_population: int = MIN_POPULATION) -> int:
+    """Write the index arrays for geonamescache cities of at least min_population; returns the city count."""
+    country_names = {code: country["name"].strip() for code, country in countries().items()}
+    labels = {}
+    for city in geonamescache.GeonamesCache(min_city_population=min_population).get_cities().values():
+        name = " ".join(city["name"].split())
+        country = country_names.get(city["countrycode"], city["countrycode"])
+        label = f"{name}, {country}"
+        # Same-named cities in one country would look identical in the picker; keep the largest
+        if label not in labels or city["population"] > labels[label][2]:
+            labels[label] = (name, label, city["population"])
+    # Most populous first, so ties in search results come out in a sensible order
+    cities = sorted(labels.values(), key=lambda city: (-city[2], city[1]))
+    keys = sorted((fold(name), i) for i, (name, _, _) in enumerate(cities))
+
+    # cities is sorted by population, so the fuzzy-searchable ones come first
+    fuzzy_cities = sum(population >= FUZZY_MIN_POPULATION for _, _, population in cities)
+    trigrams = {}
+    for i, (name, _, _) in enumerate(cities[:fuzzy_cities]):
+        for trigram in _trigrams(fold(name)):
+            trigrams.setdefault(_trigram_code(trigram), []).append(i)
+    codes = sorted(trigrams)
+    postings = [trigrams[code] for code in codes]
+    posting_offsets = np.zeros(len(codes) + 1, dtype=np.int32)
+    np.cumsum([len(p) for p in postings], out=posting_offsets[1:])
+
+    os.makedirs(directory, exist_ok=True)
+    labels_blob, label_offsets = _pack([label for _, label, _ in cities])
+    keys_blob, key_offsets = _pack([key for key, _ in keys])
+    arrays = {
+        "labels": labels_blob,
+        "label_offsets": label_offsets,
+        "name_lengths": np.array([len(name) for name, _, _ in cities], dtype=np.uint16),
+        "population": np.array([population for _, _, population in cities], dtype=np.int32),
+        "keys": keys_blob,
+        "key_offsets": key_offsets,
+        "key_cities": np.array([i for _, i in keys], dtype=np.int32),
+        "trigrams": np.array(codes, dtype=np.int64),
+        "trigram_offsets": posting_offsets,
+        "trigram_cities": np.array([i for p in postings for i in p], dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"min_population": min_population, "fuzzy_min_population": FUZZY_MIN_POPULATION,
+                   "cities": len(cities), "fuzzy_cities": fuzzy_cities}, f, indent=0)
+    return len(cities)
+
+
+class CityIndex:
+    """Prefix and fuzzy city search over the memory-mapped index."""
+
+    def __init__(self, directory: str = INDEX_DIR):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+
+        self.labels = _Strings(load("labels"), load("label_offsets"))
+        self.name_lengths = load("name_lengths")
+        self.population = load("population")
+        self.keys = _Strings(load("keys"), load("key_offsets"))
+        self.key_cities = load("key_cities")
+        self.trigrams = load("trigrams")
+        self.trigram_offsets = load("trigram_offsets")
+        self.trigram_cities = load("trigram_cities")
+
+    def __len__(self):
+        return len(self.labels)
+
+    def city(self, i: int) -> dict:
+        label = self.labels[i]
+        return {"name": label[:int(self.name_lengths[i])], "label": label,
+                "population": int(self.population[i])}
+
+    def _top(self, ids, k: int) -> list:
+        # Lower ids are more populous, so the k smallest ids are the k largest cities
+        ids = np.unique(ids)
+        return ids[:k].tolist()
+
+    def prefix(self, key: str, k: int) -> list:
+        """Ids of the k most populous cities whose folded name starts with key."""
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + PREFIX_END, lo)
+        return self._top(self.key_cities[lo:hi], k)
+
+    def fuzzy(self, key: str, k: int) -> list:
+        """Ids of the k most populous larger cities whose name starts with something close to key."""
+        counts = None
+        for trigram in _trigrams(key):
+            code = _trigram_code(trigram)
+            j = int(np.searchsorted(self.trigrams, code))
+            if j == len(self.trigrams) or self.trigrams[j] != code:
+                continue
+            ids = self.trigram_cities[self.trigram_offsets[j]:self.trigram_offsets[j + 1]]
+            hits = np.bincount(ids, minlength=self.meta["fuzzy_cities"])
+            counts = hits if counts is None else counts + hits
+        if counts is None:
+            return []
+        candidates = np.argpartition(-counts, min(FUZZY_CANDIDATES, len(counts) - 1))[:FUZZY_CANDIDATES]
+        matches = []
+        for i in sorted(int(i) for i in candidates if counts[i]):
+            start = fold(self.city(i)["name"])[:len(key) + 1]
+            if difflib.SequenceMatcher(None, key, start).ratio() >= FUZZY_CUTOFF:
+                matches.append(i)
+                if len(matches) == k:
+                    break
+        return matches
+
+    def search(self, query: str, k: int = 10) -> list:
+        """Up to k cities matching query, most populous first: name prefix matches, then close spellings.
+
+        "City, Country" queries keep only cities whose country starts with the part after the comma.
+        """
+        name, _, country = query.partition(",")
+        key, country = fold(name), fold(country)
+        if not key:
+            return []
+        # Look further when a country filter will drop some of the matches
+        want = k if not country else k * 20
+        ids = self.prefix(key, want)
+        if len(ids) < want:
+            ids += [i for i in self.fuzzy(key, want) if i not in ids]
+        results = []
+        for i in ids:
+            city = self.city(i)
+            if country and not fold(city["label"][len(city["name"]) + 2:]).startswith(country):
+                continue
+            results.append(city)
+            if len(results) == k:
+                break
+        return results
+
+
+@lru_cache(maxsize=1)
+def load_index() -> CityIndex:
+    """Process-wide city index, built from geonamescache first if it is missing.
+
+    An index built for another minimum population (e.g. with
+    scripts/build_city_index.py --min-population) is kept, unless
+    TRIPMATE_CITY_MIN_POPULATION asks for a different one. None if the index
+    can't be written (e.g. a read-only checkout without a prebuilt index).
+    """
+    try:
+        with open(os.path.join(INDEX_DIR, "meta.json"), encoding="utf-8") as f:
+            built = json.load(f).get("min_population")
+    except (OSError, ValueError):
+        built = None
+    try:
+        if built is None:
+            build_index()
+        elif MIN_POPULATION_SETTING and built != MIN_POPULATION:
+            logger.warning("City index was built for cities of %s+; rebuilding it for "
+                           "TRIPMATE_CITY_MIN_POPULATION=%s", built, MIN_POPULATION)
+            build_index()
+        return CityIndex()
+    except OSError as e:
+        logger.warning("City index unavailable: %s", e)
+        return None
+
+
+@lru_cache(maxsize=1024)
+def search_cities(query: str, k: int = 10) -> tuple:
+    """Cached load_index().search(); the picker asks again with the same text on every rerun."""
+    index = load_index()
+    return tuple(index.search(query, k)) if index is not None else ()
@@ -0,0 +1,111 @@
+"""Offline climate normals for seasonal weather hints.
+
+Monthly temperature and precipitation normals per city are bundled as
+memory-mapped numpy arrays (built by scripts/build_climate_normals.py).
+Destinations without their own entry resolve through geonamescache to the
+nearest city that has one.
+"""
+import json
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from geo import named_country, resolve_city
+
+NORMALS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "climate_normals")
+# Beyond this distance a neighbour's climate says little about the destination
+MAX_NEAREST_KM = 600
+EARTH_RADIUS_KM = 6371.0
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _describe(temp_min: float, temp_max: float, precip: float) -> str:
+    mean = (temp_min + temp_max) / 2
+    if mean < 0:
+        feel = "freezing"
+    elif mean < 8:
+        feel = "cold"
+    elif mean < 15:
+        feel = "cool"
+    elif mean < 22:
+        feel = "mild"
+    elif mean < 28:
+        feel = "warm"
+    else:
+        feel = "hot"
+    if precip < 20:
+        wet = "mostly dry"
+    elif precip < 60:
+        wet = "occasionally wet"
+    elif precip < 150:
+        wet = "often rainy"
+    else:
+        wet = "very wet"
+    return f"{feel}, {wet}"
+
+
+class ClimateNormals:
+    """Monthly normals with a nearest-city lookup over unit-sphere coordinates."""
+
+    def __init__(self, directory: str = NORMALS_DIR):
+        with open(os.path.join(directory, "cities.json"), encoding="utf-8") as f:
+            self.cities = json.load(f)
+        self.coords = np.load(os.path.join(directory, "coords.npy"), mmap_mode="r")
+        self.temp_min = np.load(os.path.join(directory, "temp_min.npy"), mmap_mode="r")
+        self.temp_max = np.load(os.path.join(directory, "temp_max.npy"), mmap_mode="r")
+        self.precip = np.load(os.path.join(directory, "precip.npy"), mmap_mode="r")
+        # Nearest neighbour by great-circle distance is the largest dot product of unit vectors
+        self._points = _unit_vectors(self.coords[:, 0], self.coords[:, 1])
+        self._by_name = {city["name"].casefold(): i for i, city in enumerate(self.cities)}
+
+    def nearest(self, lat: float, lon: float) -> tuple:
+        """Index of the closest city with normals and its distance in km."""
+        dots = self._points @ _unit_vectors(lat, lon)
+        i = int(dots.argmax())
+        return i, EARTH_RADIUS_KM * math.acos(min(1.0, float(dots[i])))
+
+    def locate(self, destination: str):
+        """Row index for destination, or None if no city with normals is close enough.
+
+        A country after the comma must match: "Paris, United States" never gets Paris, France.
+        """
+        name, _, rest = destination.partition(",")
+        i = self._by_name.get(" ".join(name.split()).casefold())
+        if i is not None:
+            country = named_country(destination) if rest.strip() else None
+            if not rest.strip() or (country is not None and country["iso"] == self.cities[i]["country"]):
+                return i
+        city = resolve_city(destination)
+        if city is None:
+            return None
+        i, km = self.nearest(city["latitude"], city["longitude"])
+        return i if km <= MAX_NEAREST_KM else None
+
+    def seasonal_hint(self, destination: str, month: int) -> str:
+        """One-sentence typical weather for destination in month (1-12), or None if unknown."""
+        i = self.locate(destination)
+        if i is None:
+            return None
+        m = month - 1
+        temp_min, temp_max, precip = float(self.temp_min[i, m]), float(self.temp_max[i, m]), float(self.precip[i, m])
+        month_name = ("January", "February", "March", "April", "May", "June", "July",
+                      "August", "September", "October", "November", "December")[m]
+        source = self.cities[i]["name"]
+        nearby = "" if source.casefold() == destination.split(",")[0].strip().casefold() else f" (normals for nearby {source})"
+        return (f"Typical {month_name} range {temp_min:.0f}–{temp_max:.0f}°C with "
+                f"{_describe(temp_min, temp_max, precip)} days, about {precip:.0f} mm of rain{nearby}.")
+
+
+@lru_cache(maxsize=1)
+def load_normals() -> ClimateNormals:
+    """Process-wide normals table, or None if the bundled arrays are missing."""
+    try:
+        return ClimateNormals()
+    except FileNotFoundError:
+        return None
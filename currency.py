@@ -0,0 +1,122 @@
+"""Offline currency facts from geonamescache and a bundled FX rate snapshot.
+
+A destination resolves to its country's currency through geonamescache, and
+USD rates come from data/fx_rates.json (refreshed with
+scripts/refresh_fx_rates.py), so the currency box and the budget's currency
+line need no model call.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from geo import resolve_country
+
+FX_RATES_PATH = os.getenv(
+    "TRIPMATE_FX_RATES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fx_rates.json"),
+)
+# USD amounts shown as quick conversions in the currency box
+QUICK_AMOUNTS_USD = np.array([10, 50, 100, 500], dtype=np.float64)
+LOCAL_TOTALS_PREFIX = "≈ In "
+
+# "$1,000" or a range written "$160-250" / "$160 - $250"
+_AMOUNT = re.compile(r"\$\s?(\d[\d,]*(?:\.\d+)?)(?:\s*[-–]\s*\$?\s?(\d[\d,]*(?:\.\d+)?))?")
+_TOTAL = re.compile(r"^\s*\**\s*TOTAL\s*:")
+_PER_DAY = re.compile(r"^\s*\**\s*Per person/day\s*:", re.IGNORECASE)
+
+Currency = namedtuple("Currency", "code name country rate as_of")
+
+
+@lru_cache(maxsize=1)
+def load_rates() -> dict:
+    """The FX snapshot ({"base", "as_of", "source", "rates"}), or None if it is missing."""
+    try:
+        with open(FX_RATES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def currency_for(destination: str) -> Currency:
+    """Local currency of a destination with its USD rate, or None if either is unknown."""
+    country = resolve_country(destination)
+    snapshot = load_rates()
+    if country is None or not country["currencycode"] or snapshot is None:
+        return None
+    rate = snapshot["rates"].get(country["currencycode"])
+    if rate is None:
+        return None
+    return Currency(country["currencycode"], country["currencyname"], country["name"],
+                    float(rate), snapshot["as_of"])
+
+
+def convert(amounts_usd, currency: Currency) -> np.ndarray:
+    """Convert USD amounts to the local currency, rounded to three significant figures."""
+    values = np.asarray(amounts_usd, dtype=np.float64) * currency.rate
+    magnitude = np.floor(np.log10(np.maximum(np.abs(values), 1e-9)))
+    scale = 10.0 ** (magnitude - 2)
+    return np.round(values / scale) * scale
+
+
+def _format(value: float) -> str:
+    if value >= 100:
+        return f"{value:,.0f}"
+    if value >= 1:
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return f"{value:.3g}"
+
+
+def currency_line(currency: Currency) -> str:
+    """The budget's first line, e.g. "💱 Currency: Euro (EUR) | 1 USD = 0.97 EUR (rate as of 2025-01-02)"."""
+    return (f"💱 Currency: {currency.name} ({currency.code}) | "
+            f"1 USD = {_format(currency.rate)} {currency.code} (rate as of {currency.as_of})")
+
+
+def currency_box(currency: Currency) -> str:
+    """Markdown for the currency box."""
+    lines = [f"💱 **{currency.name}** ({currency.code}) — {currency.country}"]
+    if currency.code == "USD":
+        lines.append("• Budget amounts are already in the local currency")
+    else:
+        quick = " · ".join(
+            f"{amount:,.0f} USD ≈ {_format(local)} {currency.code}"
+            for amount, local in zip(QUICK_AMOUNTS_USD, convert(QUICK_AMOUNTS_USD, currency))
+        )
+        lines.append(f"• 1 USD = {_format(currency.rate)} {currency.code} · "
+                     f"1 {currency.code} = {_format(1 / currency.rate)} USD")
+        lines.append(f"• {quick}")
+        lines.append(f"• Rates as of {currency.as_of}; check a live rate before exchanging money")
+    return "\n".join(lines)
+
+
+def _amounts(line: str) -> list:
+    return [float(value.replace(",", "")) for match in _AMOUNT.findall(line or "") for value in match if value]
+
+
+def localize_budget(text: str, currency: Currency) -> str:
+    """Put the local currency line first and add the USD totals converted to local currency."""
+    lines = [line for line in (text or "").strip().splitlines()
+             if not line.lstrip().startswith(("💱", LOCAL_TOTALS_PREFIX))]
+    while lines and not lines[0].strip():
+        lines.pop(0)
+
+    total = next((i for i, line in enumerate(lines) if _TOTAL.match(line)), None)
+    per_day = next((i for i, line in enumerate(lines) if _PER_DAY.match(line)), None)
+    if currency.code != "USD" and total is not None:
+        total_usd = _amounts(lines[total])
+        per_day_usd = _amounts(lines[per_day]) if per_day is not None else []
+        if total_usd:
+            # Both totals converted in one pass, then split back apart
+            local = convert(total_usd + per_day_usd, currency)
+            parts = [" – ".join(_format(v) for v in local[:len(total_usd)]) + " total"]
+            if per_day_usd:
+                parts.append(" – ".join(_format(v) for v in local[len(total_usd):]) + " per person/day")
+            lines.insert(max(total, per_day or 0) + 1,
+                         f"{LOCAL_TOTALS_PREFIX}{currency.code}: {' · '.join(parts)}")
+
+    return "\n".join([currency_line(currency), ""] + lines)
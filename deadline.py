@@ -0,0 +1,63 @@
+"""Plan deadlines passed down to section calls.
+
+run_sections gives every section its own deadline: its share of the plan
+deadline, counted from when the plan started. DeepSeek requests made while a
+deadline is active use the remaining time as their timeout and stop streaming
+once it passes; sections that run out of time are answered from fallbacks.
+"""
+import contextlib
+import contextvars
+import os
+import time
+
+# Seconds a whole plan may take; 0 disables deadlines
+PLAN_DEADLINE = float(os.getenv("TRIPMATE_PLAN_DEADLINE", "45"))
+
+# Share of the plan deadline each section may use; quick sections give up sooner
+SECTION_BUDGETS = {
+    "budget": 1.0,
+    "packing": 1.0,
+    "itinerary": 1.0,
+    "restaurants": 1.0,
+    "transport": 0.8,
+    "culture": 0.8,
+    "currency": 0.5,
+}
+
+_deadline = contextvars.ContextVar("tripmate_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a section call runs past its deadline."""
+
+
+def remaining():
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def check():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+@contextlib.contextmanager
+def deadline(at: float):
+    """Run the block under a monotonic-clock deadline (None for none); an outer, earlier one still applies."""
+    outer = _deadline.get()
+    if at is None or (outer is not None and outer < at):
+        at = outer
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def section_deadline(key: str, plan_started: float, plan_deadline: float):
+    """Monotonic time a section of a plan started at plan_started must finish by, or None."""
+    if not plan_deadline:
+        return None
+    return plan_started + plan_deadline * SECTION_BUDGETS.get(key, 1.0)
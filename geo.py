@@ -0,0 +1,91 @@
+"""City lookups backed by the bundled geonamescache data."""
+from functools import lru_cache
+
+import geonamescache
+
+# A bare city name only resolves offline when one match is clearly the place meant:
+# big enough to be a destination in itself and well ahead of any namesake
+CLEAR_MATCH_POPULATION = 100_000
+CLEAR_MATCH_RATIO = 2
+
+
+def _key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+@lru_cache(maxsize=1)
+def _cities_by_name() -> dict:
+    """geonames cities for each (case-folded) city name, most populous first."""
+    index = {}
+    for city in geonamescache.GeonamesCache().get_cities().values():
+        index.setdefault(_key(city["name"]), []).append(city)
+    for cities in index.values():
+        cities.sort(key=lambda city: -city["population"])
+    return index
+
+
+@lru_cache(maxsize=1)
+def countries() -> dict:
+    """geonamescache country records keyed by ISO2 code."""
+    return geonamescache.GeonamesCache().get_countries()
+
+
+@lru_cache(maxsize=4096)
+def resolve_city(name: str) -> dict:
+    """Return the city a destination means (or None), e.g. "Paris" -> Paris, FR.
+
+    After a comma only a country is understood, and the city must be in it:
+    "Paris, United States" -> Paris, US, while "London, Ontario" -> None.
+    A bare name needs one clear match: "Springfield" or "Bali" -> None.
+    """
+    if not name:
+        return None
+    city, _, rest = name.partition(",")
+    cities = _cities_by_name().get(_key(city), ())
+    if rest.strip():
+        country = named_country(name)
+        cities = [c for c in cities if country is not None and c["countrycode"] == country["iso"]]
+        return cities[0] if cities else None
+    if not cities or cities[0]["population"] < CLEAR_MATCH_POPULATION:
+        return None
+    if len(cities) > 1 and cities[0]["population"] < CLEAR_MATCH_RATIO * cities[1]["population"]:
+        return None
+    return cities[0]
+
+
+@lru_cache(maxsize=1)
+def _countries_by_name() -> dict:
+    return {_key(country["name"]): country for country in countries().values()}
+
+
+@lru_cache(maxsize=4096)
+def named_country(name: str) -> dict:
+    """Return the country a destination names outright (or None), e.g. "Kyoto, Japan" or "Singapore"."""
+    if not name:
+        return None
+    for part in reversed(name.split(",")):
+        country = _countries_by_name().get(_key(part))
+        if country is not None:
+            return country
+    return None
+
+
+@lru_cache(maxsize=4096)
+def resolve_country(name: str) -> dict:
+    """Return the country of a destination (or None), e.g. "Kyoto" or "Kyoto, Japan" -> Japan.
+
+    A country named in the destination wins over the country of a same-named city.
+    """
+    country = named_country(name)
+    if country is not None:
+        return country
+    city = resolve_city(name)
+    return countries().get(city["countrycode"]) if city else None
+
+
+@lru_cache(maxsize=4096)
+def weather_query(destination: str) -> str:
+    """OpenWeather "q" for a destination: "City,CC" when it names a known country, e.g. "Paris, United States" -> "Paris,US"."""
+    city, _, rest = destination.partition(",")
+    country = resolve_country(destination) if rest.strip() else None
+    return f"{city.strip()},{country['iso']}" if country else destination
@@ -0,0 +1,150 @@
+"""Hedged DeepSeek requests against slow-completion tail latency.
+
+When a request has not answered by a high percentile of its section's recent
+latency, a duplicate is sent and whichever answers first is used; the other
+is aborted at its next streamed chunk. Streaming calls race to their first
+token (that is when the caller starts seeing text), other calls race to the
+finished completion. Duplicates spend from a budget that refills by a fixed
+share of all calls, and need free room in the rate limiter.
+"""
+import contextvars
+import os
+import queue
+import threading
+import time
+
+from telemetry import METRICS, current_section
+
+HEDGE_ENABLED = os.getenv("TRIPMATE_HEDGE", "0") == "1"
+# Hedge after this percentile of the section's recent latency
+HEDGE_PERCENTILE = int(os.getenv("TRIPMATE_HEDGE_PERCENTILE", "95"))
+# Extra requests allowed, as a share of all calls
+HEDGE_MAX_EXTRA = float(os.getenv("TRIPMATE_HEDGE_MAX_EXTRA", "0.1"))
+# Latency samples a section needs before it is hedged
+HEDGE_MIN_SAMPLES = 20
+# Unused hedge budget is capped so a quiet period can't fund a burst of duplicates
+HEDGE_BURST = 5.0
+# How long a computed hedge delay is reused
+DELAY_REFRESH = 5.0
+
+METRICS.describe("tripmate_llm_hedges_total", "counter",
+                 "Hedged DeepSeek requests by outcome (fired, won, skipped)")
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a request that lost its hedge race."""
+
+
+class Hedger:
+    """Races a duplicate request against slow ones, within a budget of extra requests."""
+
+    def __init__(self, limiter, percentile: int = HEDGE_PERCENTILE, max_extra: float = HEDGE_MAX_EXTRA):
+        self.limiter = limiter
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self._budget = 0.0
+        self._delays = {}
+        self._lock = threading.Lock()
+
+    def delay(self, section: str, first_token: bool):
+        """Seconds to wait before hedging a call of section, or None while there is too little history."""
+        key = (section, first_token)
+        now = time.monotonic()
+        cached = self._delays.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        if first_token:
+            stats = METRICS.percentiles("tripmate_llm_first_token_seconds", by="section",
+                                        quantiles=(self.percentile,), section=section)
+        else:
+            stats = METRICS.percentiles("tripmate_llm_request_seconds", by="section",
+                                        quantiles=(self.percentile,), section=section, repair="false", outcome="ok")
+        stats = stats.get(section)
+        value = stats[f"p{self.percentile}"] if stats and stats["count"] >= HEDGE_MIN_SAMPLES else None
+        self._delays[key] = (now + DELAY_REFRESH, value)
+        return value
+
+    def _earn(self):
+        with self._lock:
+            self._budget = min(HEDGE_BURST, self._budget + self.max_extra)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def run(self, send, on_delta=None, estimated_tokens: int = 0):
+        """Return send(deltas, stop) for one request, hedged with a duplicate if it runs slow.
+
+        send performs one request, passing text to deltas and aborting once stop
+        is set. on_delta only ever sees the winning request's text.
+        """
+        section = current_section()
+        first_token = on_delta is not None
+        delay = self.delay(section, first_token)
+        self._earn()
+        if delay is None:
+            return send(on_delta, None)
+
+        results = queue.Queue()
+        stops = (threading.Event(), threading.Event())
+        lock = threading.Lock()
+        winner = []
+        # Set once a request has streamed its first token or finished, so there is nothing left to hedge
+        answered = threading.Event()
+
+        def start(i, admitted=False):
+            def deliver(delta):
+                with lock:
+                    if not winner:
+                        winner.append(i)
+                        stops[1 - i].set()
+                        answered.set()
+                if winner[0] != i:
+                    raise HedgeCancelled()
+                on_delta(delta)
+
+            def run():
+                try:
+                    results.put((i, None, send(deliver if first_token else None, stops[i])))
+                except BaseException as e:
+                    results.put((i, e, None))
+                finally:
+                    answered.set()
+                    if admitted:
+                        self.limiter.concurrency.release("error")
+
+            # Copy the context so the request is still attributed to this section
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(run,), daemon=True, name=f"tripmate-hedge-{i}").start()
+
+        start(0)
+        running = 1
+        # Checked again under the lock, since the first token may arrive just as the wait ends
+        if not answered.wait(delay):
+            with lock:
+                slow = not answered.is_set()
+                if slow and self._spend() and self.limiter.try_admit(estimated_tokens):
+                    METRICS.inc("tripmate_llm_hedges_total", section=section, outcome="fired")
+                    start(1, admitted=True)
+                    running = 2
+                elif slow:
+                    METRICS.inc("tripmate_llm_hedges_total", section=section, outcome="skipped")
+        outcome = results.get()
+
+        error = None
+        while True:
+            i, e, result = outcome
+            running -= 1
+            if e is None:
+                stops[1 - i].set()
+                if i == 1:
+                    METRICS.inc("tripmate_llm_hedges_total", section=section, outcome="won")
+                return result
+            if error is None and not isinstance(e, HedgeCancelled):
+                error = e
+            if not running:
+                raise error or e
+            outcome = results.get()
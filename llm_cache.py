@@ -0,0 +1,231 @@
+"""Persistent cache for TripMate section responses.
+
+Entries live in a small SQLite file, zlib-compressed, keyed on the section
+method, its normalized arguments and a hash of the method and prompt-builder
+source, so editing a prompt invalidates old answers on its own.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+CACHE_ENABLED = os.getenv("TRIPMATE_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("TRIPMATE_CACHE_PATH", os.path.join(".cache", "tripmate_llm.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.getenv("TRIPMATE_CACHE_MAX_ENTRIES", "5000"))
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# How long each section's answer stays fresh
+SECTION_TTLS = {
+    "get_cultural_tips": 30 * DAY,
+    "get_public_transport_guide": 30 * DAY,
+    "get_restaurant_recommendations": 7 * DAY,
+    "get_currency_info": 1 * DAY,
+    "generate_itinerary": 3 * DAY,
+    "generate_packing_list": 3 * HOUR,
+    "estimate_budget": 6 * HOUR,
+}
+DEFAULT_TTL = 1 * DAY
+
+_local = threading.local()
+
+
+def skip_cache():
+    """Keep the current section result out of the cache (e.g. a placeholder fallback)."""
+    _local.skip = True
+
+
+@contextmanager
+def bypass_cache():
+    """Ignore cached answers for section calls made in this thread; the fresh answers are still stored."""
+    previous = getattr(_local, "bypass", False)
+    _local.bypass = True
+    try:
+        yield
+    finally:
+        _local.bypass = previous
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(_normalize(v) for v in value)
+    return value
+
+
+def normalized_params(signature: inspect.Signature, *args, **kwargs) -> dict:
+    """Bind a call to a section method and normalize its arguments, leaving out self and on_delta."""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return {
+        name: _normalize(value)
+        for name, value in bound.arguments.items()
+        if name not in ("self", "on_delta")
+    }
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                section TEXT NOT NULL,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+
+    @staticmethod
+    def make_key(section: str, params: dict, template_hash: str) -> str:
+        payload = json.dumps([section, template_hash, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, stale: bool = False):
+        """Return the cached value for key, or None if missing or expired.
+
+        With stale set, expired entries are returned too (without counting a
+        hit or miss), for answers that are better late than missing.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if stale:
+                return json.loads(zlib.decompress(row[0])) if row else None
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, section: str, value, ttl: float):
+        now = time.time()
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, section, blob, now, now + ttl, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def cached_section(*prompt_builders):
+    """Serve a TripMateAgent section method from ``self.cache`` when possible.
+
+    prompt_builders name the agent methods that render the section's prompt;
+    their source is hashed together with the method's own.
+    """
+    def decorate(fn):
+        section = fn.__name__
+        signature = inspect.signature(fn)
+        ttl = SECTION_TTLS.get(section, DEFAULT_TTL)
+        template_hashes = {}
+
+        def template_hash(agent) -> str:
+            owner = type(agent)
+            if owner not in template_hashes:
+                sources = [inspect.getsource(fn)]
+                sources += [inspect.getsource(getattr(owner, name)) for name in prompt_builders]
+                template_hashes[owner] = hashlib.sha256("".join(sources).encode("utf-8")).hexdigest()[:16]
+            return template_hashes[owner]
+
+        def cache_key(self, *args, **kwargs):
+            """Cache key for a call, or None when caching is off."""
+            if getattr(self, "cache", None) is None:
+                return None
+            params = normalized_params(signature, self, *args, **kwargs)
+            return self.cache.make_key(section, params, template_hash(self))
+
+        def lookup(self, *args, **kwargs):
+            """Return (key, cached value or None) for a call; key is None when caching is off."""
+            key = cache_key(self, *args, **kwargs)
+            return key, self.cache.get(key) if key is not None else None
+
+        def stale(self, *args, **kwargs):
+            """Return the cached value for a call even if it has expired, or None."""
+            key = cache_key(self, *args, **kwargs)
+            return self.cache.get(key, stale=True) if key is not None else None
+
+        def store(self, key, result):
+            if key is not None and result:
+                self.cache.set(key, section, result, ttl)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if getattr(_local, "bypass", False):
+                key, hit = cache_key(self, *args, **kwargs), None
+            else:
+                key, hit = lookup(self, *args, **kwargs)
+            if hit is not None:
+                on_delta = kwargs.get("on_delta")
+                if on_delta:
+                    on_delta(hit["budget_text"] if isinstance(hit, dict) else hit)
+                return hit
+
+            _local.skip = False
+            result = fn(self, *args, **kwargs)
+            if not _local.skip:
+                store(self, key, result)
+            return result
+
+        wrapper.cache_lookup = lookup
+        wrapper.cache_store = store
+        wrapper.cache_stale = stale
+        return wrapper
+
+    return decorate
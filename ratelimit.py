@@ -0,0 +1,281 @@
+"""Client-side rate limiting, adaptive concurrency and retries for DeepSeek calls.
+
+Each completion first takes one request and its estimated tokens from two
+token buckets, then a slot under an AIMD concurrency limit: the limit grows by
+about one slot for every limit's worth of successful calls and is halved on
+429/5xx answers or when latency climbs well above its long-run level. Failed
+attempts that are safe to repeat are retried with jittered exponential
+backoff, or after the server's Retry-After when it sends one.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+
+import openai
+
+from deadline import DeadlineExceeded, check as check_deadline, remaining
+from telemetry import METRICS, current_section
+
+LLM_RPM = float(os.getenv("TRIPMATE_LLM_RPM", "600"))
+LLM_TPM = float(os.getenv("TRIPMATE_LLM_TPM", "1000000"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("TRIPMATE_LLM_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("TRIPMATE_LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_RETRIES = int(os.getenv("TRIPMATE_LLM_MAX_RETRIES", "4"))
+
+# Seconds of traffic the buckets may release at once
+BURST_SECONDS = 10
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+RETRY_AFTER_CAP = 60.0
+# Multiplicative decrease, applied at most once per cooldown so one burst of errors halves the limit once
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 2.0
+# Latency is "rising" when its short-run average exceeds the long-run one by this factor
+LATENCY_TOLERANCE = 2.0
+LATENCY_MIN_SAMPLES = 20
+FAST_ALPHA = 0.3
+SLOW_ALPHA = 0.02
+# Rough prompt size estimate; DeepSeek's tokenizer averages about four characters per token
+CHARS_PER_TOKEN = 4
+
+METRICS.describe("tripmate_llm_concurrency_limit", "gauge", "Current adaptive DeepSeek concurrency limit")
+METRICS.describe("tripmate_llm_inflight", "gauge", "DeepSeek completions in flight")
+METRICS.describe("tripmate_llm_queue_seconds", "histogram", "Time a completion waited for the rate limiter")
+METRICS.describe("tripmate_llm_retries_total", "counter", "DeepSeek attempts retried, by reason")
+METRICS.describe("tripmate_llm_backoffs_total", "counter", "Concurrency limit decreases, by reason")
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Upper-bound token cost of a completion: the prompt plus everything it may generate."""
+    return len(prompt) // CHARS_PER_TOKEN + max_tokens
+
+
+def _status(error: Exception):
+    return getattr(error, "status_code", None)
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):
+        # Includes timeouts
+        return True
+    status = _status(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def _overloaded(error: Exception) -> bool:
+    status = _status(error)
+    return isinstance(error, openai.APITimeoutError) or status == 429 or (status is not None and status >= 500)
+
+
+def _reason(error: Exception) -> str:
+    status = _status(error)
+    return f"http_{status}" if status else type(error).__name__
+
+
+def retry_after(error: Exception):
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms), or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return min(RETRY_AFTER_CAP, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        return min(RETRY_AFTER_CAP, max(0.0, seconds))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket that lets callers reserve ahead: a reservation returns how long to wait for it."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float):
+        """Give back a reservation that was never used (e.g. the call was turned away)."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def try_take(self, amount: float) -> bool:
+        """Take amount only if it is available right now."""
+        with self._lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def drain(self, seconds: float):
+        """Hold back new reservations for about seconds (e.g. after a Retry-After)."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class AIMDLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._latency = {}
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self):
+        METRICS.set("tripmate_llm_concurrency_limit", self.limit)
+        METRICS.set("tripmate_llm_inflight", self.inflight)
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Wait for a slot; False if none freed up within timeout seconds."""
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                left = None if expires is None else expires - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+            self.inflight += 1
+            self._publish()
+            return True
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.inflight >= int(self.limit):
+                return False
+            self.inflight += 1
+            self._publish()
+            return True
+
+    def release(self, outcome: str, latency: float = None, latency_key=None):
+        """Free a slot and adapt the limit; outcome is "ok", "overload" or "error" (no change)."""
+        with self._cond:
+            self.inflight -= 1
+            if outcome == "overload":
+                self._decrease("overload")
+            elif outcome == "ok":
+                if latency is not None and self._latency_rising(latency_key, latency):
+                    self._decrease("latency")
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._publish()
+            self._cond.notify_all()
+
+    def _latency_rising(self, key, latency: float) -> bool:
+        # Calls with the same max_tokens are comparable; each key keeps a fast and a slow average
+        fast, slow, count = self._latency.get(key, (latency, latency, 0))
+        fast += FAST_ALPHA * (latency - fast)
+        slow += SLOW_ALPHA * (latency - slow)
+        self._latency[key] = (fast, slow, count + 1)
+        return count >= LATENCY_MIN_SAMPLES and fast > LATENCY_TOLERANCE * slow
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+        METRICS.inc("tripmate_llm_backoffs_total", reason=reason)
+
+
+class RateLimiter:
+    """Admission control and retries for every DeepSeek completion of one agent."""
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES):
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * BURST_SECONDS))
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 60 * BURST_SECONDS))
+        self.concurrency = AIMDLimiter(initial_concurrency, max_concurrency)
+        self.max_retries = max_retries
+
+    def try_admit(self, estimated_tokens: int) -> bool:
+        """Admit an optional extra request (e.g. a hedge) only if there is headroom right now.
+
+        The caller releases it with self.concurrency.release().
+        """
+        if not self.concurrency.try_acquire():
+            return False
+        if self.requests.try_take(1) and self.tokens.try_take(estimated_tokens):
+            return True
+        self.concurrency.release("error")
+        return False
+
+    def _acquire(self, wait: float) -> bool:
+        if wait:
+            time.sleep(wait)
+        return self.concurrency.acquire(timeout=remaining())
+
+    def run(self, attempt, estimated_tokens: int, latency_key=None, can_retry=None):
+        """Call attempt() once admitted, retrying failures that are safe to repeat.
+
+        can_retry is asked before each retry; a streaming call answers False once
+        it has passed text on, since a retry would repeat it. Waiting for
+        admission or for a retry never runs past the current deadline.
+        """
+        retries = 0
+        while True:
+            queued = time.monotonic()
+            check_deadline()
+            left = remaining()
+            wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            if (left is not None and wait >= left) or not self._acquire(wait):
+                # Turned away without sending anything, so the capacity goes back to other callers
+                self.requests.refund(1)
+                self.tokens.refund(estimated_tokens)
+                raise DeadlineExceeded()
+            started = time.monotonic()
+            METRICS.observe("tripmate_llm_queue_seconds", started - queued, section=current_section())
+            try:
+                result = attempt()
+            except BaseException as e:
+                overloaded = _overloaded(e)
+                self.concurrency.release("overload" if overloaded else "error")
+                if retries >= self.max_retries or not _retryable(e) or (can_retry and not can_retry()):
+                    raise
+                delay = retry_after(e)
+                if delay is not None:
+                    # Everyone waits out the server's Retry-After, not just this call
+                    self.requests.drain(delay)
+                    delay += random.uniform(0, 0.1 * delay)
+                else:
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** retries))
+                left = remaining()
+                if left is not None and delay >= left:
+                    raise
+                METRICS.inc("tripmate_llm_retries_total", reason=_reason(e), section=current_section())
+                retries += 1
+                time.sleep(delay)
+                continue
+            self.concurrency.release("ok", time.monotonic() - started, latency_key)
+            return result
@@ -0,0 +1,416 @@
+"""Markdown rendering shared by the Streamlit app and the batch CLI.
+
+Section markdown becomes HTML for the on-page boxes and a ReportLab PDF for
+the download; neither depends on Streamlit.
+"""
+import copy
+import hashlib
+import html as html_module
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from telemetry import METRICS
+
+# Memory for rendered section HTML and plan PDFs, shared by every session in the process
+RENDER_CACHE_MB = float(os.getenv("TRIPMATE_RENDER_CACHE_MB", "64"))
+# PDFs built at once; each build is CPU-bound ReportLab work
+PDF_WORKERS = int(os.getenv("TRIPMATE_PDF_WORKERS", "2"))
+# Laid-out sections kept for reuse in later PDFs
+SECTION_FLOWABLES_CACHE = 256
+
+METRICS.describe("tripmate_render_cache_total", "counter", "Render cache lookups by kind (html, pdf) and result")
+
+# Display order of the plan sections: (key, box title, box css class, PDF heading)
+SECTION_LAYOUT = [
+    ('budget', '💰 Budget Estimate', 'budget-box', 'Budget Estimate'),
+    ('packing', '🎒 Packing List', 'packing-box', 'Packing List'),
+    ('itinerary', '📅 Your Itinerary', 'itinerary-box', 'Itinerary'),
+    ('transport', '🚇 Public Transportation', 'transport-box', 'Public Transportation'),
+    ('culture', '🌍 Cultural Tips', 'culture-box', 'Cultural Tips'),
+    ('restaurants', '🍴 Where to Eat', 'restaurant-box', 'Restaurant Guide'),
+    ('currency', '💱 Currency & Payments', 'currency-box', 'Currency Information'),
+]
+
+
+_ENTITIES = {'&lt;': '<', '&gt;': '>', '&amp;': '&', '&#60;': '<', '&#62;': '>', '&#38;': '&'}
+_ENTITY_RE = re.compile('|'.join(_ENTITIES))
+# Everything the model sometimes wraps its markdown in, matched in one pass:
+# code fences and backticks, bold/italic/heading tags (kept as markdown),
+# line-level tags (turned into line breaks and bullets) and any other tag
+_MARKUP_RE = re.compile(
+    r'```[a-zA-Z0-9_-]*\n?|`'
+    r'|<(h[234]|strong|b)(?:\s[^>]*)?>(.*?)</\1>'
+    r'|<(em|i)(?:\s[^>]*)?>(.*?)</\3>'
+    r'|<br\s*/?>|</p>|</li>|<li[^>]*>'
+    r'|</?[a-zA-Z!][^>]*>',
+    re.IGNORECASE | re.DOTALL,
+)
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+_SUBHEADING_MAX = 80
+
+
+def _markup(match) -> str:
+    token = match.group(0)
+    if match.group(1):
+        return f'**{match.group(2)}**'
+    if match.group(3):
+        return f'*{match.group(4)}*'
+    lower = token[:4].lower()
+    if lower.startswith('<br') or lower in ('</p>', '</li'):
+        return '\n'
+    if lower.startswith('<li'):
+        return '• '
+    return ''
+
+
+def _spans(line: str) -> tuple:
+    if '**' not in line:
+        return ((line, False),)
+    # split() alternates plain text and the text of bold spans
+    return tuple((part, i % 2 == 1) for i, part in enumerate(_BOLD_RE.split(line)) if part)
+
+
+def parse_markdown(text: str) -> tuple:
+    """Parse section markdown into (kind, spans) blocks, one per non-empty line.
+
+    kind is "heading" (a whole-line bold category header), "bullet", "day"
+    (a "Day N" line), "label" (a short line ending in a colon) or "paragraph";
+    spans are (text, bold) pairs. HTML or code fences the model wrapped the
+    markdown in are reduced to markdown first, in one pass.
+    """
+    if not text:
+        return ()
+    text = text.strip()
+    if '&' in text:
+        text = _ENTITY_RE.sub(lambda m: _ENTITIES[m.group(0)], text)
+    if '<' in text or '`' in text:
+        text = _MARKUP_RE.sub(_markup, text)
+    blocks = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('**') and line.endswith('**') and len(line) > 4:
+            blocks.append(('heading', ((line.strip('*').strip().replace('**', ''), True),)))
+        elif line.startswith('•') or line.startswith('-'):
+            # Bullets are shown without bold
+            blocks.append(('bullet', ((line[1:].strip().replace('**', ''), False),)))
+        elif line.startswith('Day ') and len(line) < _SUBHEADING_MAX:
+            blocks.append(('day', _spans(line)))
+        elif line.endswith(':') and len(line) < _SUBHEADING_MAX:
+            blocks.append(('label', _spans(line)))
+        else:
+            blocks.append(('paragraph', _spans(line)))
+    return tuple(blocks)
+
+
+def _html_text(text: str) -> str:
+    # $ is escaped so Streamlit/KaTeX doesn't read currency amounts as math
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('$', '&#36;')
+
+
+def _html_spans(spans: tuple) -> str:
+    return ''.join(f'<strong>{_html_text(text)}</strong>' if bold else _html_text(text) for text, bold in spans)
+
+
+def blocks_html(blocks: tuple) -> str:
+    """HTML for the on-page section boxes; day and label lines are plain paragraphs here."""
+    lines = []
+    in_list = False
+    for kind, spans in blocks:
+        if kind == 'bullet':
+            if not in_list:
+                lines.append('<ul>')
+                in_list = True
+            lines.append(f'<li>{_html_text(spans[0][0])}</li>')
+            continue
+        if in_list:
+            lines.append('</ul>')
+            in_list = False
+        if kind == 'heading':
+            lines.append(f'<h4>{_html_text(spans[0][0])}</h4>')
+        else:
+            lines.append(f'<p>{_html_spans(spans)}</p>')
+    if in_list:
+        lines.append('</ul>')
+    return '\n'.join(lines)
+
+
+def clean_html_output(text):
+    """Clean up HTML output properly - convert markdown to HTML."""
+    return blocks_html(parse_markdown(text))
+
+
+def _pdf_text(text: str) -> str:
+    # ASCII only to avoid broken glyphs in the PDF, escaped for ReportLab's paragraph markup
+    return html_module.escape("".join(ch for ch in text if ord(ch) < 128), quote=False)
+
+
+def _pdf_spans(spans: tuple) -> str:
+    return "".join(f"<b>{_pdf_text(text)}</b>" if bold else _pdf_text(text) for text, bold in spans)
+
+
+@lru_cache(maxsize=1)
+def _pdf_styles() -> dict:
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor='#6B9AC4',
+            spaceAfter=6,
+            alignment=TA_CENTER
+        ),
+        'subtitle': ParagraphStyle(
+            'Subtitle',
+            parent=styles['Normal'],
+            fontSize=11,
+            textColor='#2D3561',
+            spaceAfter=20,
+            alignment=TA_CENTER
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            textColor='#2D3561',
+            spaceAfter=10,
+            spaceBefore=16
+        ),
+        # Bold category headers (like CLOTHING, ELECTRONICS)
+        'category': ParagraphStyle(
+            'CategoryHeader',
+            parent=styles['Normal'],
+            fontSize=11,
+            textColor='#2D3561',
+            fontName='Helvetica-Bold',
+            spaceAfter=6,
+            spaceBefore=10
+        ),
+        # Subheadings (like "Food Markets:", "Key Tips:", "Day 1:")
+        'subheading': ParagraphStyle(
+            'Subheading',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor='#2D3561',
+            fontName='Helvetica-Bold',
+            spaceAfter=6,
+            spaceBefore=10
+        ),
+        'body': ParagraphStyle(
+            'Body',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=14
+        ),
+    }
+
+
+# Spacing around each kind of block in the PDF: (before, after) in inches
+_PDF_SPACING = {
+    'heading': (0.08, 0.04),
+    'day': (0.16, 0.06),
+    'label': (0.06, 0.04),
+    'bullet': (0, 0.04),
+    'paragraph': (0, 0.05),
+}
+
+
+class _LaidOutParagraph(Paragraph):
+    """Paragraph that keeps its line breaks per width, so reusing it in another PDF skips the layout.
+
+    Shallow copies share the memo, so every PDF built from copies of one
+    cached section lays it out only once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lines = {}
+
+    def breakLines(self, width):
+        key = tuple(width) if isinstance(width, (list, tuple)) else width
+        if key not in self._lines:
+            self._lines[key] = super().breakLines(width)
+        return self._lines[key]
+
+
+def section_flowables(title: str, blocks: tuple) -> list:
+    """ReportLab flowables for one plan section: its heading and its blocks."""
+    styles = _pdf_styles()
+    story = [
+        # Spacing between sections instead of a page break
+        Spacer(1, 0.3*inch),
+        _LaidOutParagraph(_pdf_text(title), styles['heading']),
+        Spacer(1, 0.14*inch),
+    ]
+    for kind, spans in blocks:
+        before, after = _PDF_SPACING[kind]
+        if kind == 'heading':
+            paragraph = _LaidOutParagraph(_pdf_text(spans[0][0]), styles['category'])
+        elif kind in ('day', 'label'):
+            # Set as subheadings, so bold spans are merged
+            paragraph = _LaidOutParagraph(_pdf_text("".join(text for text, _ in spans)), styles['subheading'])
+        elif kind == 'bullet':
+            paragraph = _LaidOutParagraph(f"  • {_pdf_text(spans[0][0])}", styles['body'])
+        else:
+            paragraph = _LaidOutParagraph(_pdf_spans(spans), styles['body'])
+        if before:
+            story.append(Spacer(1, before*inch))
+        story.append(paragraph)
+        story.append(Spacer(1, after*inch))
+    return story
+
+
+@lru_cache(maxsize=SECTION_FLOWABLES_CACHE)
+def _cached_section_flowables(title: str, content: str) -> tuple:
+    return tuple(section_flowables(title, parse_markdown(content)))
+
+
+def create_pdf(content_dict, destination, dates):
+    """Create a compact PDF without page breaks between sections."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                           rightMargin=72, leftMargin=72,
+                           topMargin=72, bottomMargin=18)
+    styles = _pdf_styles()
+    story = [
+        Paragraph(_pdf_text(f"TripMate AI - {destination}"), styles['title']),
+        Spacer(1, 0.08*inch),
+        Paragraph(_pdf_text(f"{dates}"), styles['subtitle']),
+    ]
+    for section_title, content in content_dict.items():
+        if content:
+            # Copies, since a build consumes its story and sets per-build state on each flowable
+            story.extend(copy.copy(flowable) for flowable in _cached_section_flowables(section_title, content))
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def pdf_sections(content: dict) -> dict:
+    """{PDF heading: markdown} in on-page order for the sections present in content."""
+    return {pdf_title: content[key] for key, _, _, pdf_title in SECTION_LAYOUT if key in content}
+
+
+class RenderCache:
+    """In-memory LRU of rendered output keyed by content hash, bounded by size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        payload = json.dumps(parts, ensure_ascii=False, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, kind: str, key: str):
+        """Cached output for (kind, key), or None."""
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries.move_to_end((kind, key))
+                self.hits += 1
+            else:
+                self.misses += 1
+        METRICS.inc("tripmate_render_cache_total", kind=kind, result="hit" if entry is not None else "miss")
+        return entry[0] if entry is not None else None
+
+    def put(self, kind: str, key: str, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((kind, key), None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[(kind, key)] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def get_or_render(self, kind: str, key: str, render):
+        """Return the cached output for (kind, key), calling render() to produce it on a miss."""
+        value = self.get(kind, key)
+        if value is None:
+            value = render()
+            self.put(kind, key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self.bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+RENDER_CACHE = RenderCache(int(RENDER_CACHE_MB * 1024 * 1024))
+
+
+def section_html(text: str) -> str:
+    """clean_html_output(text), rendered once per distinct text."""
+    return RENDER_CACHE.get_or_render("html", RENDER_CACHE.make_key(text), lambda: clean_html_output(text))
+
+
+_PDF_POOL = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="tripmate-pdf")
+_pdf_builds = {}
+_pdf_lock = threading.Lock()
+
+
+def _build_pdf(key: str, content: dict, destination: str, dates: str) -> bytes:
+    try:
+        value = create_pdf(content, destination, dates).getvalue()
+        RENDER_CACHE.put("pdf", key, value)
+        return value
+    finally:
+        with _pdf_lock:
+            _pdf_builds.pop(key, None)
+
+
+def pdf_future(content: dict, destination: str, dates: str) -> Future:
+    """Future of the plan's PDF bytes, built on the PDF worker pool once per distinct plan.
+
+    A plan is its section titles and text, destination and dates; concurrent
+    requests for the same plan share one build, and finished PDFs come from
+    the render cache. Sections already laid out for an earlier PDF are reused,
+    so a plan with one regenerated section only lays that section out again.
+    """
+    content = dict(content)
+    key = RENDER_CACHE.make_key(destination, dates, list(content.items()))
+    cached = RENDER_CACHE.get("pdf", key)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+    with _pdf_lock:
+        future = _pdf_builds.get(key)
+        if future is None:
+            future = _pdf_builds[key] = _PDF_POOL.submit(_build_pdf, key, content, destination, dates)
+    return future
+
+
+def plan_pdf(content: dict, destination: str, dates: str) -> bytes:
+    """The plan's PDF bytes (see pdf_future); blocks until they are built."""
+    return pdf_future(content, destination, dates).result()
@@ -0,0 +1,266 @@
+"""Local format repair for packing lists and budgets, and section fallbacks.
+
+When the model's answer misses a header, uses other bullet markers or drops a
+required line, the text is parsed into its known sections and rebuilt in the
+expected layout, with gaps filled from the built-in fallback templates. Repair
+gives up (returns None) when too little of the answer is usable, so the caller
+can fall back to a network repair.
+"""
+import re
+
+# Bullets the model uses instead of "•": -, *, +, ·, ▪, ●, "1." or "1)"
+_BULLET = re.compile(r"^\s*(?:[•\-*+·▪●‣]|\d{1,2}[.)])\s+")
+
+_PACKING_HEADER = re.compile(
+    r"^\s*(?:#{1,6}\s*)?\**\s*(WEATHER|CLOTHING|ELECTRONICS|LAUNDRY|LUGGAGE|SPECIAL NOTES)\b"
+    r"\s*\**\s*(\([^)]*\))?\s*\**\s*[:\-–—]?\s*\**\s*(.*?)\s*$",
+    re.IGNORECASE,
+)
+_BUDGET_HEADER = re.compile(
+    r"^\s*(?:#{1,6}\s*)?\**\s*(Accommodation|Food|Transport|Activities|Other|Money Tips)\b"
+    r"\s*\**\s*(\([^)]*\))?\s*\**\s*[:\-–—]?\s*\**\s*(.*?)\s*$",
+    re.IGNORECASE,
+)
+# Case-sensitive: per-block "Total:" lines must not be taken for the grand total
+_BUDGET_TOTAL = re.compile(r"^\s*\**\s*TOTAL\s*:")
+_BUDGET_PER_DAY = re.compile(r"^\s*\**\s*Per person/day\s*:", re.IGNORECASE)
+_BUDGET_CURRENCY = re.compile(r"^\s*(?:💱\s*)?\**\s*Currency\s*:", re.IGNORECASE)
+
+# Stand-ins from the budget template ("$XX-XX", "[CODE]") that a repaired answer may still contain
+_PLACEHOLDER = re.compile(r"\$X[X,]*|\[CODE\]|\[Local Currency\]")
+
+PACKING_INLINE_SECTIONS = ("WEATHER", "LAUNDRY", "LUGGAGE", "SPECIAL NOTES")
+BUDGET_BLOCKS = ("Accommodation", "Food", "Transport", "Activities", "Other", "Money Tips")
+
+
+def packing_fallback(weather_line: str, travel_style: str, destination: str) -> str:
+    """Placeholder packing list used when neither the model nor repair produce a valid one."""
+    return f"""{weather_line}
+
+**CLOTHING** ({travel_style} style)
+• Weather-appropriate outer layer
+• 2-3 tops
+• 1-2 bottoms
+• Warm layer (sweater/fleece)
+• Comfortable walking shoes
+• Sleepwear/underwear
+**ELECTRONICS**
+• Adapter type: [Type X for {destination}]
+
+
+**LAUNDRY**: Unknown - Pack a few extra basics just in case
+
+**LUGGAGE**: Carry-on - Flexible and easy to manage
+
+**SPECIAL NOTES**: Check local forecasts and dress in layers."""
+
+
+def budget_fallback(num_days: int, num_travelers: int,
+                    currency_line: str = "💱 Currency: [Local Currency] ([CODE]) | 1 USD = X [CODE]") -> str:
+    """Placeholder budget used when neither the model nor repair produce a valid one."""
+    return f"""{currency_line}
+
+**Accommodation** ({num_days} nights)
+• $XX-XX/night → Total: $XXX-XXX
+
+**Food** (per person/day)
+• Breakfast: $X-X
+• Lunch: $X-X
+• Dinner: $XX-XX
+• Daily: $XX-XX → Total ({num_days} days): $XXX-XXX
+
+**Transport**
+• Airport transfer: $XX-XX
+• Daily local: $X-X/day → Total: $XX-XX
+• Total: $XXX-XXX
+
+**Activities**
+• Entry fees & tours: $XXX-XXX
+
+**Other**
+• SIM/WiFi: $XX
+• Tips: $XX
+• Buffer: $XX
+• Total: $XXX-XXX
+
+**TOTAL: $X,XXX - $X,XXX** ({num_travelers} person(s))
+**Per person/day: $XXX-XXX**
+
+**Money Tips**:
+• Book in advance for better rates.
+• Use local transit passes when available.
+• Carry a small cash buffer for tips/fees."""
+
+
+# Stand-ins for free-form sections that ran out of time with nothing cached
+SECTION_FALLBACKS = {
+    "itinerary": """**Day-by-day plan for {destination}**
+• Your itinerary is taking longer than usual - refresh this section to try again
+• Meanwhile, pick 2-3 main sights per day and group them by neighbourhood
+• Leave an evening free for a food market or a walk through the old town""",
+    "transport": """**Getting around {destination}**
+• Live transport tips are unavailable right now - refresh this section to try again
+• Check the official transit app or website for routes, day passes and fares
+• Licensed taxis and ride-hailing apps are the fallback for late nights""",
+    "culture": """**Local customs in {destination}**
+• Cultural tips are unavailable right now - refresh this section to try again
+• Dress modestly for religious sites and follow posted photo rules
+• Learn a few words of greeting and thanks in the local language""",
+    "restaurants": """**Where to eat in {destination}**
+• Restaurant picks are unavailable right now - refresh this section to try again
+• Busy places full of locals and short menus are usually a good sign
+• Check recent reviews for dietary options before you go""",
+    "currency": """**Currency & payments**
+• Currency details are unavailable right now - refresh this section to try again
+• Cards are widely accepted in cities; carry some cash for small shops and tips""",
+}
+
+
+def section_fallback(key: str, destination: str) -> str:
+    """Placeholder for a free-form section (itinerary, transport, culture, restaurants, currency)."""
+    return SECTION_FALLBACKS[key].format(destination=destination)
+
+
+def _strip_fences(text: str) -> str:
+    return "\n".join(l for l in text.splitlines() if not l.strip().startswith("```"))
+
+
+def _bullet(line: str):
+    """Text of a bullet line with its marker removed, or None if line is not a bullet."""
+    match = _BULLET.match(line)
+    if match and not line.lstrip().startswith("**"):
+        return line[match.end():].strip()
+    return None
+
+
+def _emphasize(line: str) -> str:
+    """Bold a totals line, leaving a trailing "(n person(s))" note outside the emphasis."""
+    value, _, note = line.replace("**", "").strip().partition(" (")
+    return f"**{value.strip()}** ({note}" if note else f"**{value.strip()}**"
+
+
+def _parse(text: str, header: re.Pattern) -> dict:
+    """Split text into {section name: {"note", "inline", "lines"}} using header lines."""
+    sections = {}
+    current = None
+    for raw in _strip_fences(text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        match = header.match(line) if _bullet(line) is None else None
+        if match:
+            name = match.group(1)
+            current = sections.setdefault(name.upper(), {"name": name, "note": match.group(2) or "",
+                                                         "inline": "", "lines": []})
+            if match.group(3):
+                current["inline"] = match.group(3).strip("* ")
+            continue
+        if current is None:
+            continue
+        bullet = _bullet(line)
+        current["lines"].append(bullet if bullet is not None else line.replace("**", ""))
+    return sections
+
+
+def has_placeholders(text: str) -> bool:
+    """Whether text still contains fallback-template stand-ins, e.g. a budget block filled by repair_budget."""
+    return bool(text) and _PLACEHOLDER.search(text) is not None
+
+
+def repair_packing_list(text: str, weather_line: str, travel_style: str, destination: str) -> str:
+    """Rebuild a malformed packing list in the expected layout, or return None if too little is usable."""
+    found = _parse(text, _PACKING_HEADER)
+    defaults = _parse(packing_fallback(weather_line, travel_style, destination), _PACKING_HEADER)
+
+    clothing = found.get("CLOTHING", {}).get("lines", [])
+    if len(clothing) < 3:
+        return None
+    filled = 0
+    for name in defaults["CLOTHING"]["lines"]:
+        if len(clothing) >= 6:
+            break
+        if name not in clothing:
+            clothing.append(name)
+
+    electronics = found.get("ELECTRONICS", {}).get("lines", [])
+    if not any(l.startswith("Adapter type:") for l in electronics):
+        adapter = next((l for l in electronics if "adapter" in l.lower()), None)
+        if adapter:
+            electronics[electronics.index(adapter)] = f"Adapter type: {adapter.split(':', 1)[-1].strip()}"
+        else:
+            electronics.insert(0, defaults["ELECTRONICS"]["lines"][0])
+            filled += 1
+    for extra in ("Phone charger", "Power bank"):
+        if len(electronics) >= 3:
+            break
+        if extra not in electronics:
+            electronics.append(extra)
+
+    inline = {}
+    for name in PACKING_INLINE_SECTIONS:
+        section = found.get(name)
+        value = " ".join([section["inline"]] + section["lines"]).strip() if section else ""
+        if not value:
+            value = defaults[name]["inline"]
+            filled += name != "WEATHER"
+        inline[name] = value
+    # Too many holes means the answer wasn't really a packing list
+    if filled > 2:
+        return None
+
+    clothing_lines = "\n".join(f"• {l}" for l in clothing)
+    electronics_lines = "\n".join(f"• {l}" for l in electronics)
+    return f"""**WEATHER**: {inline["WEATHER"]}
+
+**CLOTHING** ({travel_style} style)
+{clothing_lines}
+
+**ELECTRONICS**
+{electronics_lines}
+
+**LAUNDRY**: {inline["LAUNDRY"]}
+
+**LUGGAGE**: {inline["LUGGAGE"]}
+
+**SPECIAL NOTES**: {inline["SPECIAL NOTES"]}"""
+
+
+def repair_budget(text: str, num_days: int, num_travelers: int) -> str:
+    """Rebuild a malformed budget in the expected layout, or return None if too little is usable."""
+    lines = [l.strip() for l in _strip_fences(text or "").splitlines()]
+    template = budget_fallback(num_days, num_travelers).splitlines()
+    total = next((l for l in lines if _BUDGET_TOTAL.match(l)), None)
+    if total is None:
+        return None
+    per_day = next((l for l in lines if _BUDGET_PER_DAY.match(l)), None)
+    currency = next((l for l in lines if _BUDGET_CURRENCY.match(l)), None)
+    # Totals are parsed separately so they don't end up inside the preceding block
+    found = _parse("\n".join(l for l in lines if l not in (total, per_day, currency)), _BUDGET_HEADER)
+    defaults = _parse("\n".join(l for l in template if not _BUDGET_TOTAL.match(l)
+                                 and not _BUDGET_PER_DAY.match(l)), _BUDGET_HEADER)
+    missing = [name for name in BUDGET_BLOCKS if not found.get(name.upper(), {}).get("lines")]
+    if len(missing) > 2:
+        return None
+
+    currency_line = template[0]
+    if currency:
+        value = currency.replace("**", "").split(":", 1)[1].strip()
+        if value:
+            currency_line = f"💱 Currency: {value}"
+
+    blocks = []
+    for name in BUDGET_BLOCKS:
+        section = found.get(name.upper()) if name not in missing else None
+        source = section or defaults[name.upper()]
+        note = source["note"] or defaults[name.upper()]["note"]
+        header = f"**{name}**" + (f" {note}" if note else "") + (":" if name == "Money Tips" else "")
+        bullets = "\n".join(f"• {l}" for l in source["lines"])
+        blocks.append((name, f"{header}\n{bullets}"))
+
+    if per_day is None:
+        per_day = next(l for l in template if _BUDGET_PER_DAY.match(l))
+    totals = f"{_emphasize(total)}\n{_emphasize(per_day)}"
+
+    parts = [currency_line] + [block for name, block in blocks if name != "Money Tips"]
+    parts += [totals, blocks[-1][1]]
+    return "\n\n".join(parts)
@@ -0,0 +1,28 @@
+"""Build the memory-mapped city index in data/city_index/ from geonamescache.
+
+The app builds it on first use when it is missing; run this at deploy time
+instead so the first visitor doesn't wait for it.
+
+Usage: python scripts/build_city_index.py [--min-population 1000]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from city_index import INDEX_DIR, MIN_POPULATION, build_index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-population", type=int, default=MIN_POPULATION,
+                        help="Smallest city to include: 500, 1000, 5000 or 15000 (default %(default)s)")
+    args = parser.parse_args()
+    count = build_index(min_population=args.min_population)
+    print(f"Wrote {count} cities to {INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Build the memory-mapped climate normals arrays from data/climate_normals.csv.
+
+Usage: python scripts/build_climate_normals.py
+"""
+import csv
+import json
+import os
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, "data", "climate_normals.csv")
+OUTPUT = os.path.join(ROOT, "data", "climate_normals")
+
+
+def main():
+    with open(SOURCE, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    def monthly(prefix):
+        return np.array([[float(row[f"{prefix}_{m:02d}"]) for m in range(1, 13)] for row in rows],
+                        dtype=np.float32)
+
+    os.makedirs(OUTPUT, exist_ok=True)
+    np.save(os.path.join(OUTPUT, "coords.npy"),
+            np.array([[float(row["lat"]), float(row["lon"])] for row in rows], dtype=np.float32))
+    np.save(os.path.join(OUTPUT, "temp_min.npy"), monthly("tmin"))
+    np.save(os.path.join(OUTPUT, "temp_max.npy"), monthly("tmax"))
+    np.save(os.path.join(OUTPUT, "precip.npy"), monthly("prcp"))
+    with open(os.path.join(OUTPUT, "cities.json"), "w", encoding="utf-8") as f:
+        json.dump([{"name": row["name"], "country": row["country"]} for row in rows], f, indent=0)
+    print(f"Wrote normals for {len(rows)} cities to {OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Build the downscaled background and logo variants served from static/.
+
+The app shows the background as a 400px tile and the logo at up to 240px, so
+the ~1 MB source PNGs are scaled to twice that (for high-DPI screens) and
+written as AVIF, WebP and a 256-colour PNG fallback.
+
+Usage: python scripts/build_static_assets.py
+"""
+import os
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT = os.path.join(ROOT, "static")
+
+# Source image -> width of the built variants in pixels
+ASSETS = {
+    "background.png": 800,
+    "logo.png": 480,
+}
+AVIF_QUALITY = 60
+WEBP_QUALITY = 80
+PNG_COLORS = 256
+
+
+def build(name: str, width: int) -> list:
+    source = os.path.join(ROOT, name)
+    stem = os.path.splitext(name)[0]
+    with Image.open(source) as image:
+        image.load()
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    paths = {ext: os.path.join(OUTPUT, f"{stem}.{ext}") for ext in ("avif", "webp", "png")}
+    image.save(paths["avif"], quality=AVIF_QUALITY)
+    image.save(paths["webp"], quality=WEBP_QUALITY, method=6)
+    image.quantize(PNG_COLORS, method=Image.FASTOCTREE).save(paths["png"], optimize=True)
+    return [(path, os.path.getsize(path)) for path in paths.values()]
+
+
+def main():
+    os.makedirs(OUTPUT, exist_ok=True)
+    for name, width in ASSETS.items():
+        if not os.path.exists(os.path.join(ROOT, name)):
+            print(f"Skipping {name}: not found")
+            continue
+        for path, size in build(name, width):
+            print(f"Wrote {os.path.relpath(path, ROOT)} ({size / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Refresh the bundled USD exchange-rate snapshot in data/fx_rates.json.
+
+Usage: python scripts/refresh_fx_rates.py [--url URL]
+
+Only currencies used by a geonamescache country are kept. Rates missing from
+the feed keep their previous value.
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import geonamescache
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT = os.path.join(ROOT, "data", "fx_rates.json")
+DEFAULT_URL = "https://open.er-api.com/v6/latest/USD"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=DEFAULT_URL, help="USD-based JSON rates feed with a 'rates' object")
+    args = parser.parse_args()
+
+    response = requests.get(args.url, timeout=30)
+    response.raise_for_status()
+    feed = response.json()["rates"]
+
+    codes = {c["currencycode"] for c in geonamescache.GeonamesCache().get_countries().values()
+             if c["currencycode"]}
+    previous = {}
+    if os.path.exists(OUTPUT):
+        with open(OUTPUT, encoding="utf-8") as f:
+            previous = json.load(f)["rates"]
+
+    rates = {code: feed.get(code, previous.get(code)) for code in sorted(codes)}
+    missing = sorted(code for code, rate in rates.items() if rate is None)
+    snapshot = {
+        "base": "USD",
+        "as_of": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        "source": args.url,
+        "rates": {code: rate for code, rate in rates.items() if rate is not None},
+    }
+    with open(OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=1)
+    print(f"Wrote {len(snapshot['rates'])} rates to {OUTPUT}")
+    if missing:
+        print(f"No rate for: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""In-process request coalescing ("single flight").
+
+Concurrent calls with the same key wait on the one call already in flight and
+all receive its result or its exception. Text the call streams is fanned out
+to every waiter, and callers that join late are first caught up on the chunks
+they missed.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+
+from deadline import DeadlineExceeded, remaining
+from llm_cache import normalized_params
+from telemetry import METRICS
+
+METRICS.describe("tripmate_singleflight_calls_total", "counter",
+                 "Coalesced calls by flight and role (leaders ran the call, followers reused it)")
+
+
+class _Waiter:
+    __slots__ = ("on_delta", "error")
+
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+        self.error = None
+
+    def deliver(self, delta: str):
+        try:
+            self.on_delta(delta)
+        except Exception as e:
+            # The caller gave up (e.g. a cancelled prefetch); it stops waiting with this error
+            self.error = e
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "chunks", "waiters", "passive", "cond")
+
+    def __init__(self, lock):
+        self.done = False
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.waiters = []
+        # Callers that wait for the result without streaming, the leader included
+        self.passive = 0
+        self.cond = threading.Condition(lock)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls by key; name labels the metrics."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, on_delta=None, label: str = None, timeout: float = None):
+        """Return fn(emit) to every concurrent caller with this key, running it only once.
+
+        emit is the streaming callback to hand on to the real call, so callers
+        that stream see the text even when a non-streaming caller started it.
+        on_delta is this caller's own callback; if it raises, this caller stops
+        waiting with that exception, and the shared call is only aborted once
+        every caller has given up. A caller that joins a call already in flight
+        waits at most timeout seconds for it before raising TimeoutError.
+        """
+        waiter = _Waiter(on_delta) if on_delta is not None else None
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(self._lock)
+            elif waiter is not None:
+                for chunk in call.chunks:
+                    waiter.deliver(chunk)
+                    if waiter.error is not None:
+                        break
+            if waiter is None:
+                call.passive += 1
+            elif waiter.error is None:
+                call.waiters.append(waiter)
+        METRICS.inc("tripmate_singleflight_calls_total", flight=label or self.name,
+                    role="leader" if leader else "follower")
+
+        if leader:
+            self._run(key, call, fn)
+        else:
+            expires = None if timeout is None else time.monotonic() + timeout
+            with call.cond:
+                while not call.done and (waiter is None or waiter.error is None):
+                    left = None if expires is None else expires - time.monotonic()
+                    if left is not None and left <= 0:
+                        # Stop waiting; the call carries on for everyone else
+                        if waiter is None:
+                            call.passive -= 1
+                        else:
+                            call.waiters.remove(waiter)
+                        raise TimeoutError(f"Timed out waiting for in-flight call {label or self.name}")
+                    call.cond.wait(left)
+
+        if waiter is not None and waiter.error is not None:
+            raise waiter.error
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, key, call: _Call, fn):
+        def emit(delta):
+            with call.cond:
+                call.chunks.append(delta)
+                for waiter in call.waiters:
+                    waiter.deliver(delta)
+                dropped = [waiter for waiter in call.waiters if waiter.error is not None]
+                if dropped:
+                    call.waiters = [waiter for waiter in call.waiters if waiter.error is None]
+                    call.cond.notify_all()
+                    if not call.waiters and not call.passive:
+                        # Nobody wants the result any more, so stop paying for the stream;
+                        # callers arriving from now on start a fresh call
+                        self._forget(key, call)
+                        raise dropped[0].error
+
+        try:
+            call.result = fn(emit)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with call.cond:
+                call.done = True
+                self._forget(key, call)
+                call.cond.notify_all()
+
+    def _forget(self, key, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+def coalesced(fn):
+    """Share one in-flight call of a TripMateAgent section method between identical concurrent calls.
+
+    Calls are keyed on the method and its normalized arguments and coalesced
+    through ``self.flights`` (no coalescing when that is None). A caller waits
+    for a shared call no longer than its own deadline, and starts over if the
+    shared call ran out of time before it did.
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, on_delta=None, **kwargs):
+        flights = getattr(self, "flights", None)
+        if flights is None:
+            return fn(self, *args, on_delta=on_delta, **kwargs)
+        params = normalized_params(signature, self, *args, **kwargs)
+        key = (fn.__name__, json.dumps(params, sort_keys=True, default=str))
+        while True:
+            try:
+                return flights.do(key, lambda emit: fn(self, *args, on_delta=emit, **kwargs), on_delta,
+                                  label=fn.__name__, timeout=remaining())
+            except DeadlineExceeded:
+                left = remaining()
+                if left is not None and left <= 0:
+                    raise
+
+    return wrapper
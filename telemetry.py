@@ -0,0 +1,255 @@
+"""In-process metrics for DeepSeek and OpenWeather calls.
+
+Counters, gauges and histograms live in one process-wide registry (METRICS) that
+renders the Prometheus text format. Section methods are labelled with the
+traced_section decorator so every model call they make is attributed to them.
+"""
+import contextvars
+import functools
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Serve METRICS on http://0.0.0.0:<port>/metrics when set
+METRICS_PORT = int(os.getenv("TRIPMATE_METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+# Recent observations kept per histogram series for percentiles
+SAMPLE_WINDOW = 2048
+
+# deepseek-chat list prices, USD per million tokens
+PRICE_INPUT_CACHE_HIT = 0.07
+PRICE_INPUT_CACHE_MISS = 0.27
+PRICE_OUTPUT = 1.10
+
+_section = contextvars.ContextVar("tripmate_section", default="other")
+
+
+def current_section() -> str:
+    return _section.get()
+
+
+def traced_section(name: str):
+    """Attribute the model calls made inside the decorated method to section name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _section.set(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _section.reset(token)
+        return wrapper
+    return decorate
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "samples")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, value: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.samples.append(value)
+
+
+class MetricsRegistry:
+    """Thread-safe labelled counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def gauge(self, name: str, default: float = 0, **labels) -> float:
+        with self._lock:
+            return self._gauges.get((name, tuple(sorted(labels.items()))), default)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def counter_totals(self, name: str, by: str, **match) -> dict:
+        """Sum a counter's series grouped by one label, keeping only series whose labels match."""
+        totals = {}
+        with self._lock:
+            for (metric, labels), value in self._counters.items():
+                if metric == name and match.items() <= dict(labels).items():
+                    group = dict(labels).get(by, "")
+                    totals[group] = totals.get(group, 0) + value
+        return totals
+
+    def percentiles(self, name: str, by: str, quantiles=(50, 95), **match) -> dict:
+        """{label value: {"count", "p50", "p95", ...}} over recent observations of a histogram.
+
+        Only series whose labels include match are counted.
+        """
+        grouped = {}
+        with self._lock:
+            for (metric, labels), histogram in self._histograms.items():
+                if metric == name and match.items() <= dict(labels).items():
+                    grouped.setdefault(dict(labels).get(by, ""), []).extend(histogram.samples)
+        summary = {}
+        for group, samples in grouped.items():
+            values = np.percentile(np.array(samples), quantiles)
+            summary[group] = {"count": len(samples)}
+            summary[group].update({f"p{q}": float(v) for q, v in zip(quantiles, values)})
+        return summary
+
+    def to_prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in histograms]
+
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                help_text = self._meta.get(name, (kind, name))[1]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), counts, total, count in histograms:
+            header(name, "histogram")
+            for bound, bucket in zip(LATENCY_BUCKETS, counts):
+                lines.append(f"{name}_bucket{fmt(labels, [('le', f'{bound:g}')])} {bucket}")
+            lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{fmt(labels)} {total:g}")
+            lines.append(f"{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("tripmate_llm_request_seconds", "histogram", "DeepSeek completion latency by outcome (ok, error)")
+METRICS.describe("tripmate_llm_first_token_seconds", "histogram", "Time to the first streamed token")
+METRICS.describe("tripmate_llm_requests_total", "counter", "DeepSeek completions by finish reason")
+METRICS.describe("tripmate_llm_errors_total", "counter", "DeepSeek completions that raised")
+METRICS.describe("tripmate_llm_tokens_total", "counter", "DeepSeek tokens by type")
+METRICS.describe("tripmate_llm_cost_usd_total", "counter", "Estimated DeepSeek spend in USD")
+METRICS.describe("tripmate_repairs_total", "counter", "Format repairs by kind (local, model, fallback)")
+METRICS.describe("tripmate_weather_request_seconds", "histogram", "OpenWeather forecast latency")
+METRICS.describe("tripmate_weather_requests_total", "counter", "OpenWeather forecast requests by outcome")
+
+
+def record_llm_call(seconds: float, usage, finish_reason: str, repair: bool = False,
+                    first_token: float = None):
+    """Record one finished DeepSeek completion."""
+    labels = {"section": current_section(), "repair": "true" if repair else "false"}
+    METRICS.observe("tripmate_llm_request_seconds", seconds, outcome="ok", **labels)
+    METRICS.inc("tripmate_llm_requests_total", finish_reason=finish_reason or "unknown", **labels)
+    if first_token is not None:
+        METRICS.observe("tripmate_llm_first_token_seconds", first_token, section=labels["section"])
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    # DeepSeek reports context-cache hits alongside the standard usage fields
+    cache_hit = getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+    METRICS.inc("tripmate_llm_tokens_total", prompt, type="prompt", **labels)
+    METRICS.inc("tripmate_llm_tokens_total", completion, type="completion", **labels)
+    METRICS.inc("tripmate_llm_tokens_total", cache_hit, type="prompt_cache_hit", **labels)
+    cost = ((prompt - cache_hit) * PRICE_INPUT_CACHE_MISS + cache_hit * PRICE_INPUT_CACHE_HIT
+            + completion * PRICE_OUTPUT) / 1_000_000
+    METRICS.inc("tripmate_llm_cost_usd_total", cost, **labels)
+
+
+def record_llm_error(seconds: float, error: Exception, repair: bool = False):
+    labels = {"section": current_section(), "repair": "true" if repair else "false"}
+    # Failures often end early (or at a timeout), so they are kept apart from successful latency
+    METRICS.observe("tripmate_llm_request_seconds", seconds, outcome="error", **labels)
+    METRICS.inc("tripmate_llm_errors_total", error=type(error).__name__, **labels)
+
+
+def record_repair(kind: str):
+    METRICS.inc("tripmate_repairs_total", section=current_section(), kind=kind)
+
+
+def record_weather_call(seconds: float, outcome: str):
+    METRICS.observe("tripmate_weather_request_seconds", seconds, outcome=outcome)
+    METRICS.inc("tripmate_weather_requests_total", outcome=outcome)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics on a daemon thread (once per process); no-op when port is 0."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="tripmate-metrics", daemon=True).start()
+    return _server
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+import api
+
+TRIP = {"destination": "Lisbon", "start_date": "2026-05-02", "end_date": "2026-05-04", "interests": ["Food"]}
+
+
+class FakeAgent:
+    """Answers every section at once; culture falls back as if it had timed out."""
+
+    def plan_tasks(self, destination, start_date, end_date, sections=None, **kwargs):
+        return {key: destination for key in sections}
+
+    def run_sections(self, tasks, stream=False):
+        for key, destination in tasks.items():
+            if key == "budget":
+                text = f"🏨 ACCOMMODATION\n• Hotel in {destination}: $100/night\nTOTAL: $300"
+                result = {"budget_text": text, "num_days": 3, "num_travelers": 1}
+            else:
+                text = result = f"**{key.title()}**\n• Tip for {destination}"
+            if stream:
+                yield "delta", key, text
+            if key == "culture":
+                yield "degraded", key, "timeout"
+            yield "done", key, result
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "get_shared_agent", FakeAgent)
+    with TestClient(api.app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def sse_events(response):
+    events = []
+    for chunk in response.text.strip().split("\n\n"):
+        event, data = chunk.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_plan_returns_every_section_as_json(client):
+    response = client.post("/plan", json={**TRIP, "sections": ["budget", "culture", "packing"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["sections"]) == ["budget", "culture", "packing"]
+    budget = body["sections"]["budget"]
+    assert budget["num_days"] == 3 and budget["currency"] == "EUR"
+    assert budget["degraded"] is None
+    assert body["sections"]["culture"]["degraded"] == "timeout"
+
+
+def test_sections_carry_parsed_blocks(client):
+    section = client.post("/sections/packing", json=TRIP).json()["sections"]["packing"]
+    assert section["markdown"] == "**Packing**\n• Tip for Lisbon"
+    assert section["blocks"] == [
+        {"kind": "heading", "spans": [{"text": "Packing", "bold": True}]},
+        {"kind": "bullet", "spans": [{"text": "Tip for Lisbon", "bold": False}]},
+    ]
+
+
+def test_unknown_section_is_not_found(client):
+    assert client.post("/sections/nightlife", json=TRIP).status_code == 404
+
+
+@pytest.mark.parametrize("body", [
+    {**TRIP, "destination": 42},
+    {**TRIP, "destination": None},
+    {key: value for key, value in TRIP.items() if key != "destination"},
+    {**TRIP, "interests": [1, 2]},
+    {**TRIP, "start_date": "next week"},
+    {**TRIP, "end_date": "2026-05-01"},
+    {**TRIP, "sections": ["nightlife"]},
+    ["not", "an", "object"],
+])
+def test_bad_trip_is_a_bad_request(client, body):
+    response = client.post("/plan", json=body)
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+def test_stream_sends_deltas_sections_and_done(client):
+    response = client.post("/plan?stream=1", json={**TRIP, "sections": ["budget", "culture"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response)
+    assert [event for event, _ in events] == ["delta", "section", "delta", "section", "done"]
+    assert events[0][1]["section"] == "budget"
+    assert events[1][1]["section"] == "budget" and events[1][1]["blocks"]
+    assert events[3][1]["degraded"] == "timeout"
+    assert "seconds" in events[4][1]
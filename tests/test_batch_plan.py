@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import batch_plan
+from batch_plan import completed_ids
+
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def test_missing_output_has_nothing_done(tmp_path):
+    assert completed_ids(str(tmp_path / "plans.jsonl")) == set()
+
+
+def test_only_clean_successes_count_as_done(tmp_path):
+    output = tmp_path / "plans.jsonl"
+    write_lines(output, [
+        json.dumps({"id": "ok", "status": "ok"}),
+        json.dumps({"id": "failed", "status": "error", "error": "boom"}),
+        json.dumps({"id": "degraded", "status": "ok", "degraded": {"budget": "deadline"}}),
+        # A crash mid-write leaves a truncated last line
+        '{"id": "truncated", "sta',
+    ])
+    assert completed_ids(str(output)) == {"ok"}
+
+
+@pytest.fixture
+def planned(monkeypatch):
+    """Run batch_plan.main with a stand-in planner; returns the ids it planned."""
+    ids = []
+
+    def plan_trip(agent, trip, batched=False, deadline=0):
+        ids.append(trip["id"])
+        return {"budget": f"budget for {trip['destination']}"}, {}
+
+    monkeypatch.setattr(batch_plan, "get_shared_agent", lambda: None)
+    monkeypatch.setattr(batch_plan, "plan_trip", plan_trip)
+    return ids
+
+
+def run_batch(monkeypatch, trips, output):
+    monkeypatch.setattr("sys.argv", ["batch_plan.py", str(trips), "--output", str(output)])
+    batch_plan.main()
+
+
+def test_rerun_skips_completed_trips(tmp_path, monkeypatch, planned):
+    trips = tmp_path / "trips.jsonl"
+    write_lines(trips, [json.dumps({"id": trip_id, "destination": destination,
+                                    "start_date": "2026-05-01", "end_date": "2026-05-03"})
+                        for trip_id, destination in [("a", "Lisbon"), ("b", "Porto"), ("c", "Faro")]])
+    output = tmp_path / "plans.jsonl"
+    write_lines(output, [
+        json.dumps({"id": "a", "status": "ok"}),
+        json.dumps({"id": "b", "status": "error", "error": "boom"}),
+    ])
+
+    run_batch(monkeypatch, trips, output)
+    assert sorted(planned) == ["b", "c"]
+    assert completed_ids(str(output)) == {"a", "b", "c"}
+
+    planned.clear()
+    run_batch(monkeypatch, trips, output)
+    assert planned == []
@@ -0,0 +1,60 @@
+import pytest
+
+from city_index import CityIndex, build_index, fold
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("city_index"))
+    build_index(directory, min_population=15000)
+    return CityIndex(directory)
+
+
+def labels(index, query, k=3):
+    return [city["label"] for city in index.search(query, k)]
+
+
+def test_fold_strips_case_accents_and_extra_spaces():
+    assert fold("  São   Paulo ") == "sao paulo"
+    assert fold("ZÜRICH") == fold("Zürich") == "zurich"
+    assert fold("Reykjavík") == "reykjavik"
+
+
+@pytest.mark.parametrize("query, label", [
+    ("sao pau", "São Paulo, Brazil"),
+    ("São Paulo", "São Paulo, Brazil"),
+    ("ZURICH", "Zürich, Switzerland"),
+    ("malmo", "Malmö, Sweden"),
+    ("bogotá", "Bogotá, Colombia"),
+])
+def test_prefix_search_ignores_accents(index, query, label):
+    assert index.prefix(fold(query), 3)
+    assert labels(index, query)[0] == label
+
+
+def test_prefix_matches_come_most_populous_first(index):
+    populations = [city["population"] for city in index.search("san", 10)]
+    assert len(populations) == 10
+    assert populations == sorted(populations, reverse=True)
+
+
+@pytest.mark.parametrize("query, label", [
+    ("tokio", "Tokyo, Japan"),
+    ("bogata", "Bogotá, Colombia"),
+    ("krakov", "Kraków, Poland"),
+    ("reikjavik", "Reykjavík, Iceland"),
+])
+def test_trigram_search_finds_close_spellings_of_accented_names(index, query, label):
+    # No city name starts with these, so the matches come from the trigram index
+    assert index.prefix(fold(query), 3) == []
+    assert labels(index, query)[0] == label
+
+
+def test_country_after_the_comma_filters_matches(index):
+    assert labels(index, "paris, united") == ["Paris, United States"]
+    assert labels(index, "cordoba, spa") == ["Córdoba, Spain"]
+
+
+def test_nothing_close_gives_no_matches(index):
+    assert labels(index, "xqzv") == []
+    assert labels(index, " , France") == []
@@ -0,0 +1,41 @@
+import pytest
+
+from climate import load_normals
+from geo import resolve_city, resolve_country
+
+normals = load_normals()
+pytestmark = pytest.mark.skipif(normals is None, reason="climate normals not built")
+
+
+def located(destination):
+    i = normals.locate(destination)
+    return None if i is None else normals.cities[i]
+
+
+def test_city_with_its_own_normals():
+    assert located("Paris") == {"name": "Paris", "country": "FR"}
+    assert located("Paris, France") == {"name": "Paris", "country": "FR"}
+
+
+def test_country_must_match_a_same_named_city():
+    # Paris, Texas has no city with normals nearby: no data rather than Paris, France
+    assert located("Paris, United States") is None
+    assert located("London, United Kingdom") == {"name": "London", "country": "GB"}
+    assert located("London, Canada")["country"] == "CA"
+
+
+def test_unknown_country_part_gives_no_data():
+    assert located("London, Ontario") is None
+
+
+def test_nearby_city_note():
+    assert "(normals for nearby Paris)" in normals.seasonal_hint("Versailles, France", 7)
+    assert "nearby" not in normals.seasonal_hint("Paris, France", 7)
+
+
+def test_geo_lookups_respect_the_named_country():
+    assert resolve_city("Paris")["countrycode"] == "FR"
+    assert resolve_city("Paris, United States")["countrycode"] == "US"
+    assert resolve_city("London, Ontario") is None
+    assert resolve_country("Paris, United States")["iso"] == "US"
+    assert resolve_country("Kyoto")["iso"] == "JP"
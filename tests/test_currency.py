@@ -0,0 +1,56 @@
+from currency import Currency, LOCAL_TOTALS_PREFIX, currency_for, localize_budget
+
+EUR = Currency("EUR", "Euro", "France", 0.9, "2025-01-02")
+
+BUDGET = """💱 Currency: [Local Currency] ([CODE]) | 1 USD = X [CODE]
+
+🏨 ACCOMMODATION
+• Hotel: $100-200/night
+
+TOTAL: $1,000 - $2,000
+Per person/day: $100"""
+
+
+def test_named_country_resolves_offline():
+    assert currency_for("Paris, France").code == "EUR"
+    assert currency_for("Paris, United States").code == "USD"
+    assert currency_for("Bali, Indonesia").code == "IDR"
+
+
+def test_clear_bare_city_resolves_offline():
+    assert currency_for("Kyoto").code == "JPY"
+    assert currency_for("Singapore").code == "SGD"
+
+
+def test_ambiguous_bare_name_is_left_to_the_model():
+    # The only geonames "Bali" is a town in Cameroon; "Springfield" is one of many
+    assert currency_for("Bali") is None
+    assert currency_for("Tuscany") is None
+    assert currency_for("Springfield") is None
+
+
+def test_unknown_destination_has_no_currency():
+    assert currency_for("Atlantis") is None
+    assert currency_for("London, Ontario") is None
+
+
+def test_localize_budget_replaces_the_currency_line():
+    lines = localize_budget(BUDGET, EUR).splitlines()
+    assert lines[0] == "💱 Currency: Euro (EUR) | 1 USD = 0.9 EUR (rate as of 2025-01-02)"
+    assert sum(line.startswith("💱") for line in lines) == 1
+
+
+def test_localize_budget_adds_local_totals_after_per_day():
+    lines = localize_budget(BUDGET, EUR).splitlines()
+    i = lines.index("Per person/day: $100")
+    assert lines[i + 1] == f"{LOCAL_TOTALS_PREFIX}EUR: 900 – 1,800 total · 90 per person/day"
+
+
+def test_localize_budget_is_idempotent():
+    once = localize_budget(BUDGET, EUR)
+    assert localize_budget(once, EUR) == once
+
+
+def test_usd_budget_gets_no_local_totals():
+    usd = Currency("USD", "Dollar", "United States", 1.0, "2025-01-02")
+    assert LOCAL_TOTALS_PREFIX not in localize_budget(BUDGET, usd)
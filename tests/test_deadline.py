@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from deadline import DeadlineExceeded, check, deadline, remaining, section_deadline
+
+
+def test_no_deadline_by_default():
+    assert remaining() is None
+    check()
+
+
+def test_remaining_counts_down_inside_the_block():
+    with deadline(time.monotonic() + 10):
+        assert 9 < remaining() <= 10
+    assert remaining() is None
+
+
+def test_outer_earlier_deadline_still_applies():
+    with deadline(time.monotonic() + 1):
+        with deadline(time.monotonic() + 10):
+            assert remaining() <= 1
+        with deadline(None):
+            assert remaining() <= 1
+
+
+def test_check_raises_once_the_deadline_passed():
+    with deadline(time.monotonic() - 0.1):
+        with pytest.raises(DeadlineExceeded):
+            check()
+
+
+def test_sections_get_their_share_of_the_plan_deadline():
+    assert section_deadline("budget", 100.0, 45) == 145.0
+    assert section_deadline("currency", 100.0, 40) == 120.0
+    assert section_deadline("budget", 100.0, 0) is None
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from hedge import HEDGE_MIN_SAMPLES, HedgeCancelled, Hedger
+from telemetry import METRICS, record_llm_call, record_llm_error, traced_section
+
+
+class FakeConcurrency:
+    def release(self, outcome, *args):
+        pass
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.concurrency = FakeConcurrency()
+
+    def try_admit(self, estimated_tokens):
+        return True
+
+
+def hedger(delay):
+    hedger = Hedger(FakeLimiter(), max_extra=1.0)
+    hedger.delay = lambda section, first_token: delay
+    hedger._budget = 5.0
+    return hedger
+
+
+def test_streaming_call_is_not_hedged_once_its_first_token_arrived():
+    requests = []
+    seen = []
+
+    def send(deltas, stop):
+        requests.append(1)
+        deltas("first")
+        # Slower than the hedge delay overall, but streaming well before it
+        time.sleep(0.2)
+        deltas(" second")
+        return "first second"
+
+    assert hedger(0.05).run(send, seen.append) == "first second"
+    assert len(requests) == 1
+    assert seen == ["first", " second"]
+
+
+def test_slow_streaming_call_is_hedged_and_the_first_to_stream_wins():
+    lock = threading.Lock()
+    requests = []
+    seen = []
+
+    def send(deltas, stop):
+        with lock:
+            requests.append(1)
+            i = len(requests)
+        if i == 1:
+            stop.wait(2)
+            if stop.is_set():
+                raise HedgeCancelled()
+        deltas(f"request {i}")
+        return f"request {i}"
+
+    assert hedger(0.05).run(send, seen.append) == "request 2"
+    assert len(requests) == 2
+    assert seen == ["request 2"]
+
+
+def test_fast_call_is_not_hedged():
+    requests = []
+
+    def send(deltas, stop):
+        requests.append(1)
+        return "done"
+
+    assert hedger(0.2).run(send) == "done"
+    assert len(requests) == 1
+
+
+def test_no_history_means_no_hedge():
+    requests = []
+
+    def send(deltas, stop):
+        requests.append(stop)
+        return "done"
+
+    assert hedger(None).run(send) == "done"
+    assert requests == [None]
+
+
+def test_failed_calls_do_not_shape_the_hedge_delay():
+    @traced_section("hedge_test")
+    def record():
+        for _ in range(HEDGE_MIN_SAMPLES):
+            record_llm_call(1.0, None, "stop")
+            record_llm_error(30.0, TimeoutError())
+
+    METRICS.clear()
+    record()
+    try:
+        assert Hedger(FakeLimiter(), percentile=95).delay("hedge_test", first_token=False) == 1.0
+        latency = METRICS.percentiles("tripmate_llm_request_seconds", by="outcome", section="hedge_test")
+        assert latency["error"]["p50"] == 30.0
+    finally:
+        METRICS.clear()
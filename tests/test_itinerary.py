@@ -0,0 +1,82 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent import ITINERARY_CHUNK_DAYS, ITINERARY_SINGLE_CALL_DAYS, TripMateAgent, _day_ranges
+
+
+class ScriptedAgent(TripMateAgent):
+    """Answers the itinerary prompts locally: outlines list the days, chunks name theirs."""
+
+    def __init__(self):
+        self.cache = None
+        self.flights = None
+        self.itinerary_pool = ThreadPoolExecutor(max_workers=4)
+        self.prompts = []
+
+    def _itinerary_prompt(self, destination, start_date, end_date, interests):
+        return "SINGLE"
+
+    def _itinerary_outline_prompt(self, destination, num_days, interests):
+        return f"OUTLINE {num_days}"
+
+    def _itinerary_chunk_prompt(self, destination, first_day, last_day, num_days, interests, outline):
+        return f"CHUNK {first_day} {last_day}"
+
+    def _complete(self, prompt, temperature, max_tokens, on_delta=None, **kwargs):
+        self.prompts.append(prompt)
+        if prompt.startswith("OUTLINE"):
+            lines = [f"Day {day}: theme\n" for day in range(1, int(prompt.split()[1]) + 1)]
+        elif prompt.startswith("CHUNK"):
+            first, last = map(int, prompt.split()[1:])
+            lines = [f"Day {day} plan\n" for day in range(first, last + 1)]
+        else:
+            lines = ["whole trip\n"]
+        for line in lines:
+            if on_delta:
+                on_delta(line)
+        return "".join(lines)
+
+
+def covered(ranges):
+    return [day for first, last in ranges for day in range(first, last + 1)]
+
+
+@pytest.mark.parametrize("num_days", [1, 2, 3, 4, 7, 10, 11, 14, 30])
+def test_day_ranges_cover_every_day_once_in_balanced_chunks(num_days):
+    ranges = _day_ranges(num_days, 3)
+    assert covered(ranges) == list(range(1, num_days + 1))
+    sizes = [last - first + 1 for first, last in ranges]
+    assert max(sizes) <= 3
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_day_ranges_examples():
+    assert _day_ranges(1, 3) == [(1, 1)]
+    assert _day_ranges(11, 3) == [(1, 3), (4, 6), (7, 9), (10, 11)]
+    assert _day_ranges(14, 4) == [(1, 4), (5, 8), (9, 11), (12, 14)]
+
+
+@pytest.mark.parametrize("end_date", ["2026-05-01", "2026-05-07"])
+def test_short_trips_are_written_in_one_call(end_date):
+    agent = ScriptedAgent()
+    assert agent.generate_itinerary("Lisbon", "2026-05-01", end_date) == "whole trip\n"
+    assert agent.prompts == ["SINGLE"]
+
+
+def test_long_trip_is_written_in_chunks_that_stream_in_day_order():
+    agent = ScriptedAgent()
+    num_days = 16
+    assert num_days > ITINERARY_SINGLE_CALL_DAYS
+    deltas = []
+    text = agent.generate_itinerary("Lisbon", "2026-05-01", "2026-05-16", on_delta=deltas.append)
+
+    chunks = [p for p in agent.prompts if p.startswith("CHUNK")]
+    assert agent.prompts[0] == "OUTLINE 16"
+    assert len(chunks) == len(_day_ranges(num_days, ITINERARY_CHUNK_DAYS))
+    days = [int(day) for day in re.findall(r"Day (\d+) plan", text)]
+    assert days == list(range(1, num_days + 1))
+    # What streamed is what was returned, chunks included in order
+    streamed = "".join(deltas)
+    assert [int(day) for day in re.findall(r"Day (\d+) plan", streamed)] == days
@@ -0,0 +1,83 @@
+import pytest
+
+from llm_cache import ResponseCache, bypass_cache, cached_section, skip_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+
+
+class Agent:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    def _prompt(self, city):
+        return f"Tips for {city}"
+
+    @cached_section("_prompt")
+    def tips(self, city: str, on_delta=None) -> str:
+        self.calls += 1
+        return f"tips {self.calls}"
+
+    @cached_section("_prompt")
+    def placeholder(self, city: str, on_delta=None) -> str:
+        self.calls += 1
+        skip_cache()
+        return "placeholder"
+
+
+def test_entries_expire_after_their_ttl(cache):
+    cache.set("fresh", "tips", "a", ttl=60)
+    cache.set("expired", "tips", "b", ttl=-1)
+    assert cache.get("fresh") == "a"
+    assert cache.get("expired") is None
+    assert cache.get("expired", stale=True) == "b"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for key in "abc":
+        cache.set(key, "tips", key, ttl=60)
+    cache.get("a")
+    cache.set("d", "tips", "d", ttl=60)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert cache.evictions == 1
+
+
+def test_section_answers_are_reused_for_normalized_arguments(cache):
+    agent = Agent(cache)
+    assert agent.tips("Paris") == "tips 1"
+    assert agent.tips("  paris ") == "tips 1"
+    assert agent.tips("Rome") == "tips 2"
+
+
+def test_cached_answer_is_replayed_to_on_delta(cache):
+    agent = Agent(cache)
+    agent.tips("Paris")
+    seen = []
+    assert agent.tips("Paris", on_delta=seen.append) == "tips 1"
+    assert seen == ["tips 1"]
+
+
+def test_bypass_skips_the_lookup_but_stores_the_fresh_answer(cache):
+    agent = Agent(cache)
+    agent.tips("Paris")
+    with bypass_cache():
+        assert agent.tips("Paris") == "tips 2"
+    assert agent.tips("Paris") == "tips 2"
+
+
+def test_skipped_results_are_not_stored(cache):
+    agent = Agent(cache)
+    agent.placeholder("Paris")
+    agent.placeholder("Paris")
+    assert agent.calls == 2
+
+
+def test_no_cache_means_every_call_runs():
+    agent = Agent(None)
+    agent.tips("Paris")
+    assert agent.tips("Paris") == "tips 2"
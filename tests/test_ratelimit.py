@@ -0,0 +1,96 @@
+import time
+
+import openai
+import pytest
+
+from deadline import DeadlineExceeded, deadline
+from ratelimit import AIMDLimiter, RateLimiter, TokenBucket
+
+
+class Overloaded(openai.APIStatusError):
+    def __init__(self):
+        Exception.__init__(self, "overloaded")
+        self.status_code = 503
+        self.response = None
+
+
+def test_bucket_reservations_wait_once_the_burst_is_spent():
+    bucket = TokenBucket(rate=10, capacity=10)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.05)
+
+
+def test_refund_returns_an_unused_reservation():
+    bucket = TokenBucket(rate=10, capacity=10)
+    bucket.reserve(10)
+    bucket.refund(10)
+    assert bucket.try_take(10)
+
+
+def test_aimd_grows_on_success_and_halves_on_overload():
+    limiter = AIMDLimiter(initial=4, maximum=8)
+    assert limiter.acquire()
+    limiter.release("ok")
+    assert limiter.limit == pytest.approx(4.25)
+    assert limiter.acquire()
+    limiter.release("overload")
+    assert limiter.limit == pytest.approx(2.125)
+    # Further overloads within the cooldown don't halve it again
+    assert limiter.acquire()
+    limiter.release("overload")
+    assert limiter.limit == pytest.approx(2.125)
+
+
+def test_aimd_acquire_times_out_when_full():
+    limiter = AIMDLimiter(initial=1, maximum=1)
+    assert limiter.acquire()
+    assert not limiter.acquire(timeout=0.01)
+    limiter.release("error")
+    assert limiter.acquire(timeout=0.01)
+
+
+def test_run_retries_overloads(monkeypatch):
+    monkeypatch.setattr("ratelimit.BACKOFF_BASE", 0.001)
+    limiter = RateLimiter(rpm=6000, tpm=10 ** 7, max_retries=2)
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Overloaded()
+        return "ok"
+
+    assert limiter.run(attempt, 100) == "ok"
+    assert len(attempts) == 3
+    assert limiter.concurrency.inflight == 0
+
+
+def test_run_does_not_retry_once_text_was_streamed():
+    limiter = RateLimiter(rpm=6000, tpm=10 ** 7)
+
+    def attempt():
+        raise Overloaded()
+
+    with pytest.raises(Overloaded):
+        limiter.run(attempt, 100, can_retry=lambda: False)
+
+
+def test_call_turned_away_by_its_deadline_gives_its_tokens_back():
+    limiter = RateLimiter(rpm=60, tpm=6000)
+    # Another call used up the token burst, so this one would wait about a second
+    limiter.tokens.reserve(limiter.tokens.capacity)
+    requests, tokens = limiter.requests.tokens, limiter.tokens.tokens
+    with deadline(time.monotonic() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            limiter.run(lambda: "never", 100)
+    assert limiter.requests.tokens == pytest.approx(requests, abs=1)
+    assert limiter.tokens.tokens == pytest.approx(tokens, abs=10)
+
+
+def test_expired_deadline_reserves_nothing():
+    limiter = RateLimiter(rpm=60, tpm=6000)
+    requests = limiter.requests.tokens
+    with deadline(time.monotonic() - 1):
+        with pytest.raises(DeadlineExceeded):
+            limiter.run(lambda: "never", 100)
+    assert limiter.requests.tokens == requests
@@ -0,0 +1,53 @@
+import sys
+
+from render import RenderCache, blocks_html, parse_markdown, pdf_sections
+
+
+def test_lines_are_classified():
+    blocks = parse_markdown("**Getting around**\n• Metro: $2 a ride\nDay 1: Arrival\nMorning:\nJust **walk** there")
+    assert blocks == (
+        ("heading", (("Getting around", True),)),
+        ("bullet", (("Metro: $2 a ride", False),)),
+        ("day", (("Day 1: Arrival", False),)),
+        ("label", (("Morning:", False),)),
+        ("paragraph", (("Just ", False), ("walk", True), (" there", False))),
+    )
+
+
+def test_wrapping_html_and_fences_are_reduced_to_markdown():
+    blocks = parse_markdown("```markdown\n<h3>Tips</h3>\n<ul>\n<li>Tip one</li><li>Tip <em>two</em></li>\n</ul>\n```")
+    assert blocks == (
+        ("heading", (("Tips", True),)),
+        ("bullet", (("Tip one", False),)),
+        ("bullet", (("Tip *two*", False),)),
+    )
+
+
+def test_a_stray_angle_bracket_is_kept():
+    assert parse_markdown("Entry < $10 for kids") == (("paragraph", (("Entry < $10 for kids", False),)),)
+
+
+def test_html_is_escaped_and_bullets_grouped():
+    html = blocks_html(parse_markdown("**Food**\n• Bread & jam < 5\n• $5 lunch"))
+    assert html == "<h4>Food</h4>\n<ul>\n<li>Bread &amp; jam &lt; 5</li>\n<li>&#36;5 lunch</li>\n</ul>"
+
+
+def test_empty_text_has_no_blocks():
+    assert parse_markdown("") == ()
+    assert parse_markdown(None) == ()
+
+
+def test_pdf_sections_follow_the_page_order():
+    assert list(pdf_sections({"currency": "c", "budget": "b"})) == ["Budget Estimate", "Currency Information"]
+
+
+def test_render_cache_evicts_least_recently_used_past_its_size():
+    a, b, c = "x" * 100, "y" * 50, "z" * 50
+    cache = RenderCache(max_bytes=sys.getsizeof(a) + sys.getsizeof(b))
+    cache.put("html", "a", a)
+    cache.put("html", "b", b)
+    assert cache.get("html", "a") is not None
+    cache.put("html", "c", c)
+    assert cache.get("html", "b") is None
+    assert cache.get("html", "a") is not None
+    assert cache.get_or_render("html", "d", lambda: "rendered") == "rendered"
@@ -0,0 +1,40 @@
+from repair import budget_fallback, has_placeholders, repair_budget
+
+BUDGET_WITHOUT_OTHER = """💱 Currency: Euro (EUR) | 1 USD = 0.92 EUR
+
+**Accommodation** (3 nights)
+• $100-150/night → Total: $300-450
+
+**Food** (per person/day)
+• Daily: $40-60 → Total (3 days): $120-180
+
+**Transport**
+• Airport transfer: $20-30
+
+**Activities**
+• Entry fees & tours: $100-200
+
+**TOTAL: $1,000 - $1,500** (1 person(s))
+**Per person/day: $300-500**
+
+**Money Tips**:
+• Buy a museum pass"""
+
+
+def test_fallback_budget_has_placeholders():
+    assert has_placeholders(budget_fallback(3, 1))
+
+
+def test_real_figures_are_not_placeholders():
+    assert not has_placeholders(BUDGET_WITHOUT_OTHER)
+    assert not has_placeholders("")
+
+
+def test_block_filled_from_the_template_is_flagged():
+    repaired = repair_budget(BUDGET_WITHOUT_OTHER, 3, 1)
+    assert "**Other**" in repaired
+    assert has_placeholders(repaired)
+
+
+def test_budget_with_too_little_left_is_not_repaired():
+    assert repair_budget("**TOTAL: $1,000**\n• nothing else", 3, 1) is None
@@ -0,0 +1,56 @@
+import pytest
+
+from agent import SECTION_INPUTS, TripMateAgent, section_inputs
+from trips import ALL_SECTIONS
+
+TRIP = dict(destination="Lisbon, Portugal", start_date="2026-05-02", end_date="2026-05-06",
+            travel_style="moderate", num_travelers=2, interests="Food & Dining",
+            dietary_restrictions=["Vegetarian"])
+
+
+def regenerated(**changes):
+    """Sections whose inputs differ once the trip has changes applied."""
+    before = section_inputs(**TRIP)
+    after = section_inputs(**{**TRIP, **changes})
+    return {key for key in before if before[key] != after[key]}
+
+
+def test_every_section_has_inputs():
+    assert list(SECTION_INPUTS) == ALL_SECTIONS
+    planned = object.__new__(TripMateAgent).plan_tasks(
+        TRIP["destination"], TRIP["start_date"], TRIP["end_date"])
+    assert set(planned) == set(SECTION_INPUTS)
+
+
+@pytest.mark.parametrize("changes, sections", [
+    ({"destination": "Porto, Portugal"}, set(ALL_SECTIONS)),
+    ({"travel_style": "luxury"}, {"budget", "packing", "restaurants"}),
+    ({"num_travelers": 3}, {"budget"}),
+    ({"interests": "Museums"}, {"itinerary"}),
+    ({"dietary_restrictions": ["Vegan"]}, {"restaurants"}),
+    # A longer trip changes the day count; the same length a week later only changes the dates
+    ({"end_date": "2026-05-08"}, {"budget", "packing", "itinerary"}),
+    ({"start_date": "2026-05-09", "end_date": "2026-05-13"}, {"packing"}),
+])
+def test_changed_input_regenerates_only_the_sections_that_use_it(changes, sections):
+    assert regenerated(**changes) == sections
+
+
+@pytest.mark.parametrize("changes", [
+    {"destination": "  lisbon,   PORTUGAL "},
+    {"travel_style": "Moderate"},
+    {"dietary_restrictions": ["vegetarian"]},
+    {"interests": "food  &  dining"},
+])
+def test_cosmetic_edits_reuse_every_section(changes):
+    assert regenerated(**changes) == set()
+
+
+def test_dietary_restriction_order_does_not_matter():
+    trip = {**TRIP, "dietary_restrictions": ["Vegetarian", "Gluten-free"]}
+    reordered = {**TRIP, "dietary_restrictions": ["Gluten-free", "Vegetarian"]}
+    assert section_inputs(**trip) == section_inputs(**reordered)
+
+
+def test_sections_limits_the_result():
+    assert list(section_inputs(**TRIP, sections=["budget", "currency"])) == ["budget", "currency"]
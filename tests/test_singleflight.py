@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Cancelled(Exception):
+    pass
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def fn(emit):
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", fn)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flights.do("key", fn)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ["result", "result"]
+    assert len(runs) == 1
+
+
+def test_late_streaming_follower_is_caught_up():
+    flights = SingleFlight("test")
+    first_chunk = threading.Event()
+    release = threading.Event()
+
+    def fn(emit):
+        emit("a")
+        first_chunk.set()
+        release.wait(5)
+        emit("b")
+        return "ab"
+
+    leader = threading.Thread(target=flights.do, args=("key", fn))
+    leader.start()
+    first_chunk.wait(5)
+    seen = []
+    results = []
+    follower = threading.Thread(target=lambda: results.append(flights.do("key", fn, seen.append)))
+    follower.start()
+    while not flights._calls["key"].waiters:
+        pass
+    release.set()
+    follower.join(5)
+    leader.join(5)
+    assert seen == ["a", "b"]
+    assert results == ["ab"]
+
+
+def test_cancelled_follower_does_not_abort_non_streaming_leader():
+    flights = SingleFlight("test")
+    first_chunk = threading.Event()
+    follower_joined = threading.Event()
+    outcome = {}
+
+    def fn(emit):
+        emit("a")
+        first_chunk.set()
+        follower_joined.wait(5)
+        emit("b")
+        emit("c")
+        return "abc"
+
+    def on_delta(delta):
+        # Caught up on "a" when joining, then cancelled while the call streams
+        follower_joined.set()
+        if delta != "a":
+            raise Cancelled()
+
+    def lead():
+        try:
+            outcome["leader"] = flights.do("key", fn)
+        except Exception as e:
+            outcome["leader"] = repr(e)
+
+    def follow():
+        try:
+            outcome["follower"] = flights.do("key", fn, on_delta)
+        except Exception as e:
+            outcome["follower"] = repr(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    first_chunk.wait(5)
+    follower = threading.Thread(target=follow)
+    follower.start()
+    follower.join(5)
+    leader.join(5)
+    assert outcome == {"leader": "abc", "follower": "Cancelled()"}
+
+
+def test_call_is_aborted_once_every_streaming_caller_gave_up():
+    flights = SingleFlight("test")
+    chunks = []
+
+    def fn(emit):
+        for chunk in "abc":
+            chunks.append(chunk)
+            emit(chunk)
+        return "abc"
+
+    def cancel(_delta):
+        raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        flights.do("key", fn, cancel)
+    assert chunks == ["a"]
+    assert not flights._calls
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight("test")
+
+    def fn(emit):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fn)
+    assert not flights._calls
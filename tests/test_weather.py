@@ -0,0 +1,86 @@
+import time
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import weather
+from weather import FAILURE_TTL, Forecast, ForecastCache
+
+
+def step(when, temp, humidity, description, temp_min=None, temp_max=None):
+    main = {"temp": temp, "humidity": humidity}
+    if temp_min is not None:
+        main.update(temp_min=temp_min, temp_max=temp_max)
+    return {"dt": int(when.timestamp()), "main": main, "weather": [{"description": description}]}
+
+
+def utc(day, hour):
+    return datetime(2026, 5, day, hour, tzinfo=timezone.utc)
+
+
+# Lisbon in summer time: UTC+1
+FORECAST = {
+    "city": {"name": "Lisbon", "timezone": 3600},
+    "list": [
+        step(utc(2, 12), 20.0, 60, "clear sky", 18.0, 21.0),
+        # 23:00 UTC is already 3 May in Lisbon
+        step(utc(2, 23), 14.0, 80, "light rain"),
+        step(utc(3, 9), 16.0, 70, "light rain", 15.5, 16.5),
+        step(utc(3, 15), 19.0, 50, "broken clouds", 18.0, 19.5),
+    ],
+}
+
+
+def test_day_summary_groups_steps_by_local_day():
+    forecast = Forecast(FORECAST, expires_at=0)
+    assert forecast.day_summary(date(2026, 5, 2)) == {
+        "temp": 20.0, "temp_min": 18.0, "temp_max": 21.0, "humidity": 60, "description": "clear sky"}
+    assert forecast.day_summary(date(2026, 5, 3)) == {
+        "temp": 16.3, "temp_min": 14.0, "temp_max": 19.5, "humidity": 67, "description": "light rain"}
+
+
+def test_day_summary_outside_the_forecast_is_none():
+    assert Forecast(FORECAST, expires_at=0).day_summary(date(2026, 5, 4)) is None
+
+
+class FakeSession:
+    def __init__(self):
+        self.cities = []
+
+    def get(self, url, params, timeout):
+        self.cities.append(params["q"])
+        if params["q"] == "Atlantis":
+            return SimpleNamespace(status_code=404)
+        return SimpleNamespace(status_code=200, json=lambda: {**FORECAST, "city": {"name": params["q"]}})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(weather, "time", SimpleNamespace(time=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+def test_forecast_is_fetched_once_per_cycle(clock):
+    session = FakeSession()
+    cache = ForecastCache(session, "key", "http://weather")
+    assert cache.get("Lisbon").city == "Lisbon"
+    assert cache.get("  lisbon ").city == "Lisbon"
+    assert session.cities == ["Lisbon"]
+
+    clock[0] = cache.get("Lisbon").expires_at
+    cache.get("Lisbon")
+    assert session.cities == ["Lisbon", "Lisbon"]
+
+
+def test_expired_forecasts_are_dropped_when_new_ones_are_stored(clock):
+    cache = ForecastCache(FakeSession(), "key", "http://weather")
+    expires_at = cache.get("Lisbon").expires_at
+    assert cache.get("Atlantis") is None
+    assert set(cache._forecasts) == {"lisbon", "atlantis"}
+
+    # Past both the failure retry window and the forecast cycle
+    clock[0] = max(expires_at, clock[0] + FAILURE_TTL)
+    cache.get("Porto")
+    assert set(cache._forecasts) == {"porto"}
@@ -0,0 +1,52 @@
+"""Trip requests shared by the batch CLI and the HTTP API.
+
+A trip is a dict with destination, start_date, end_date, travel_style,
+num_travelers, interests, dietary_restrictions, sections and a stable id.
+"""
+import hashlib
+import json
+
+ALL_SECTIONS = ["budget", "packing", "itinerary", "transport", "culture", "restaurants", "currency"]
+LIST_FIELDS = ("interests", "dietary_restrictions", "sections")
+
+
+def _text(raw: dict, field: str, default: str = "") -> str:
+    value = raw.get(field)
+    if value is None or value == "":
+        return default
+    if not isinstance(value, str):
+        raise TypeError(f"{field} must be a string, not {type(value).__name__}")
+    return value.strip()
+
+
+def _as_list(raw: dict, field: str) -> list:
+    value = raw.get(field)
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(";") if item.strip()]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) for item in value):
+        raise TypeError(f"{field} must be a list of strings or a ';'-separated string")
+    return [item.strip() for item in value if item.strip()]
+
+
+def normalize_trip(raw: dict) -> dict:
+    """Fill defaults, parse list fields and give the trip a stable id.
+
+    Raises ValueError for missing fields and TypeError for fields of the wrong type.
+    """
+    trip = {
+        "destination": _text(raw, "destination"),
+        "start_date": _text(raw, "start_date"),
+        "end_date": _text(raw, "end_date"),
+        "travel_style": _text(raw, "travel_style", "moderate").lower(),
+        "num_travelers": int(raw.get("num_travelers") or 1),
+    }
+    for field in LIST_FIELDS:
+        trip[field] = _as_list(raw, field)
+    if not trip["destination"] or not trip["start_date"] or not trip["end_date"]:
+        raise ValueError(f"Trip needs destination, start_date and end_date: {raw}")
+    # Without an explicit id, identical trips share one id and are only planned once
+    trip["id"] = str(raw.get("id") or "").strip() or hashlib.sha1(
+        json.dumps(trip, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return trip
@@ -0,0 +1,134 @@
+"""OpenWeather 5-day forecast cache.
+
+Each city's whole 3-hourly forecast is kept in columnar numpy arrays and reused
+until OpenWeather publishes its next forecast cycle, so trip-day summaries and
+repeated or concurrent lookups for the same city cost no extra HTTP calls.
+"""
+import logging
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from singleflight import SingleFlight
+from telemetry import record_weather_call
+
+logger = logging.getLogger(__name__)
+
+# OpenWeather recomputes the 5-day forecast every three hours
+FORECAST_CYCLE = 3 * 60 * 60
+# Allowance for a new cycle to be published after its nominal start
+FORECAST_PUBLISH_LAG = 10 * 60
+# Retry window after a failed or rejected lookup
+FAILURE_TTL = 10 * 60
+
+
+def _next_cycle(now: float) -> float:
+    return (now // FORECAST_CYCLE + 1) * FORECAST_CYCLE + FORECAST_PUBLISH_LAG
+
+
+class Forecast:
+    """One city's forecast as parallel arrays, one row per 3-hour step."""
+
+    __slots__ = ("city", "expires_at", "tz_offset", "timestamps", "temp",
+                 "temp_min", "temp_max", "humidity", "condition", "conditions")
+
+    def __init__(self, data: dict, expires_at: float):
+        steps = data["list"]
+        conditions = []
+        condition_ids = {}
+        condition = np.empty(len(steps), dtype=np.uint16)
+        for i, step in enumerate(steps):
+            description = step["weather"][0]["description"]
+            if description not in condition_ids:
+                condition_ids[description] = len(conditions)
+                conditions.append(description)
+            condition[i] = condition_ids[description]
+
+        self.city = data.get("city", {}).get("name")
+        self.expires_at = expires_at
+        self.tz_offset = int(data.get("city", {}).get("timezone", 0))
+        self.timestamps = np.fromiter((s["dt"] for s in steps), dtype=np.int64, count=len(steps))
+        self.temp = np.fromiter((s["main"]["temp"] for s in steps), dtype=np.float32, count=len(steps))
+        self.temp_min = np.fromiter((s["main"].get("temp_min", s["main"]["temp"]) for s in steps),
+                                    dtype=np.float32, count=len(steps))
+        self.temp_max = np.fromiter((s["main"].get("temp_max", s["main"]["temp"]) for s in steps),
+                                    dtype=np.float32, count=len(steps))
+        self.humidity = np.fromiter((s["main"]["humidity"] for s in steps), dtype=np.uint8, count=len(steps))
+        self.condition = condition
+        self.conditions = tuple(conditions)
+
+    def day_summary(self, day: date) -> dict:
+        """Summarize the forecast steps falling on a local calendar day, or None if not covered."""
+        local_days = (self.timestamps + self.tz_offset) // 86400
+        mask = local_days == (day - date(1970, 1, 1)).days
+        if not mask.any():
+            return None
+        dominant = int(np.bincount(self.condition[mask]).argmax())
+        return {
+            "temp": round(float(self.temp[mask].mean()), 1),
+            "temp_min": round(float(self.temp_min[mask].min()), 1),
+            "temp_max": round(float(self.temp_max[mask].max()), 1),
+            "humidity": int(round(float(self.humidity[mask].mean()))),
+            "description": self.conditions[dominant],
+        }
+
+
+class ForecastCache:
+    """Per-city forecast cache; concurrent misses for a city share one request."""
+
+    def __init__(self, session, api_key: str, base_url: str, timeout: float = 5):
+        self.session = session
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.fetches = 0
+        self._forecasts = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight("weather")
+
+    def get(self, city: str) -> Forecast:
+        """Return the current forecast for city, fetching it at most once per cycle."""
+        key = " ".join(city.split()).casefold()
+        entry = self._forecasts.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return self._flights.do(key, lambda _emit: self._load(key, city))
+
+    def _load(self, key: str, city: str) -> Forecast:
+        # A lookup that just finished may have stored the forecast after our cache check
+        entry = self._forecasts.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        forecast = self._fetch(city)
+        now = time.time()
+        expires_at = forecast.expires_at if forecast else now + FAILURE_TTL
+        with self._lock:
+            # Expired entries are dropped as new ones arrive, so only cities looked up recently are kept
+            for stale in [k for k, (expires, _) in self._forecasts.items() if expires <= now]:
+                del self._forecasts[stale]
+            self._forecasts[key] = (expires_at, forecast)
+        return forecast
+
+    def _fetch(self, city: str) -> Forecast:
+        self.fetches += 1
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.get(
+                f"{self.base_url}/data/2.5/forecast",
+                params={"q": city, "appid": self.api_key, "units": "metric"},
+                timeout=self.timeout
+            )
+            if response.status_code == 200:
+                forecast = Forecast(response.json(), _next_cycle(time.time()))
+                outcome = "ok"
+                return forecast
+            outcome = f"http_{response.status_code}"
+            logger.warning("Weather API error: HTTP %s for %s", response.status_code, city)
+        except Exception as e:
+            logger.warning("Weather API error for %s: %s", city, e)
+        finally:
+            record_weather_call(time.perf_counter() - started, outcome)
+        return None